@@ -0,0 +1,238 @@
+import os
+import io
+import sys
+import json
+import time
+import shutil
+import platform
+import argparse
+import tempfile
+import contextlib
+import statistics
+import numpy as np
+import PIL
+from PIL import Image
+from typing import Callable, Dict, List
+
+import synthetic
+from cgexport import (
+    EXPORTER_VERSION,
+    ENCODER_PRESETS,
+    Anime,
+    AnimeIndex,
+    Graphic,
+    GraphicArchive,
+    GraphicIndex,
+)
+
+
+def measure(func: Callable[[], None], items: int, repeat: int) -> Dict[str, float]:
+    """运行 repeat 次，记录最短和中位耗时；items 为每次处理的条目数，用于计算吞吐量"""
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - started)
+    best = min(timings)
+    return {
+        "seconds": best,
+        "median": statistics.median(timings),
+        "items": items,
+        "per_second": items / best if best else 0.0,
+    }
+
+
+class BenchmarkSuite:
+    """在合成档案上测量解码、调色板转换、大图合成、编码和完整动画导出的耗时"""
+
+    def __init__(self, work_dir: str, repeat: int = 3, **archive_options):
+        self.work_dir = work_dir
+        self.repeat = repeat
+        self.archive_options = archive_options
+        self.paths = synthetic.write_archive(os.path.join(work_dir, "archive"), **archive_options)
+        self.index = GraphicIndex(self.paths["graphic_info"])
+        self.archive = GraphicArchive.open(self.paths["graphic"])
+        self.anime_count = len(AnimeIndex(self.paths["anime_info"]))
+        self.results: Dict[str, Dict[str, float]] = {}
+
+    def run(self, only: List[str] = None) -> Dict[str, Dict[str, float]]:
+        benchmarks = {
+            "decode_batch": lambda: self.bench_decode("batch"),
+            "decode_reference": lambda: self.bench_decode("reference"),
+            "to_image_array": lambda: self.bench_to_image("array"),
+            "to_image_reference": lambda: self.bench_to_image("reference"),
+            "sheet_grid": lambda: self.bench_sheets("grid"),
+            "sheet_atlas": lambda: self.bench_sheets("atlas"),
+            "encode": self.bench_encode,
+            "anime_export": self.bench_anime_export,
+        }
+        # 关闭帧缓存，保证每次都真正解码
+        cache_size = Graphic.frame_cache.max_bytes
+        Graphic.frame_cache.resize(0)
+        try:
+            for name, benchmark in benchmarks.items():
+                if only and not any(name.startswith(prefix) for prefix in only):
+                    continue
+                with contextlib.redirect_stdout(io.StringIO()):
+                    benchmark()
+        finally:
+            Graphic.frame_cache.resize(cache_size)
+        return self.results
+
+    def bench_decode(self, engine: str) -> None:
+        blocks = []
+        for record in self.index.records:
+            version, payload = self.archive.block(int(record["address"]))
+            blocks.append((payload, int(record["width"]) * int(record["height"])))
+        decoded = sum(size for _, size in blocks)
+
+        def run():
+            for payload, size in blocks:
+                Graphic.decode_block(payload, size, engine)
+
+        self.results[f"decode_{engine}"] = measure(run, len(blocks), self.repeat)
+        self.results[f"decode_{engine}"]["bytes"] = decoded
+
+    def bench_to_image(self, engine: str) -> None:
+        frames = []
+        for record in self.index.records:
+            graphic = self.index.graphic(int(record["sequence"]))
+            version, payload = self.archive.block(graphic.address)
+            frames.append((graphic, Graphic.decode_block(payload, graphic.width * graphic.height)))
+        palette = Graphic._defalult_palette
+        engine_before = Graphic.to_image_engine
+
+        def run():
+            for graphic, pixels in frames:
+                graphic.to_image(pixels, palette)
+
+        Graphic.to_image_engine = engine
+        try:
+            self.results[f"to_image_{engine}"] = measure(run, len(frames), self.repeat)
+        finally:
+            Graphic.to_image_engine = engine_before
+
+    def bench_sheets(self, mode: str) -> None:
+        # raw 编码几乎不花时间，耗时主要是读取、解码和合成
+        output_dir = os.path.join(self.work_dir, f"sheet_{mode}")
+
+        def run():
+            for sequence in range(self.anime_count):
+                anime = Anime(self.paths["anime"], self.paths["graphic"], sequence)
+                anime.create_spritesheet(output_dir, mode=mode, encoder="raw")
+
+        self.results[f"sheet_{mode}"] = measure(run, self.anime_count, self.repeat)
+
+    def bench_encode(self) -> None:
+        sheets_dir = os.path.join(self.work_dir, "encode_source")
+        images = []
+        for sequence in range(self.anime_count):
+            anime = Anime(self.paths["anime"], self.paths["graphic"], sequence)
+            for path in anime.create_spritesheet(sheets_dir):
+                with Image.open(path) as image:
+                    image.load()
+                    images.append(image.copy())
+        output_dir = os.path.join(self.work_dir, "encode")
+        os.makedirs(output_dir, exist_ok=True)
+
+        for name, encoder in ENCODER_PRESETS.items():
+            sizes = []
+
+            def run():
+                sizes.clear()
+                for number, image in enumerate(images):
+                    path = os.path.join(output_dir, f"{number}{encoder.extension}")
+                    sizes.append(encoder.save(image, path)[0])
+
+            self.results[f"encode_{name}"] = measure(run, len(images), self.repeat)
+            self.results[f"encode_{name}"]["bytes"] = sum(sizes)
+
+    def bench_anime_export(self) -> None:
+        output_dir = os.path.join(self.work_dir, "anime_export")
+
+        def run():
+            for sequence in range(self.anime_count):
+                Anime(self.paths["anime"], self.paths["graphic"], sequence).create_spritesheet(
+                    output_dir
+                )
+
+        self.results["anime_export"] = measure(run, self.anime_count, self.repeat)
+
+
+def compare(results: Dict[str, Dict[str, float]], baseline: Dict[str, Dict[str, float]], threshold: float) -> List[str]:
+    """与基线比较最短耗时，返回变慢超过 threshold（比例）的项目名"""
+    regressions = []
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+        ratio = result["seconds"] / baseline[name]["seconds"] if baseline[name]["seconds"] else 1.0
+        mark = ""
+        if ratio > 1 + threshold:
+            regressions.append(name)
+            mark = "  <-- 变慢"
+        print(f"{name:24s} {baseline[name]['seconds']:10.4f}s -> {result['seconds']:10.4f}s  x{ratio:.2f}{mark}")
+    return regressions
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description="在合成档案上运行性能基准，结果保存为 JSON")
+    parser.add_argument("-o", "--output", default="benchmark.json", help="结果文件路径")
+    parser.add_argument("--baseline", default=None, help="与之比较的旧结果文件，变慢超过阈值时返回非零")
+    parser.add_argument("--threshold", type=float, default=0.1, help="判定变慢的比例阈值")
+    parser.add_argument("--only", action="append", default=None, help="只运行名称以此开头的项目，可重复")
+    parser.add_argument("--repeat", type=int, default=3, help="每项重复次数，取最短耗时")
+    parser.add_argument("--graphics", type=int, default=300, help="合成图像数")
+    parser.add_argument("--animes", type=int, default=20, help="合成动画数")
+    parser.add_argument("--profile", choices=synthetic.PROFILES, default="sprite", help="像素生成方式")
+    parser.add_argument("--max-size", type=int, default=128, help="图像最大边长")
+    parser.add_argument("--frames", type=int, default=8, help="每个方向的最大帧数")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--keep", default=None, help="保留合成档案和输出的目录，默认用临时目录")
+    args = parser.parse_args(argv)
+
+    archive_options = {
+        "graphics": args.graphics,
+        "animes": args.animes,
+        "profile": args.profile,
+        "width": (16, args.max_size),
+        "height": (16, args.max_size),
+        "frames": (1, args.frames),
+        "seed": args.seed,
+    }
+    work_dir = args.keep or tempfile.mkdtemp(prefix="cgexport-bench-")
+    try:
+        suite = BenchmarkSuite(work_dir, args.repeat, **archive_options)
+        results = suite.run(args.only)
+    finally:
+        if args.keep is None:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    for name, result in results.items():
+        print(f"{name:24s} {result['seconds']:10.4f}s  {result['per_second']:10.1f} 个/s")
+
+    report = {
+        "exporter_version": EXPORTER_VERSION,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": sys.version.split()[0],
+        "numpy": np.__version__,
+        "pillow": PIL.__version__,
+        "platform": platform.platform(),
+        "config": dict(archive_options, repeat=args.repeat),
+        "results": results,
+    }
+    with open(args.output, "w", encoding="utf-8") as file:
+        json.dump(report, file, ensure_ascii=False, indent=2)
+    print(f"保存基准结果：{args.output}")
+
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as file:
+            baseline = json.load(file)
+        if baseline.get("config") != json.loads(json.dumps(report["config"])):
+            print("警告：基线的合成档案配置不同，结果不可直接比较")
+        if compare(results, baseline["results"], args.threshold):
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,421 @@
+import os
+import json
+import time
+import struct
+import sqlite3
+import numpy as np
+from typing import List, Tuple
+
+from cgexport import STATS, ActionType, Anime, AnimeIndex, GraphicIndex
+
+# 表结构变化时递增，旧版本的数据库会被清空重建
+SCHEMA_VERSION = 1
+
+SCHEMA = """
+CREATE TABLE sources (
+    id INTEGER PRIMARY KEY,
+    kind TEXT NOT NULL,
+    path TEXT NOT NULL UNIQUE,
+    graphic_source INTEGER,
+    stamp TEXT NOT NULL,
+    records INTEGER NOT NULL,
+    built_at REAL NOT NULL
+);
+CREATE TABLE graphics (
+    source INTEGER NOT NULL,
+    position INTEGER NOT NULL,
+    sequence INTEGER NOT NULL,
+    address INTEGER NOT NULL,
+    length INTEGER NOT NULL,
+    offset_x INTEGER NOT NULL,
+    offset_y INTEGER NOT NULL,
+    width INTEGER NOT NULL,
+    height INTEGER NOT NULL,
+    area INTEGER NOT NULL,
+    area_east INTEGER NOT NULL,
+    area_south INTEGER NOT NULL,
+    flag INTEGER NOT NULL,
+    map_number INTEGER NOT NULL,
+    PRIMARY KEY (source, position)
+) WITHOUT ROWID;
+CREATE INDEX graphics_sequence ON graphics (source, sequence);
+CREATE INDEX graphics_area ON graphics (area);
+CREATE INDEX graphics_map_number ON graphics (map_number);
+CREATE TABLE animes (
+    source INTEGER NOT NULL,
+    sequence INTEGER NOT NULL,
+    id INTEGER NOT NULL,
+    address INTEGER NOT NULL,
+    action_count INTEGER NOT NULL,
+    frame_count INTEGER NOT NULL,
+    graphic_count INTEGER NOT NULL,
+    pixels INTEGER NOT NULL,
+    PRIMARY KEY (source, sequence)
+) WITHOUT ROWID;
+CREATE INDEX animes_id ON animes (id);
+CREATE TABLE action_types (
+    value INTEGER PRIMARY KEY,
+    name TEXT NOT NULL
+);
+CREATE TABLE actions (
+    id INTEGER PRIMARY KEY,
+    source INTEGER NOT NULL,
+    anime_sequence INTEGER NOT NULL,
+    anime_id INTEGER NOT NULL,
+    number INTEGER NOT NULL,
+    direction INTEGER NOT NULL,
+    action_type INTEGER NOT NULL,
+    duration INTEGER NOT NULL,
+    frame_count INTEGER NOT NULL
+);
+CREATE INDEX actions_anime ON actions (source, anime_sequence);
+CREATE INDEX actions_frame_count ON actions (frame_count);
+CREATE INDEX actions_type ON actions (action_type);
+CREATE TABLE frames (
+    action INTEGER NOT NULL,
+    number INTEGER NOT NULL,
+    graphic_sequence INTEGER NOT NULL,
+    PRIMARY KEY (action, number)
+) WITHOUT ROWID;
+CREATE TABLE graphic_animes (
+    source INTEGER NOT NULL,
+    graphic_sequence INTEGER NOT NULL,
+    anime_sequence INTEGER NOT NULL,
+    frames INTEGER NOT NULL,
+    PRIMARY KEY (source, graphic_sequence, anime_sequence)
+) WITHOUT ROWID;
+CREATE INDEX graphic_animes_graphic ON graphic_animes (graphic_sequence);
+"""
+
+
+def _stamp(*paths: str) -> str:
+    """文件大小和修改时间，任一变化时对应的来源需要重建"""
+    stamp = []
+    for path in paths:
+        stat = os.stat(path)
+        stamp.append([stat.st_size, stat.st_mtime_ns])
+    return json.dumps(stamp)
+
+
+def _areas(index: GraphicIndex, sequences: np.ndarray) -> np.ndarray:
+    """按 sequence 查图像面积，GraphicInfo 中不存在的 sequence 为 0"""
+    records = index.records
+    area = records["width"].astype(np.int64) * records["height"]
+    order = np.argsort(records["sequence"], kind="stable")
+    sorted_sequences = records["sequence"][order].astype(np.int64)
+    positions = np.searchsorted(sorted_sequences, sequences)
+    clipped = np.minimum(positions, max(len(order) - 1, 0))
+    result = np.zeros(len(sequences), dtype=np.int64)
+    if len(order):
+        found = sorted_sequences[clipped] == sequences
+        result[found] = area[order[clipped[found]]]
+    return result
+
+
+class Catalog:
+    """GraphicInfo、AnimeInfo/Anime 中全部记录的 SQLite 目录
+
+    graphics、animes、actions、frames 四张表对应文件中的记录，graphic_animes 为图像到使用它的动画的反向引用；
+    每个来源文件在 sources 中记录大小和修改时间，更新时只重建变化了的来源
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.connection = sqlite3.connect(path)
+        self.connection.row_factory = sqlite3.Row
+        self.connection.execute("PRAGMA journal_mode = WAL")
+        self.connection.execute("PRAGMA synchronous = NORMAL")
+        version = self.connection.execute("PRAGMA user_version").fetchone()[0]
+        if version != SCHEMA_VERSION:
+            self.__create()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self) -> None:
+        self.connection.close()
+
+    def __create(self) -> None:
+        with self.connection:
+            tables = self.connection.execute(
+                "SELECT name FROM sqlite_master WHERE type = 'table'"
+            ).fetchall()
+            for (name,) in tables:
+                self.connection.execute(f'DROP TABLE "{name}"')
+            self.connection.executescript(SCHEMA)
+            self.connection.executemany(
+                "INSERT INTO action_types VALUES (?, ?)",
+                [(action_type.value, action_type.name) for action_type in ActionType],
+            )
+            self.connection.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+
+    def __source(self, path: str):
+        return self.connection.execute(
+            "SELECT * FROM sources WHERE path = ?", (os.path.abspath(path),)
+        ).fetchone()
+
+    def __replace_source(self, kind: str, path: str, stamp: str, records: int, graphic_source: int = None) -> int:
+        """保留来源的 id，删除它的全部旧记录"""
+        path = os.path.abspath(path)
+        row = self.__source(path)
+        if row is None:
+            cursor = self.connection.execute(
+                "INSERT INTO sources (kind, path, graphic_source, stamp, records, built_at) VALUES (?, ?, ?, ?, ?, ?)",
+                (kind, path, graphic_source, stamp, records, time.time()),
+            )
+            return cursor.lastrowid
+        source = row["id"]
+        self.connection.execute(
+            "UPDATE sources SET kind = ?, graphic_source = ?, stamp = ?, records = ?, built_at = ? WHERE id = ?",
+            (kind, graphic_source, stamp, records, time.time(), source),
+        )
+        self.__delete_records(source)
+        return source
+
+    def __delete_records(self, source: int) -> None:
+        self.connection.execute("DELETE FROM graphics WHERE source = ?", (source,))
+        self.connection.execute("DELETE FROM animes WHERE source = ?", (source,))
+        self.connection.execute(
+            "DELETE FROM frames WHERE action IN (SELECT id FROM actions WHERE source = ?)", (source,)
+        )
+        self.connection.execute("DELETE FROM actions WHERE source = ?", (source,))
+        self.connection.execute("DELETE FROM graphic_animes WHERE source = ?", (source,))
+
+    def prune(self) -> List[str]:
+        """删除文件已不存在（被删除或改名）的来源及其全部记录，帧引用的 Graphic 文件被删除的动画来源一并删除；
+        返回删除的来源路径"""
+        removed = []
+        with self.connection:
+            rows = self.connection.execute("SELECT id, kind, path, graphic_source FROM sources").fetchall()
+            gone = {row["id"] for row in rows if not os.path.exists(row["path"])}
+            gone |= {row["id"] for row in rows if row["kind"] == "anime" and row["graphic_source"] in gone}
+            for row in rows:
+                if row["id"] in gone:
+                    self.__delete_records(row["id"])
+                    self.connection.execute("DELETE FROM sources WHERE id = ?", (row["id"],))
+                    removed.append(row["path"])
+        return removed
+
+    def update_graphics(self, graphic_path: str, force: bool = False) -> bool:
+        """把 Graphic*.bin 对应的 GraphicInfo 记录写入目录，文件未变化且 force 为 False 时跳过；返回是否重建"""
+        info_path = graphic_path.replace("Graphic", "GraphicInfo")
+        stamp = _stamp(info_path)
+        row = self.__source(graphic_path)
+        if not force and row is not None and row["stamp"] == stamp:
+            return False
+
+        index = GraphicIndex(info_path)
+        records = index.records
+        columns = [
+            np.arange(len(records)),
+            records["sequence"],
+            records["address"],
+            records["length"],
+            records["offset_x"],
+            records["offset_y"],
+            records["width"],
+            records["height"],
+            records["width"].astype(np.int64) * records["height"],
+            records["area_east"],
+            records["area_south"],
+            records["flag"],
+            records["map_number"],
+        ]
+        with STATS.stage("catalog"), self.connection:
+            source = self.__replace_source("graphic", graphic_path, stamp, len(records))
+            self.connection.executemany(
+                "INSERT INTO graphics VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                zip([source] * len(records), *(column.tolist() for column in columns)),
+            )
+        print(f"目录：{graphic_path}，{len(records)} 个图像")
+        return True
+
+    def update_animes(self, anime_path: str, graphic_path: str, force: bool = False) -> bool:
+        """把 AnimeInfo/Anime 中的全部动画、动作和帧写入目录，帧引用 graphic_path 中的图像；
+
+        动画的像素数按 graphic_path 的 GraphicInfo 计算，因此三个文件任一变化都会重建；返回是否重建
+        """
+        self.update_graphics(graphic_path)
+        info_path = anime_path.replace("Anime", "AnimeInfo")
+        graphic_info_path = graphic_path.replace("Graphic", "GraphicInfo")
+        stamp = _stamp(anime_path, info_path, graphic_info_path)
+        graphic_source = self.__source(graphic_path)["id"]
+        row = self.__source(anime_path)
+        if (
+            not force
+            and row is not None
+            and row["stamp"] == stamp
+            and row["graphic_source"] == graphic_source
+        ):
+            return False
+
+        index = AnimeIndex(info_path)
+        records = index.records
+        with STATS.stage("info"), open(anime_path, "rb") as file:
+            data = file.read()
+        STATS.count("bytes_read", len(data))
+
+        # 逐个动画解析动作头，帧记录稍后按偏移一次取出
+        actions = []
+        animes = []
+        for sequence, (id, address, action_count) in enumerate(
+            zip(records["id"].tolist(), records["address"].tolist(), records["action_count"].tolist())
+        ):
+            position = address
+            parsed = []
+            try:
+                for number in range(action_count):
+                    if position + 12 > len(data):
+                        raise ValueError(f"Invalid action data size in {anime_path}")
+                    direction, action_type, duration, count = struct.unpack_from("<HHII", data, position)
+                    if position + 12 + count * 10 > len(data):
+                        raise ValueError(f"Invalid frame data size in {anime_path}")
+                    parsed.append((sequence, id, number, direction, action_type, duration, count, position + 12))
+                    position += 12 + count * 10
+            except ValueError as e:
+                print(f"读取动画失败（sequence：{sequence}）：{e}")
+                continue
+            actions.extend(parsed)
+            animes.append((sequence, id, address, action_count))
+
+        counts = np.array([action[6] for action in actions], dtype=np.int64)
+        starts = np.array([action[7] for action in actions], dtype=np.int64)
+        action_animes = np.array([action[0] for action in actions], dtype=np.int64)
+        total = int(counts.sum())
+        # 每帧在文件中的偏移：所属动作的帧起点 + 帧号 * 10
+        first = np.cumsum(counts) - counts
+        frame_numbers = np.arange(total) - np.repeat(first, counts)
+        offsets = np.repeat(starts, counts) + frame_numbers * Anime._frame_dtype.itemsize
+        buffer = np.frombuffer(data, dtype=np.uint8)
+        sequences = buffer[offsets[:, None] + np.arange(4)].copy().view("<u4").ravel().astype(np.int64)
+        frame_animes = np.repeat(action_animes, counts)
+
+        # 反向引用：每个 (动画, 图像) 一行，记录该图像在动画中出现的帧数
+        keys, uses = np.unique(frame_animes << 32 | sequences, return_counts=True)
+        pair_animes = keys >> 32
+        pair_graphics = keys & 0xFFFFFFFF
+        # 与 update_graphics 一样重新读取 GraphicInfo，不用可能过期的共享索引
+        areas = _areas(GraphicIndex(graphic_info_path), pair_graphics)
+        size = len(records)
+        frame_count = np.bincount(frame_animes, minlength=size)
+        graphic_count = np.bincount(pair_animes, minlength=size)
+        pixels = np.bincount(pair_animes, weights=areas, minlength=size).astype(np.int64)
+
+        with STATS.stage("catalog"), self.connection:
+            source = self.__replace_source("anime", anime_path, stamp, size, graphic_source)
+            first_id = self.connection.execute("SELECT COALESCE(MAX(id), 0) + 1 FROM actions").fetchone()[0]
+            action_ids = np.arange(first_id, first_id + len(actions))
+            self.connection.executemany(
+                "INSERT INTO animes VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    (source, sequence, id, address, action_count, int(frame_count[sequence]),
+                     int(graphic_count[sequence]), int(pixels[sequence]))
+                    for sequence, id, address, action_count in animes
+                ),
+            )
+            self.connection.executemany(
+                "INSERT INTO actions VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    (action_id, source) + action[:7]
+                    for action_id, action in zip(action_ids.tolist(), actions)
+                ),
+            )
+            self.connection.executemany(
+                "INSERT INTO frames VALUES (?, ?, ?)",
+                zip(np.repeat(action_ids, counts).tolist(), frame_numbers.tolist(), sequences.tolist()),
+            )
+            self.connection.executemany(
+                "INSERT INTO graphic_animes VALUES (?, ?, ?, ?)",
+                zip([source] * len(keys), pair_graphics.tolist(), pair_animes.tolist(), uses.tolist()),
+            )
+        print(f"目录：{anime_path}，{len(animes)} 个动画，{len(actions)} 个动作，{total} 帧")
+        return True
+
+    def query(self, sql: str, params=()) -> List[sqlite3.Row]:
+        return self.connection.execute(sql, params).fetchall()
+
+    def animes_using(self, graphic_sequence: int, graphic_path: str = None) -> List[sqlite3.Row]:
+        """使用指定图像的全部动画：(anime_path, sequence, id, frames)，graphic_path 限定帧所属的 Graphic 文件"""
+        sql = """
+            SELECT s.path AS anime_path, r.anime_sequence AS sequence, a.id, r.frames
+            FROM graphic_animes r
+            JOIN sources s ON s.id = r.source
+            JOIN animes a ON a.source = r.source AND a.sequence = r.anime_sequence
+            WHERE r.graphic_sequence = ?
+        """
+        params = [graphic_sequence]
+        if graphic_path is not None:
+            sql += " AND s.graphic_source = (SELECT id FROM sources WHERE path = ?)"
+            params.append(os.path.abspath(graphic_path))
+        return self.query(sql + " ORDER BY s.path, r.anime_sequence", params)
+
+    def largest_graphics(self, limit: int = 20) -> List[sqlite3.Row]:
+        """按面积从大到小的图像"""
+        return self.query(
+            """
+            SELECT s.path AS graphic_path, g.sequence, g.width, g.height, g.area
+            FROM graphics g JOIN sources s ON s.id = g.source
+            ORDER BY g.area DESC LIMIT ?
+            """,
+            (limit,),
+        )
+
+    def actions_with_frames(self, min_frames: int) -> List[sqlite3.Row]:
+        """帧数不少于 min_frames 的全部动作"""
+        return self.query(
+            """
+            SELECT s.path AS anime_path, a.anime_id, a.direction, t.name AS action_type, a.duration, a.frame_count
+            FROM actions a
+            JOIN sources s ON s.id = a.source
+            LEFT JOIN action_types t ON t.value = a.action_type
+            WHERE a.frame_count >= ?
+            ORDER BY a.frame_count DESC
+            """,
+            (min_frames,),
+        )
+
+    def anime_costs(self, anime_path: str) -> np.ndarray:
+        """以 sequence 为下标的每个动画用到的不同帧的像素总数（解码量），用于安排导出任务；未入目录时返回 None"""
+        row = self.__source(anime_path)
+        if row is None:
+            return None
+        costs = np.zeros(row["records"], dtype=np.int64)
+        for sequence, pixels in self.connection.execute(
+            "SELECT sequence, pixels FROM animes WHERE source = ?", (row["id"],)
+        ):
+            costs[sequence] = pixels
+        return costs
+
+    def summary(self) -> dict:
+        return {
+            table: self.connection.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+            for table in ("sources", "graphics", "animes", "actions", "frames", "graphic_animes")
+        }
+
+
+def build_catalog(
+    path: str,
+    graphic_paths: List[str] = None,
+    anime_paths: List[Tuple[str, str]] = None,
+    force: bool = False,
+    prune: bool = True,
+) -> Catalog:
+    """打开（或创建）path 处的目录，更新 graphic_paths 中的图像和 anime_paths 中的 (Anime, Graphic) 路径对；
+    prune 为 True 时先删除文件已不存在的来源"""
+    catalog = Catalog(path)
+    if prune:
+        for removed in catalog.prune():
+            print(f"目录：{removed} 或其帧所在的 Graphic 文件已不存在，删除其记录")
+    # 动画引用的 Graphic 文件先更新，force 时也只重建一次
+    graphic_paths = list(graphic_paths or []) + [graphic_path for _, graphic_path in anime_paths or []]
+    unique = {}
+    for graphic_path in graphic_paths:
+        unique.setdefault(os.path.abspath(graphic_path), graphic_path)
+    for graphic_path in unique.values():
+        catalog.update_graphics(graphic_path, force)
+    for anime_path, graphic_path in anime_paths or []:
+        catalog.update_animes(anime_path, graphic_path, force)
+    return catalog
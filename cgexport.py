@@ -0,0 +1,3670 @@
+import struct
+import os
+import mmap
+import threading
+import time
+import hashlib
+import json
+from collections import OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, wait, FIRST_COMPLETED
+import numpy as np
+from PIL import Image
+from enum import Enum
+from typing import List
+from functools import partial
+from typing import Dict
+
+# 导出结果格式变化时递增，使增量导出清单中的旧记录失效
+EXPORTER_VERSION = "2"
+
+
+class ActionType(Enum):
+    IDLE = 0
+    WALK = 1
+    RUN_PREPARE = 2
+    RUN = 3
+    RUN_FINISH = 4
+    ATTACK = 5
+    SPELL = 6
+    CAST = 7
+    HURT = 8
+    GUARD = 9
+    FALL = 10
+    SIT = 11
+    WAVE = 12
+    HAPPY = 13
+    ANGRY = 14
+    SAD = 15
+    NOD = 16
+    STONE = 17
+    SCISSORS = 18
+    PAPER = 19
+    FISH = 20
+
+
+class FrameCache:
+    """进程内共享的解码帧缓存，按总字节数限制容量，LRU 淘汰"""
+
+    default_max_bytes = 256 * 1024 * 1024
+
+    def __init__(self, max_bytes: int = default_max_bytes):
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, key) -> bool:
+        """只判断是否存在，不计入命中统计，也不更新 LRU 顺序"""
+        return key in self._entries
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key, value, nbytes: int) -> None:
+        with self._lock:
+            if nbytes > self.max_bytes:
+                return
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.bytes -= old[1]
+            self._entries[key] = (value, nbytes)
+            self.bytes += nbytes
+            self.__evict()
+
+    def resize(self, max_bytes: int) -> None:
+        with self._lock:
+            self.max_bytes = max_bytes
+            self.__evict()
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.bytes = 0
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self.bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+    def __evict(self) -> None:
+        while self.bytes > self.max_bytes and self._entries:
+            _, (_, nbytes) = self._entries.popitem(last=False)
+            self.bytes -= nbytes
+            self.evictions += 1
+
+    @staticmethod
+    def budget(workers: int, total_bytes: int = None) -> int:
+        """多进程时每个进程的缓存容量：total_bytes 为所有进程合计，按进程数平分；
+        未给出时取物理内存的 1/8 平分，且每个进程不超过 default_max_bytes"""
+        workers = max(workers, 1)
+        if total_bytes is not None:
+            return total_bytes // workers
+        try:
+            memory = os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES")
+        except (AttributeError, ValueError, OSError):
+            # 无法取得物理内存（如 Windows）时按 8 GB 估计
+            memory = 8 * 1024 * 1024 * 1024
+        return min(FrameCache.default_max_bytes, memory // 8 // workers)
+
+
+class _NullStage:
+    """关闭统计时 ExportStats.stage 返回的空计时器"""
+
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+_NULL_STAGE = _NullStage()
+
+
+class _Stage:
+    __slots__ = ("stats", "name", "parent", "wall", "cpu", "child_wall")
+
+    def __init__(self, stats: "ExportStats", name: str):
+        self.stats = stats
+        self.name = name
+
+    def __enter__(self):
+        stack = self.stats._stack()
+        self.parent = stack[-1].name if stack else None
+        self.child_wall = 0.0
+        stack.append(self)
+        self.cpu = time.thread_time()
+        self.wall = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        wall = time.perf_counter() - self.wall
+        cpu = time.thread_time() - self.cpu
+        stack = self.stats._stack()
+        stack.pop()
+        if stack:
+            stack[-1].child_wall += wall
+        self.stats._record(self.parent, self.name, wall, cpu, wall - self.child_wall)
+        return False
+
+
+class ExportStats:
+    """分阶段的耗时与计数统计，默认关闭
+
+    stage(name) 记录一个阶段的墙钟时间、CPU 时间和不含子阶段的自身时间，阶段可以嵌套；
+    count(name, value) 累加计数（读取字节、解码字节、帧数、缓存命中等）；
+    scope(name) 内的记录同时归入该范围（如单个动画）和整次运行。
+    关闭时 stage 返回共享的空计时器，count 直接返回，开销只有一次属性判断
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        # 范围名（None 为整次运行）-> {"edges": {(父阶段, 阶段): [次数, 墙钟, CPU, 自身]}, "counters": {}}
+        self._data = {}
+
+    def enable(self, enabled: bool = True) -> None:
+        self.enabled = enabled
+
+    def reset(self) -> None:
+        with self._lock:
+            self._data = {}
+
+    def stage(self, name: str):
+        if not self.enabled:
+            return _NULL_STAGE
+        return _Stage(self, name)
+
+    def count(self, name: str, value: int = 1) -> None:
+        if not self.enabled:
+            return
+        with self._lock:
+            for entry in self.__entries():
+                counters = entry["counters"]
+                counters[name] = counters.get(name, 0) + value
+
+    def scope(self, name: str):
+        """上下文管理器：其中的阶段和计数另外按 name 汇总，关闭统计时不起作用"""
+        if not self.enabled:
+            return _NULL_STAGE
+        return _Scope(self, name)
+
+    def _stack(self) -> list:
+        stack = getattr(self._local, "stack", None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+    def _record(self, parent: str, name: str, wall: float, cpu: float, own: float) -> None:
+        with self._lock:
+            for entry in self.__entries():
+                totals = entry["edges"].setdefault((parent, name), [0, 0.0, 0.0, 0.0])
+                totals[0] += 1
+                totals[1] += wall
+                totals[2] += cpu
+                totals[3] += own
+
+    def __entries(self):
+        scope = getattr(self._local, "scope", None)
+        names = (None,) if scope is None else (None, scope)
+        for name in names:
+            entry = self._data.get(name)
+            if entry is None:
+                entry = self._data[name] = {"edges": {}, "counters": {}}
+            yield entry
+
+    @staticmethod
+    def __section(entry) -> dict:
+        stages = {}
+        for (parent, name), (calls, wall, cpu, own) in entry["edges"].items():
+            totals = stages.setdefault(name, {"calls": 0, "wall": 0.0, "cpu": 0.0, "self": 0.0})
+            totals["calls"] += calls
+            totals["wall"] += wall
+            totals["cpu"] += cpu
+            totals["self"] += own
+        return {
+            "stages": stages,
+            "edges": [[parent, name, *totals] for (parent, name), totals in entry["edges"].items()],
+            "counters": dict(entry["counters"]),
+        }
+
+    def snapshot(self) -> dict:
+        """当前统计的副本：{"run": 整次运行, "scopes": {范围名: 同结构}}，可直接写成 JSON"""
+        empty = {"edges": {}, "counters": {}}
+        with self._lock:
+            return {
+                "run": ExportStats.__section(self._data.get(None, empty)),
+                "scopes": {
+                    name: ExportStats.__section(entry)
+                    for name, entry in self._data.items()
+                    if name is not None
+                },
+            }
+
+    def merge(self, snapshot: dict) -> None:
+        """合并另一份 snapshot（如进程池任务的统计）"""
+        with self._lock:
+            sections = [(None, snapshot["run"])] + list(snapshot["scopes"].items())
+            for name, section in sections:
+                entry = self._data.setdefault(name, {"edges": {}, "counters": {}})
+                for parent, stage, calls, wall, cpu, own in section["edges"]:
+                    totals = entry["edges"].setdefault((parent, stage), [0, 0.0, 0.0, 0.0])
+                    totals[0] += calls
+                    totals[1] += wall
+                    totals[2] += cpu
+                    totals[3] += own
+                for counter, value in section["counters"].items():
+                    entry["counters"][counter] = entry["counters"].get(counter, 0) + value
+
+    def report(self) -> str:
+        """整次运行的文本摘要"""
+        run = self.snapshot()["run"]
+        lines = [f"{'阶段':<16}{'次数':>10}{'墙钟 s':>12}{'CPU s':>12}{'自身 s':>12}"]
+        for name, totals in sorted(run["stages"].items(), key=lambda item: -item[1]["self"]):
+            lines.append(
+                f"{name:<16}{totals['calls']:>10}{totals['wall']:>12.3f}"
+                f"{totals['cpu']:>12.3f}{totals['self']:>12.3f}"
+            )
+        for name, value in sorted(run["counters"].items()):
+            lines.append(f"{name:<16}{value:>10}")
+        return "\n".join(lines)
+
+    def dump(self, path: str) -> None:
+        """以 .prof/.pstats 结尾时写成 pstats 可读的格式（python -m pstats、snakeviz 等），否则写 JSON"""
+        if path.endswith((".prof", ".pstats")):
+            import marshal
+
+            # pstats 的格式：{(文件, 行号, 函数名): (原始调用次数, 调用次数, 自身时间, 累计时间, 调用者)}
+            stats = {}
+            for parent, name, calls, wall, cpu, own in self.snapshot()["run"]["edges"]:
+                key = ("stage", 0, name)
+                cc, nc, tt, ct, callers = stats.get(key, (0, 0, 0.0, 0.0, {}))
+                if parent is not None:
+                    callers[("stage", 0, parent)] = (calls, calls, own, wall)
+                stats[key] = (cc + calls, nc + calls, tt + own, ct + wall, callers)
+            with open(path, "wb") as file:
+                marshal.dump(stats, file)
+            return
+        with open(path, "w", encoding="utf-8") as file:
+            json.dump(self.snapshot(), file, ensure_ascii=False, indent=2)
+
+
+class _Scope:
+    __slots__ = ("stats", "name", "previous")
+
+    def __init__(self, stats: ExportStats, name: str):
+        self.stats = stats
+        self.name = name
+
+    def __enter__(self):
+        self.previous = getattr(self.stats._local, "scope", None)
+        self.stats._local.scope = self.name
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stats._local.scope = self.previous
+        return False
+
+
+# 进程内共享的统计，由 --stats 或 STATS.enable() 打开
+STATS = ExportStats()
+
+
+class Palette:
+    """256 色调色板
+
+    rgb 为 768 字节的 RGB 数据，lut 为只读的 256x4 uint8 RGBA 查找表（黑色透明），alpha 为 lut 的 alpha 列；
+    key 为内容摘要，可作缓存 key，内容相同的调色板相等
+    """
+
+    # 由调色板文件解析的调色板：路径 -> (文件大小, 修改时间, Palette)，LRU，最多 max_files 个
+    max_files = 32
+    _files = OrderedDict()
+    # 由列表等转换而来的调色板：id -> (原对象, Palette)，持有原对象保证 id 不被复用
+    _converted = {}
+    _lock = threading.Lock()
+
+    def __init__(self, colors):
+        rgb = bytes(colors[:768]) if not isinstance(colors, Palette) else colors.rgb
+        if len(rgb) < 768:  # 256 colors * 3 channels
+            raise ValueError(f"Palette length {len(rgb)} is invalid")
+        self.rgb = rgb
+        lut = np.zeros((256, 4), dtype=np.uint8)
+        lut[:, :3] = np.frombuffer(rgb, dtype=np.uint8).reshape(256, 3)
+        lut[:, 3] = np.where(lut[:, :3].any(axis=1), 255, 0)
+        lut.flags.writeable = False
+        self.lut = lut
+        self.alpha = lut[:, 3].tobytes()
+        self.key = hashlib.blake2b(rgb, digest_size=16).hexdigest()
+
+    def __len__(self) -> int:
+        return len(self.rgb)
+
+    def __getitem__(self, index):
+        return self.rgb[index]
+
+    def __iter__(self):
+        return iter(self.rgb)
+
+    def __bytes__(self) -> bytes:
+        return self.rgb
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, Palette) and self.key == other.key
+
+    def __hash__(self) -> int:
+        return hash(self.key)
+
+    def __repr__(self) -> str:
+        return f"Palette({self.key})"
+
+    @staticmethod
+    def of(palette) -> "Palette":
+        """把 768 个颜色分量的列表、bytes 等转换为 Palette；None 为内置调色板，Palette 原样返回"""
+        if palette is None:
+            return Graphic._defalult_palette
+        if isinstance(palette, Palette):
+            return palette
+        cached = Palette._converted.get(id(palette))
+        if cached is not None and cached[0] is palette:
+            return cached[1]
+        converted = Palette(palette)
+        with Palette._lock:
+            if len(Palette._converted) >= 64:
+                Palette._converted.clear()
+            Palette._converted[id(palette)] = (palette, converted)
+        return converted
+
+    @staticmethod
+    def load(path: str, parse) -> "Palette":
+        """读取调色板文件并用 parse(bytes) 解析，按文件大小和修改时间缓存，文件变化后重新解析"""
+        stat = os.stat(path)
+        with Palette._lock:
+            cached = Palette._files.get(path)
+            if cached is not None and cached[:2] == (stat.st_size, stat.st_mtime_ns):
+                Palette._files.move_to_end(path)
+                return cached[2]
+        with open(path, "rb") as file:
+            palette = parse(file.read())
+        with Palette._lock:
+            Palette._files[path] = (stat.st_size, stat.st_mtime_ns, palette)
+            Palette._files.move_to_end(path)
+            while len(Palette._files) > Palette.max_files:
+                Palette._files.popitem(last=False)
+        return palette
+
+
+class Graphic:
+
+    _defalult_palette = Palette([
+        0,
+        0,
+        0,
+        0,
+        0,
+        128,
+        0,
+        128,
+        0,
+        0,
+        128,
+        128,
+        128,
+        0,
+        128,
+        128,
+        0,
+        0,
+        128,
+        128,
+        0,
+        192,
+        192,
+        192,
+        192,
+        220,
+        192,
+        240,
+        202,
+        166,
+        0,
+        0,
+        222,
+        0,
+        95,
+        255,
+        160,
+        255,
+        255,
+        210,
+        95,
+        0,
+        255,
+        210,
+        80,
+        40,
+        225,
+        40,
+        164,
+        247,
+        133,
+        150,
+        226,
+        122,
+        136,
+        205,
+        110,
+        122,
+        184,
+        99,
+        108,
+        163,
+        87,
+        94,
+        142,
+        76,
+        245,
+        232,
+        240,
+        245,
+        215,
+        219,
+        245,
+        197,
+        197,
+        245,
+        180,
+        176,
+        245,
+        163,
+        154,
+        245,
+        146,
+        133,
+        245,
+        128,
+        111,
+        245,
+        111,
+        90,
+        225,
+        101,
+        82,
+        205,
+        92,
+        73,
+        185,
+        82,
+        65,
+        165,
+        72,
+        56,
+        145,
+        62,
+        48,
+        125,
+        53,
+        39,
+        105,
+        43,
+        31,
+        85,
+        33,
+        22,
+        255,
+        241,
+        209,
+        248,
+        229,
+        195,
+        241,
+        217,
+        181,
+        234,
+        205,
+        167,
+        228,
+        193,
+        154,
+        221,
+        181,
+        140,
+        214,
+        169,
+        126,
+        207,
+        157,
+        112,
+        242,
+        180,
+        126,
+        229,
+        166,
+        112,
+        216,
+        151,
+        98,
+        203,
+        137,
+        84,
+        191,
+        123,
+        71,
+        178,
+        109,
+        57,
+        165,
+        94,
+        43,
+        152,
+        80,
+        29,
+        223,
+        226,
+        217,
+        200,
+        205,
+        190,
+        178,
+        184,
+        163,
+        155,
+        163,
+        136,
+        133,
+        142,
+        108,
+        110,
+        121,
+        81,
+        88,
+        100,
+        54,
+        65,
+        79,
+        27,
+        229,
+        177,
+        247,
+        209,
+        158,
+        241,
+        190,
+        138,
+        236,
+        170,
+        119,
+        230,
+        151,
+        100,
+        224,
+        131,
+        80,
+        219,
+        112,
+        61,
+        213,
+        92,
+        42,
+        207,
+        243,
+        218,
+        155,
+        237,
+        207,
+        133,
+        230,
+        197,
+        111,
+        224,
+        186,
+        89,
+        218,
+        175,
+        66,
+        212,
+        164,
+        44,
+        205,
+        154,
+        22,
+        199,
+        143,
+        0,
+        184,
+        131,
+        0,
+        169,
+        120,
+        0,
+        140,
+        97,
+        0,
+        125,
+        85,
+        0,
+        110,
+        73,
+        0,
+        95,
+        62,
+        0,
+        225,
+        194,
+        119,
+        209,
+        178,
+        109,
+        192,
+        162,
+        99,
+        176,
+        146,
+        89,
+        160,
+        129,
+        79,
+        143,
+        113,
+        69,
+        127,
+        97,
+        60,
+        111,
+        81,
+        50,
+        94,
+        65,
+        40,
+        78,
+        49,
+        30,
+        62,
+        32,
+        20,
+        45,
+        16,
+        10,
+        29,
+        0,
+        0,
+        237,
+        249,
+        220,
+        218,
+        242,
+        198,
+        182,
+        229,
+        141,
+        146,
+        217,
+        85,
+        128,
+        204,
+        84,
+        111,
+        192,
+        84,
+        93,
+        179,
+        83,
+        75,
+        166,
+        82,
+        69,
+        153,
+        76,
+        63,
+        139,
+        69,
+        55,
+        122,
+        60,
+        47,
+        104,
+        52,
+        39,
+        87,
+        43,
+        31,
+        69,
+        34,
+        23,
+        52,
+        26,
+        15,
+        34,
+        17,
+        186,
+        232,
+        218,
+        173,
+        219,
+        207,
+        160,
+        207,
+        195,
+        148,
+        194,
+        184,
+        135,
+        181,
+        173,
+        122,
+        168,
+        161,
+        109,
+        156,
+        150,
+        97,
+        143,
+        139,
+        84,
+        130,
+        127,
+        71,
+        118,
+        116,
+        58,
+        105,
+        104,
+        45,
+        92,
+        93,
+        33,
+        79,
+        82,
+        20,
+        67,
+        70,
+        7,
+        54,
+        59,
+        160,
+        200,
+        246,
+        149,
+        190,
+        237,
+        137,
+        180,
+        227,
+        126,
+        169,
+        218,
+        114,
+        159,
+        208,
+        103,
+        149,
+        199,
+        91,
+        139,
+        189,
+        80,
+        129,
+        180,
+        69,
+        118,
+        171,
+        57,
+        108,
+        161,
+        46,
+        98,
+        152,
+        34,
+        88,
+        142,
+        23,
+        77,
+        133,
+        11,
+        67,
+        123,
+        0,
+        57,
+        114,
+        227,
+        248,
+        255,
+        207,
+        237,
+        248,
+        186,
+        226,
+        241,
+        166,
+        215,
+        234,
+        146,
+        203,
+        228,
+        126,
+        192,
+        221,
+        105,
+        181,
+        214,
+        85,
+        170,
+        207,
+        74,
+        154,
+        191,
+        64,
+        139,
+        174,
+        53,
+        123,
+        158,
+        43,
+        107,
+        142,
+        32,
+        91,
+        125,
+        21,
+        76,
+        109,
+        11,
+        60,
+        92,
+        0,
+        44,
+        76,
+        250,
+        250,
+        250,
+        224,
+        224,
+        224,
+        199,
+        199,
+        199,
+        173,
+        173,
+        173,
+        148,
+        148,
+        148,
+        122,
+        122,
+        122,
+        97,
+        97,
+        97,
+        71,
+        71,
+        71,
+        46,
+        46,
+        46,
+        20,
+        20,
+        20,
+        216,
+        216,
+        197,
+        199,
+        200,
+        175,
+        181,
+        185,
+        153,
+        164,
+        169,
+        131,
+        146,
+        153,
+        108,
+        129,
+        138,
+        86,
+        111,
+        122,
+        64,
+        220,
+        224,
+        225,
+        205,
+        211,
+        213,
+        191,
+        199,
+        202,
+        176,
+        187,
+        190,
+        162,
+        175,
+        179,
+        148,
+        162,
+        167,
+        133,
+        150,
+        156,
+        119,
+        138,
+        144,
+        104,
+        126,
+        133,
+        90,
+        113,
+        121,
+        76,
+        101,
+        110,
+        61,
+        89,
+        98,
+        47,
+        77,
+        87,
+        32,
+        64,
+        75,
+        73,
+        22,
+        202,
+        53,
+        3,
+        196,
+        245,
+        229,
+        184,
+        242,
+        223,
+        166,
+        240,
+        216,
+        149,
+        237,
+        210,
+        132,
+        239,
+        219,
+        140,
+        228,
+        208,
+        133,
+        217,
+        197,
+        125,
+        206,
+        186,
+        118,
+        195,
+        175,
+        111,
+        184,
+        165,
+        103,
+        173,
+        154,
+        96,
+        162,
+        143,
+        89,
+        151,
+        132,
+        81,
+        140,
+        121,
+        74,
+        255,
+        255,
+        222,
+        255,
+        255,
+        190,
+        255,
+        255,
+        159,
+        255,
+        255,
+        127,
+        255,
+        255,
+        95,
+        255,
+        255,
+        63,
+        255,
+        252,
+        0,
+        255,
+        236,
+        0,
+        255,
+        216,
+        0,
+        255,
+        197,
+        0,
+        255,
+        178,
+        0,
+        255,
+        158,
+        0,
+        255,
+        139,
+        0,
+        255,
+        119,
+        0,
+        255,
+        100,
+        0,
+        255,
+        100,
+        0,
+        245,
+        86,
+        0,
+        235,
+        72,
+        1,
+        225,
+        58,
+        1,
+        215,
+        44,
+        1,
+        205,
+        30,
+        1,
+        195,
+        16,
+        2,
+        167,
+        2,
+        2,
+        149,
+        2,
+        2,
+        131,
+        1,
+        1,
+        113,
+        1,
+        1,
+        76,
+        1,
+        1,
+        40,
+        0,
+        0,
+        243,
+        223,
+        223,
+        224,
+        195,
+        194,
+        204,
+        167,
+        165,
+        185,
+        139,
+        136,
+        166,
+        111,
+        106,
+        146,
+        83,
+        77,
+        150,
+        195,
+        245,
+        95,
+        160,
+        30,
+        70,
+        125,
+        195,
+        30,
+        85,
+        155,
+        55,
+        65,
+        70,
+        30,
+        35,
+        40,
+        240,
+        251,
+        255,
+        165,
+        110,
+        58,
+        128,
+        128,
+        128,
+        0,
+        0,
+        255,
+        0,
+        255,
+        0,
+        0,
+        255,
+        255,
+        255,
+        0,
+        0,
+        255,
+        128,
+        255,
+        255,
+        255,
+        0,
+        255,
+        255,
+        255,
+    ])
+
+    @staticmethod
+    def read_palette_file(path) -> Palette:
+        """读取调色板文件（236 色 BGR，708 字节），与固定的首尾各 16 色拼成 256 色调色板"""
+        return Palette.load(path, Graphic.__parse_palette)
+
+    @staticmethod
+    def __parse_palette(data: bytes) -> Palette:
+        head = [
+            0x00,
+            0x00,
+            0x00,
+            0x00,
+            0x00,
+            0x80,
+            0x00,
+            0x80,
+            0x00,
+            0x00,
+            0x80,
+            0x80,
+            0x80,
+            0x00,
+            0x80,
+            0x80,
+            0x00,
+            0x00,
+            0x80,
+            0x80,
+            0x00,
+            0xC0,
+            0xC0,
+            0xC0,
+            0xC0,
+            0xDC,
+            0xC0,
+            0xF0,
+            0xCA,
+            0xA6,
+            0x00,
+            0x00,
+            0xDE,
+            0x00,
+            0x5F,
+            0xFF,
+            0xA0,
+            0xFF,
+            0xFF,
+            0xD2,
+            0x5F,
+            0x00,
+            0xFF,
+            0xD2,
+            0x50,
+            0x28,
+            0xE1,
+            0x28,
+        ]
+        foot = [
+            0x96,
+            0xC3,
+            0xF5,
+            0x5F,
+            0xA0,
+            0x1E,
+            0x46,
+            0x7D,
+            0xC3,
+            0x1E,
+            0x55,
+            0x9B,
+            0x37,
+            0x41,
+            0x46,
+            0x1E,
+            0x23,
+            0x28,
+            0xF0,
+            0xFB,
+            0xFF,
+            0xA5,
+            0x6E,
+            0x3A,
+            0x80,
+            0x80,
+            0x80,
+            0x00,
+            0x00,
+            0xFF,
+            0x00,
+            0xFF,
+            0x00,
+            0x00,
+            0xFF,
+            0xFF,
+            0xFF,
+            0x00,
+            0x00,
+            0xFF,
+            0x80,
+            0xFF,
+            0xFF,
+            0xFF,
+            0x00,
+            0xFF,
+            0xFF,
+            0xFF,
+        ]
+        if len(data) != 708:
+            raise ValueError(f"Invalid palette file, size: {len(data)}")
+        # trans to rgb
+        middle = np.frombuffer(data, dtype=np.uint8).reshape(-1, 3)[:, ::-1].tobytes()
+        return Palette(bytes(head) + middle[:-36] + bytes(foot))
+
+    def __init__(self, path: str, sequence: int, index: "GraphicIndex" = None):
+        self.path = path
+        self.dir_path = os.path.dirname(path)
+        self.info_path = path.replace("Graphic", "GraphicInfo")
+        self.sequence = sequence
+        if index is not None:
+            record = index.record(sequence)
+        else:
+            with STATS.stage("info"), open(self.info_path, "rb") as file:
+                data = file.seek(self.sequence * 40, os.SEEK_SET)
+                data = file.read(40)
+            record = struct.unpack("<lLLllLLbbb5bL", data)
+
+        if self.sequence != record[0]:
+            raise ValueError(f"Sequence mismatch: {self.sequence} != {record[0]}")
+
+        # sequence=record[0],
+        self.address = record[1]
+        self.block_length = record[2]
+        self.offset_x = record[3]
+        self.offset_y = record[4]
+        self.width = record[5]
+        self.height = record[6]
+        # area_east=record[7],
+        # area_south=record[8],
+        # flag=record[9],
+        # unknown=list(record[10:15]),
+        # map_number=record[15]
+
+    # Decoder used by read(): "batch" builds a run table and expands it with
+    # NumPy (see __decode_batch), "reference" is the original byte-by-byte
+    # decoder kept for comparison.
+    decode_engine = "batch"
+
+    @staticmethod
+    def decode_block(graphic_bytes, size_hint: int = 0, engine: str = None) -> bytes:
+        if engine is None:
+            engine = Graphic.decode_engine
+        with STATS.stage("decode"):
+            # Both decoders index past the end of a truncated or corrupt block; report it as ValueError
+            try:
+                if engine == "batch":
+                    data = Graphic.__decode_batch(graphic_bytes, len(graphic_bytes), size_hint)
+                elif engine == "reference":
+                    data = Graphic.__decode_reference(graphic_bytes, len(graphic_bytes))
+                else:
+                    raise ValueError(f"Unknown decode engine: {engine}")
+            except IndexError as e:
+                raise ValueError(f"Truncated or corrupt graphic block: {e}") from e
+        STATS.count("bytes_decoded", len(data))
+        return data
+
+    def __decode(self, graphic_bytes, length):
+        return Graphic.decode_block(
+            graphic_bytes[:length], self.width * self.height
+        )
+
+    # Per high nibble: weights of the low nibble and bytes 1..3 in the run count,
+    # header length and kind (0 literal, 1 fill, 2 transparent, 3 invalid/skipped)
+    _run_weights = np.array(
+        [
+            [1, 0, 0, 0],
+            [0x100, 1, 0, 0],
+            [0x10000, 0x100, 1, 0],
+            [0, 0, 0, 0],
+            [0, 0, 0, 0],
+            [0, 0, 0, 0],
+            [0, 0, 0, 0],
+            [0, 0, 0, 0],
+            [1, 0, 0, 0],
+            [0x100, 0, 1, 0],
+            [0x10000, 0, 0x100, 1],
+            [0, 0, 0, 0],
+            [1, 0, 0, 0],
+            [0x100, 1, 0, 0],
+            [0x10000, 0x100, 1, 0],
+            [0, 0, 0, 0],
+        ],
+        dtype=np.int64,
+    )
+    _run_headers = np.array([1, 2, 3, 1, 1, 1, 1, 1, 2, 3, 4, 1, 1, 2, 3, 1], dtype=np.int64)
+    _run_kinds = np.array([0, 0, 0, 3, 3, 3, 3, 3, 1, 1, 1, 3, 2, 2, 2, 3], dtype=np.int64)
+    # Opcode length per first byte for the scan; -1/-2 mark the long literals
+    # whose length needs the following count bytes
+    _run_steps = [
+        1 + (op & 0x0F) if op < 0x10 else (0, -1, -2, 1, 1, 1, 1, 1, 2, 3, 4, 1, 1, 2, 3, 1)[op >> 4]
+        for op in range(256)
+    ]
+    # The run table pays off for many short opcodes. Literal-heavy blocks (more
+    # than run_table_max_ratio source bytes per pixel) and blocks with fewer than
+    # run_table_min_ops opcodes are decoded run by run with slice copies instead,
+    # since there NumPy's per-call overhead outweighs the per-opcode work.
+    run_table_min_ops = 128
+    run_table_max_ratio = 0.5
+
+    @staticmethod
+    def __decode_batch(graphic_bytes, length, size_hint=0) -> bytes:
+        # One sequential scan records where each opcode starts; counts, kinds
+        # and source offsets of all runs are then computed at once, fills and
+        # transparent runs are expanded with a single np.repeat and literal
+        # runs are copied in afterwards.
+        src = graphic_bytes
+        if size_hint and length > size_hint * Graphic.run_table_max_ratio:
+            return Graphic.__decode_slices(src, length, size_hint)
+        steps = Graphic._run_steps
+        starts = []
+        append = starts.append
+        i_pos = 0
+        while i_pos < length:
+            append(i_pos)
+            step = steps[src[i_pos]]
+            if step < 0:
+                if step == -1:
+                    step = 2 + (src[i_pos] & 0x0F) * 0x100 + src[i_pos + 1]
+                else:
+                    step = 3 + (src[i_pos] & 0x0F) * 0x10000 + src[i_pos + 1] * 0x100 + src[i_pos + 2]
+            i_pos += step
+        if len(starts) < Graphic.run_table_min_ops:
+            return Graphic.__decode_slices(src, length, size_hint)
+
+        # Padded so count bytes past the end read as zero; checked below
+        buffer = np.zeros(length + 4, dtype=np.uint8)
+        buffer[:length] = np.frombuffer(src, dtype=np.uint8, count=length)
+        starts = np.array(starts, dtype=np.int64)
+        window = buffer[starts[:, None] + np.arange(4)].astype(np.int64)
+        high = window[:, 0] >> 4
+        window[:, 0] &= 0x0F
+        counts = np.einsum("ij,ij->i", window, Graphic._run_weights[high])
+        kinds = Graphic._run_kinds[high]
+        first = starts + Graphic._run_headers[high]
+        literal = kinds == 0
+        if (first + counts * literal).max() > length:
+            raise IndexError("Run exceeds graphic block")
+
+        out = np.repeat(np.where(kinds == 1, window[:, 1], 0).astype(np.uint8), counts)
+        dst = (np.cumsum(counts) - counts)[literal]
+        offsets = first[literal]
+        counts = counts[literal]
+        total = int(counts.sum())
+        if len(counts) * 64 < total:
+            for pos, i_pos, count in zip(dst.tolist(), offsets.tolist(), counts.tolist()):
+                out[pos : pos + count] = buffer[i_pos : i_pos + count]
+        elif total:
+            within = np.arange(total) - np.repeat(np.cumsum(counts) - counts, counts)
+            out[np.repeat(dst, counts) + within] = buffer[np.repeat(offsets, counts) + within]
+        return out.tobytes()
+
+    @staticmethod
+    def __decode_slices(graphic_bytes, length, size_hint=0) -> bytes:
+        # Runs are written with slice assignment into a buffer preallocated to
+        # width*height; transparent runs only advance the cursor because the
+        # buffer is zero-filled. The buffer grows if the block decodes longer.
+        src = graphic_bytes
+        out = bytearray(size_hint)
+        out_len = size_hint
+        pos = 0
+        i_pos = 0
+        while i_pos < length:
+            op = src[i_pos]
+            high_nibble = op & 0xF0
+
+            if high_nibble == 0x00:
+                count = op & 0x0F
+                i_pos += 1
+            elif high_nibble == 0x10:
+                count = (op & 0x0F) * 0x100 + src[i_pos + 1]
+                i_pos += 2
+            elif high_nibble == 0x20:
+                count = (op & 0x0F) * 0x10000 + src[i_pos + 1] * 0x100 + src[i_pos + 2]
+                i_pos += 3
+            elif high_nibble == 0x80:
+                count = op & 0x0F
+                x = src[i_pos + 1]
+                i_pos += 2
+            elif high_nibble == 0x90:
+                count = (op & 0x0F) * 0x100 + src[i_pos + 2]
+                x = src[i_pos + 1]
+                i_pos += 3
+            elif high_nibble == 0xA0:
+                count = (op & 0x0F) * 0x10000 + src[i_pos + 2] * 0x100 + src[i_pos + 3]
+                x = src[i_pos + 1]
+                i_pos += 4
+            elif high_nibble == 0xC0:
+                pos += op & 0x0F
+                i_pos += 1
+                continue
+            elif high_nibble == 0xD0:
+                pos += (op & 0x0F) * 0x100 + src[i_pos + 1]
+                i_pos += 2
+                continue
+            elif high_nibble == 0xE0:
+                pos += (op & 0x0F) * 0x10000 + src[i_pos + 1] * 0x100 + src[i_pos + 2]
+                i_pos += 3
+                continue
+            else:
+                # Skip invalid high nibble
+                i_pos += 1
+                continue
+
+            end = pos + count
+            if end > out_len:
+                out.extend(bytes(end - out_len))
+                out_len = end
+            if high_nibble < 0x80:
+                if i_pos + count > length:
+                    raise IndexError("Literal run exceeds graphic block")
+                out[pos:end] = src[i_pos : i_pos + count]
+                i_pos += count
+            else:
+                out[pos:end] = bytes((x,)) * count
+            pos = end
+
+        if pos < out_len:
+            del out[pos:]
+        elif pos > out_len:
+            out.extend(bytes(pos - out_len))
+        return bytes(out)
+
+    @staticmethod
+    def __decode_reference(graphic_bytes, length):
+        decoded_data = []
+        i_pos = 0
+        while i_pos < length:
+            # Extract high 4 bits of the first byte
+            high_nibble = graphic_bytes[i_pos] & 0xF0
+
+            if high_nibble == 0x00:
+                # 0x0n: n consecutive characters follow
+                count = graphic_bytes[i_pos] & 0x0F
+                i_pos += 1
+                for _ in range(count):
+                    decoded_data.append(graphic_bytes[i_pos])
+                    i_pos += 1
+
+            elif high_nibble == 0x10:
+                # 0x1n: n*0x100 + x consecutive characters
+                count = (graphic_bytes[i_pos] & 0x0F) * 0x100 + graphic_bytes[i_pos + 1]
+                i_pos += 2
+                for _ in range(count):
+                    decoded_data.append(graphic_bytes[i_pos])
+                    i_pos += 1
+
+            elif high_nibble == 0x20:
+                # 0x2n: n*0x10000 + x*0x100 + y consecutive characters
+                count = (
+                    (graphic_bytes[i_pos] & 0x0F) * 0x10000
+                    + graphic_bytes[i_pos + 1] * 0x100
+                    + graphic_bytes[i_pos + 2]
+                )
+                i_pos += 3
+                for _ in range(count):
+                    decoded_data.append(graphic_bytes[i_pos])
+                    i_pos += 1
+
+            elif high_nibble == 0x80:
+                # 0x8n: n consecutive X characters
+                count = graphic_bytes[i_pos] & 0x0F
+                x = graphic_bytes[i_pos + 1]
+                decoded_data.extend([x] * count)
+                i_pos += 2
+
+            elif high_nibble == 0x90:
+                # 0x9n: n*0x100 + m consecutive X characters
+                count = (graphic_bytes[i_pos] & 0x0F) * 0x100 + graphic_bytes[i_pos + 2]
+                x = graphic_bytes[i_pos + 1]
+                decoded_data.extend([x] * count)
+                i_pos += 3
+
+            elif high_nibble == 0xA0:
+                # 0xAn: n*0x10000 + m*0x100 + z consecutive X characters
+                count = (
+                    (graphic_bytes[i_pos] & 0x0F) * 0x10000
+                    + graphic_bytes[i_pos + 2] * 0x100
+                    + graphic_bytes[i_pos + 3]
+                )
+                x = graphic_bytes[i_pos + 1]
+                decoded_data.extend([x] * count)
+                i_pos += 4
+
+            elif high_nibble == 0xC0:
+                # 0xCn: n consecutive background color (0)
+                count = graphic_bytes[i_pos] & 0x0F
+                decoded_data.extend([0] * count)
+                i_pos += 1
+
+            elif high_nibble == 0xD0:
+                # 0xDn: n*0x100 + m consecutive background color (0)
+                count = (graphic_bytes[i_pos] & 0x0F) * 0x100 + graphic_bytes[i_pos + 1]
+                decoded_data.extend([0] * count)
+                i_pos += 2
+
+            elif high_nibble == 0xE0:
+                # 0xEn: n*0x10000 + x*0x100 + y consecutive background color (0)
+                count = (
+                    (graphic_bytes[i_pos] & 0x0F) * 0x10000
+                    + graphic_bytes[i_pos + 1] * 0x100
+                    + graphic_bytes[i_pos + 2]
+                )
+                decoded_data.extend([0] * count)
+                i_pos += 3
+
+            else:
+                # Skip invalid high nibble
+                i_pos += 1
+        return bytes(decoded_data)
+
+    # Converter used by read(): "array" maps the whole frame through a 256-entry
+    # RGBA lookup table, "reference" is the original per-pixel loop.
+    to_image_engine = "array"
+
+    @staticmethod
+    def palette_lut(palette: Palette) -> np.ndarray:
+        """256x4 uint8 RGBA table for a palette; alpha is 0 for black."""
+        return Palette.of(palette).lut
+
+    def to_image(self, image_bytes, palette: Palette = None) -> Image.Image:
+        """把解码后的索引像素按 to_image_engine 转换为 RGBA 图像，不经过帧缓存"""
+        if palette is None:
+            palette = self._defalult_palette
+        return self.__to_image(image_bytes, palette)
+
+    def __to_image(self, image_bytes, palette: Palette) -> Image.Image:
+        with STATS.stage("to_image"):
+            if Graphic.to_image_engine == "reference":
+                return self.__to_image_reference(image_bytes, palette)
+            return self.__to_image_array(image_bytes, palette)
+
+    def __to_image_array(self, image_bytes, palette: Palette) -> Image.Image:
+        try:
+            size = self.width * self.height
+            if len(image_bytes) < size:
+                raise ValueError(
+                    f"Graphic bytes length {len(image_bytes)} is less than image size {size}"
+                )
+            lut = Graphic.palette_lut(palette)
+            # Rows are stored bottom-up; the reversed view flips without copying
+            indices = np.frombuffer(image_bytes, dtype=np.uint8, count=size)
+            rows = indices.reshape(self.height, self.width)[::-1]
+            return Image.fromarray(lut[rows])
+
+        except ValueError as e:
+            print(f"Error converting image: {str(e)}")
+            return None
+        except Exception as e:
+            print(f"Unexpected error: {str(e)}")
+            return None
+
+    def __to_image_reference(self, image_bytes, palette: Palette) -> Image.Image:
+        try:
+            rgba_data = bytearray(self.width * self.height * 4)
+            flipped_indices = [
+                (self.height - i // self.width - 1) * self.width + i % self.width
+                for i in range(self.width * self.height)
+            ]
+
+            if len(image_bytes) < self.width * self.height:
+                raise ValueError(
+                    f"Graphic bytes length {len(image_bytes)} is less than image size {self.width * self.height}"
+                )
+
+            if len(palette) < 768:  # 256 colors * 3 channels
+                raise ValueError(f"Palette length {len(palette)} is invalid")
+
+            for i, idx in enumerate(flipped_indices):
+                cIdx = image_bytes[i] * 3
+                if cIdx + 2 >= len(palette):
+                    raise IndexError(f"Color index {cIdx} out of palette range")
+
+                r, g, b = palette[cIdx], palette[cIdx + 1], palette[cIdx + 2]
+                pixel_pos = idx * 4
+                rgba_data[pixel_pos] = r
+                rgba_data[pixel_pos + 1] = g
+                rgba_data[pixel_pos + 2] = b
+                rgba_data[pixel_pos + 3] = 255 if (r != 0 or g != 0 or b != 0) else 0
+
+            return Image.frombytes("RGBA", (self.width, self.height), bytes(rgba_data))
+
+        except (ValueError, IndexError) as e:
+            print(f"Error converting image: {str(e)}")
+            return None
+        except Exception as e:
+            print(f"Unexpected error: {str(e)}")
+            return None
+
+    # Shared by all Graphic instances. The public read methods hand out copies; the underscore
+    # variants return the cached objects themselves and are only for callers that never modify them
+    frame_cache = FrameCache()
+
+    def cache_key(self, palette: Palette = None, color_mode: str = "RGBA") -> tuple:
+        """frame_cache 中本图像的 key：索引图像与调色板无关，RGBA 图像按调色板内容区分"""
+        if color_mode == "P":
+            return (self.path, self.sequence, "P")
+        return (self.path, self.sequence, Palette.of(palette).key)
+
+    def read(self, palette: Palette = None, block=None) -> Image.Image:
+        """读取 RGBA 图像；block 为预读的完整块（含 16 字节头），不传时从映射的文件读取
+
+        返回的是缓存图像的副本，可以任意修改
+        """
+        image = self._read(palette, block)
+        return image.copy() if image is not None else None
+
+    def _read(self, palette: Palette = None, block=None) -> Image.Image:
+        """同 read，但返回 frame_cache 中共享的图像，调用方不得修改"""
+        palette = Palette.of(palette)
+        key = self.cache_key(palette)
+        cached = Graphic.frame_cache.get(key)
+        if cached is not None:
+            STATS.count("cache_hits")
+            return cached
+        STATS.count("cache_misses")
+        data = self.__read_bytes(block)
+        image = self.__to_image(data, palette)
+        if image is not None:
+            Graphic.frame_cache.put(key, image, self.width * self.height * 4)
+        return image
+
+    def read_indexed(self, block=None) -> Image.Image:
+        """读取索引像素，返回按正常方向排列的 P 模式图像；调色板由 apply_palette 在合成后统一设置
+
+        返回的是缓存图像的副本，可以任意修改
+        """
+        image = self._read_indexed(block)
+        return image.copy() if image is not None else None
+
+    def _read_indexed(self, block=None) -> Image.Image:
+        """同 read_indexed，但返回 frame_cache 中共享的图像，调用方不得修改"""
+        key = self.cache_key(color_mode="P")
+        cached = Graphic.frame_cache.get(key)
+        if cached is not None:
+            STATS.count("cache_hits")
+            return cached
+        STATS.count("cache_misses")
+        try:
+            data = self.__read_bytes(block)
+            size = self.width * self.height
+            if len(data) < size:
+                raise ValueError(
+                    f"Graphic bytes length {len(data)} is less than image size {size}"
+                )
+            # Rows are stored bottom-up; a negative stride flips them while unpacking
+            with STATS.stage("to_image"):
+                image = Image.frombytes(
+                    "P", (self.width, self.height), data[:size], "raw", "P", 0, -1
+                )
+        except ValueError as e:
+            print(f"Error reading indexed image: {str(e)}")
+            return None
+        Graphic.frame_cache.put(key, image, size)
+        return image
+
+    @staticmethod
+    def apply_palette(image: Image.Image, palette: Palette = None) -> Image.Image:
+        """为 P 模式图像设置调色板和 tRNS 透明表（黑色透明），保存 PNG 时一并写出"""
+        palette = Palette.of(palette)
+        image.putpalette(palette.rgb)
+        image.info["transparency"] = palette.alpha
+        return image
+
+    @staticmethod
+    def colorize(image: Image.Image, palette: Palette = None, color_mode: str = "P") -> Image.Image:
+        """把索引空间合成的 P 模式图像按调色板输出：color_mode 为 "P" 时就地设置调色板，
+        为 "RGBA" 时用调色板的 RGBA 查找表转换为新图像；同一张合成图可以依次套用多个调色板"""
+        if color_mode == "P":
+            return Graphic.apply_palette(image, palette)
+        with STATS.stage("to_image"):
+            return Image.fromarray(Palette.of(palette).lut[np.asarray(image)])
+
+    @staticmethod
+    def opaque_bbox(image: Image.Image, palette: Palette = None):
+        """不透明像素的包围盒，全透明时返回 None；P 模式按调色板的透明规则判断"""
+        if image.mode != "P":
+            return image.getchannel("A").getbbox()
+        alpha = Palette.of(palette).lut[:, 3]
+        return Image.fromarray(alpha[np.asarray(image)]).getbbox()
+
+    def raw_block(self) -> memoryview:
+        return GraphicArchive.open(self.path).raw_block(self.address)
+
+    @staticmethod
+    def read_many(
+        graphics: List["Graphic"], palette: Palette = None, color_mode: str = "P"
+    ) -> List[Image.Image]:
+        """读取一组图像，返回与 graphics 顺序一致的列表（读取失败的为 None），图像均为副本
+
+        已在 frame_cache 中的直接取用，其余由 FramePrefetcher 在后台线程预读原始块，
+        解码与读取重叠；同一图像只读一次
+        """
+        images = Graphic._read_many(graphics, palette, color_mode)
+        return [image.copy() if image is not None else None for image in images]
+
+    @staticmethod
+    def _read_many(
+        graphics: List["Graphic"], palette: Palette = None, color_mode: str = "P"
+    ) -> List[Image.Image]:
+        """同 read_many，但返回 frame_cache 中共享的图像，调用方不得修改"""
+        if palette is None:
+            palette = Graphic._defalult_palette
+        images = {}
+        pending = []
+        for graphic in graphics:
+            key = (graphic.path, graphic.sequence)
+            if key in images:
+                continue
+            images[key] = None
+            if graphic.cache_key(palette, color_mode) in Graphic.frame_cache:
+                images[key] = Graphic.__read_one(graphic, palette, color_mode, None)
+            else:
+                pending.append(graphic)
+        for graphic, block in FramePrefetcher(pending):
+            images[(graphic.path, graphic.sequence)] = Graphic.__read_one(
+                graphic, palette, color_mode, block
+            )
+        return [images[(graphic.path, graphic.sequence)] for graphic in graphics]
+
+    @staticmethod
+    def __read_one(graphic: "Graphic", palette, color_mode: str, block) -> Image.Image:
+        try:
+            if color_mode == "P":
+                return graphic._read_indexed(block)
+            return graphic._read(palette, block)
+        except Exception as e:
+            print(f"读取图像失败（sequence：{graphic.sequence}）：{e}")
+            return None
+
+    def __read_bytes(self, block=None):
+        with STATS.stage("read"):
+            if block is None:
+                version, data = GraphicArchive.open(self.path).block(self.address)
+                STATS.count("bytes_read", len(data) + 16)
+            else:
+                record = GraphicArchive.unpack_header(block[:16], self.address, self.path)
+                if record[5] > len(block):
+                    raise ValueError(f"Truncated block at {self.address} in {self.path}")
+                version, data = record[1], memoryview(block)[16 : record[5]]
+            if version:
+                return self.__decode(data, len(data))
+            return bytes(data)
+
+
+class GraphicArchive:
+    """Graphic*.bin 的只读内存映射，每个文件在进程内只映射一次"""
+
+    _archives = {}
+    _lock = threading.Lock()
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, "rb") as file:
+            self._mmap = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        self._view = memoryview(self._mmap)
+
+    @staticmethod
+    def open(path: str) -> "GraphicArchive":
+        archive = GraphicArchive._archives.get(path)
+        if archive is None:
+            with GraphicArchive._lock:
+                archive = GraphicArchive._archives.get(path)
+                if archive is None:
+                    archive = GraphicArchive(path)
+                    GraphicArchive._archives[path] = archive
+        return archive
+
+    def __len__(self) -> int:
+        return len(self._mmap)
+
+    def block(self, address: int):
+        """返回 (version, payload)，payload 是映射内存的 memoryview，不复制"""
+        header = self._view[address : address + 16]
+        record = GraphicArchive.unpack_header(header, address, self.path)
+        end = address + record[5]
+        if end > len(self._view):
+            raise ValueError(f"Invalid block length {record[5]} at {address} in {self.path}")
+        return record[1], self._view[address + 16 : end]
+
+    @staticmethod
+    def unpack_header(header, address: int, path: str) -> tuple:
+        """解析并校验 16 字节块头"""
+        if len(header) < 16:
+            raise ValueError(f"Block header out of range at {address} in {path}")
+        # magicNumber=record[0],
+        # version=record[1]
+        # unknown=record[2],
+        # width=record[3],
+        # height=record[4],
+        # blocklength=record[5],
+        record = struct.unpack("<2sbblll", header)
+        if record[0] != b"RD":
+            raise ValueError(f"Invalid block magic {record[0]!r} at {address} in {path}")
+        if record[5] < 16:
+            raise ValueError(f"Invalid block length {record[5]} at {address} in {path}")
+        return record
+
+    def raw_block(self, address: int) -> memoryview:
+        """返回包含 16 字节头的完整块，不复制"""
+        _, payload = self.block(address)
+        return self._view[address : address + 16 + len(payload)]
+
+
+class FramePrefetcher:
+    """在后台线程中预读帧的原始块，迭代时产出 (Graphic, 完整块)
+
+    sort 为 True 时按地址排序，并把间隔不超过 merge_gap 的相邻块合并为一次不超过 max_span 字节的读取，
+    随机读变为近似顺序读，产出顺序为地址顺序；为 False 时按给定顺序逐块读取和产出。
+    预读用普通文件读取（读取期间释放 GIL），解码在调用方线程进行，两者互相重叠；
+    在途的读取不超过 depth 次，总字节数不超过 max_bytes（至少保留一次）；depth 为 0 时不使用线程
+    """
+
+    depth = 32
+    max_bytes = 16 * 1024 * 1024
+    workers = 2
+    merge_gap = 64 * 1024
+    max_span = 4 * 1024 * 1024
+
+    def __init__(
+        self,
+        graphics: List["Graphic"],
+        depth: int = None,
+        max_bytes: int = None,
+        workers: int = None,
+        sort: bool = True,
+    ):
+        self.depth = FramePrefetcher.depth if depth is None else depth
+        self.max_bytes = FramePrefetcher.max_bytes if max_bytes is None else max_bytes
+        self.workers = FramePrefetcher.workers if workers is None else workers
+        self.spans = FramePrefetcher.plan(graphics, sort)
+        self._local = threading.local()
+        self._files = []
+        self._files_lock = threading.Lock()
+
+    @staticmethod
+    def configure(
+        depth: int = None,
+        max_bytes: int = None,
+        workers: int = None,
+        merge_gap: int = None,
+        max_span: int = None,
+    ) -> None:
+        """修改进程内的默认设置，None 表示保持不变"""
+        if depth is not None:
+            FramePrefetcher.depth = depth
+        if max_bytes is not None:
+            FramePrefetcher.max_bytes = max_bytes
+        if workers is not None:
+            FramePrefetcher.workers = workers
+        if merge_gap is not None:
+            FramePrefetcher.merge_gap = merge_gap
+        if max_span is not None:
+            FramePrefetcher.max_span = max_span
+
+    @staticmethod
+    def plan(graphics: List["Graphic"], sort: bool = True) -> List[tuple]:
+        """把 graphics 划分为读取区间 (path, 起始地址, 长度, [Graphic])"""
+        if sort:
+            graphics = sorted(graphics, key=lambda graphic: (graphic.path, graphic.address))
+        spans = []
+        for graphic in graphics:
+            length = max(graphic.block_length, 16)
+            if sort and spans:
+                path, start, span_length, members = spans[-1]
+                end = graphic.address + length
+                if (
+                    path == graphic.path
+                    and graphic.address - (start + span_length) <= FramePrefetcher.merge_gap
+                    and end - start <= FramePrefetcher.max_span
+                ):
+                    members.append(graphic)
+                    spans[-1] = (path, start, max(span_length, end - start), members)
+                    continue
+            spans.append((graphic.path, graphic.address, length, [graphic]))
+        return spans
+
+    def __iter__(self):
+        try:
+            if self.depth <= 0 or self.workers <= 0:
+                for span in self.spans:
+                    yield from self.__fetch(span)
+                return
+            with ThreadPoolExecutor(max_workers=self.workers) as executor:
+                pending = deque()
+                pending_bytes = 0
+                position = 0
+                while position < len(self.spans) or pending:
+                    # 补满在途队列，超出字节上限时等待最早的读取被取走
+                    while position < len(self.spans) and len(pending) < self.depth:
+                        span = self.spans[position]
+                        if pending and pending_bytes + span[2] > self.max_bytes:
+                            break
+                        pending.append((span[2], executor.submit(self.__fetch, span)))
+                        pending_bytes += span[2]
+                        position += 1
+                    length, future = pending.popleft()
+                    pending_bytes -= length
+                    yield from future.result()
+        finally:
+            with self._files_lock:
+                for file in self._files:
+                    file.close()
+                self._files.clear()
+
+    def __file(self, path: str):
+        files = getattr(self._local, "files", None)
+        if files is None:
+            files = self._local.files = {}
+        file = files.get(path)
+        if file is None:
+            file = files[path] = open(path, "rb")
+            with self._files_lock:
+                self._files.append(file)
+        return file
+
+    def __fetch(self, span) -> List[tuple]:
+        path, start, length, members = span
+        with STATS.stage("prefetch"):
+            file = self.__file(path)
+            file.seek(start)
+            data = memoryview(file.read(length))
+            read = len(data)
+            blocks = []
+            for graphic in members:
+                offset = graphic.address - start
+                block = data[offset : offset + max(graphic.block_length, 16)]
+                try:
+                    # GraphicInfo 中的长度与块头不一致时以块头为准
+                    record = GraphicArchive.unpack_header(block[:16], graphic.address, path)
+                    if record[5] > len(block):
+                        file.seek(graphic.address)
+                        block = file.read(record[5])
+                        read += len(block)
+                except ValueError:
+                    # 交给调用方按原路径读取，由那里报告错误
+                    block = None
+                blocks.append((graphic, block))
+        STATS.count("bytes_read", read)
+        STATS.count("reads")
+        return blocks
+
+
+class GraphicIndex:
+    """GraphicInfo*.bin 的全部记录，一次读入结构化数组"""
+
+    dtype = np.dtype(
+        [
+            ("sequence", "<i4"),
+            ("address", "<u4"),
+            ("length", "<u4"),
+            ("offset_x", "<i4"),
+            ("offset_y", "<i4"),
+            ("width", "<u4"),
+            ("height", "<u4"),
+            ("area_east", "i1"),
+            ("area_south", "i1"),
+            ("flag", "i1"),
+            ("unknown", "i1", (5,)),
+            ("map_number", "<u4"),
+        ]
+    )
+
+    # load 返回的索引：info_path -> (文件大小, 修改时间, GraphicIndex)，LRU，最多 max_files 个
+    max_files = 16
+    _files = OrderedDict()
+    _lock = threading.Lock()
+
+    def __init__(self, info_path: str):
+        if not os.path.exists(info_path):
+            raise ValueError(f"Invalid path: {info_path}")
+        self.info_path = info_path
+        self.path = info_path.replace("GraphicInfo", "Graphic")
+        count = os.path.getsize(info_path) // self.dtype.itemsize
+        with STATS.stage("info"):
+            self.records = np.fromfile(info_path, dtype=self.dtype, count=count)
+        STATS.count("bytes_read", self.records.nbytes)
+
+        # 序号通常等于记录下标，此时直接按下标访问；否则建一张序号->下标的表
+        sequences = self.records["sequence"]
+        if np.array_equal(sequences, np.arange(len(sequences))):
+            self._positions = None
+        else:
+            self._positions = {int(seq): pos for pos, seq in enumerate(sequences)}
+        self._map_order = None
+        self._map_table = None
+
+    @staticmethod
+    def load(info_path: str) -> "GraphicIndex":
+        """按路径共享的索引，文件大小或修改时间变化后重新读取"""
+        if not os.path.exists(info_path):
+            raise ValueError(f"Invalid path: {info_path}")
+        stat = os.stat(info_path)
+        with GraphicIndex._lock:
+            cached = GraphicIndex._files.get(info_path)
+            if cached is not None and cached[:2] == (stat.st_size, stat.st_mtime_ns):
+                GraphicIndex._files.move_to_end(info_path)
+                return cached[2]
+        index = GraphicIndex(info_path)
+        with GraphicIndex._lock:
+            GraphicIndex._files[info_path] = (stat.st_size, stat.st_mtime_ns, index)
+            GraphicIndex._files.move_to_end(info_path)
+            while len(GraphicIndex._files) > GraphicIndex.max_files:
+                GraphicIndex._files.popitem(last=False)
+        return index
+
+    def __len__(self) -> int:
+        return len(self.records)
+
+    def position(self, sequence: int) -> int:
+        if self._positions is None:
+            if 0 <= sequence < len(self.records):
+                return sequence
+        elif sequence in self._positions:
+            return self._positions[sequence]
+        raise ValueError(f"Sequence not found in {self.info_path}: {sequence}")
+
+    def positions(self, sequences) -> np.ndarray:
+        """批量把 sequence 转换为记录下标"""
+        sequences = np.asarray(sequences, dtype=np.int64)
+        if self._positions is None:
+            if len(sequences) and (sequences.min() < 0 or sequences.max() >= len(self.records)):
+                raise ValueError(f"Sequence not found in {self.info_path}")
+            return sequences
+        return np.array([self.position(int(seq)) for seq in sequences], dtype=np.int64)
+
+    def record(self, sequence: int) -> tuple:
+        """与 struct.unpack("<lLLllLLbbb5bL") 相同布局的记录"""
+        raw = self.records[self.position(sequence)].tobytes()
+        return struct.unpack("<lLLllLLbbb5bL", raw)
+
+    def graphic(self, sequence: int) -> Graphic:
+        return Graphic(self.path, sequence, self)
+
+    def map_table(self) -> np.ndarray:
+        """以 map_number 为下标的 sequence 表，未使用的编号为 -1；相同编号取最小的 sequence"""
+        if self._map_table is None:
+            map_numbers = self.records["map_number"].astype(np.int64)
+            used = np.flatnonzero(map_numbers)
+            size = int(map_numbers.max()) + 1 if len(map_numbers) else 1
+            table = np.full(size, -1, dtype=np.int64)
+            numbers, first = np.unique(map_numbers[used], return_index=True)
+            table[numbers] = self.records["sequence"][used[first]]
+            self._map_table = table
+        return self._map_table
+
+    def find_by_map_number(self, map_number: int) -> int:
+        """返回 map_number 对应的 sequence，不存在时返回 None；0 表示没有地图编号，与 map_table 一致返回 None"""
+        if map_number <= 0:
+            return None
+        if self._map_order is None:
+            self._map_order = np.argsort(self.records["map_number"], kind="stable")
+        map_numbers = self.records["map_number"][self._map_order]
+        i = np.searchsorted(map_numbers, map_number)
+        if i < len(map_numbers) and map_numbers[i] == map_number:
+            return int(self.records["sequence"][self._map_order[i]])
+        return None
+
+    def iter_frames(
+        self,
+        start: int = None,
+        stop: int = None,
+        predicate=None,
+        buffer_size: int = 8 * 1024 * 1024,
+    ):
+        """按地址顺序顺序读取 Graphic 文件，逐帧产出 (Graphic, 解码后的索引像素)
+
+        start/stop 限定 sequence 范围，predicate 接收 GraphicInfo 记录并返回是否需要该帧；
+        每次读取至少 buffer_size 字节，内存占用不超过一个缓冲区加一帧
+        """
+        records = self.records
+        sequences = records["sequence"]
+        mask = np.ones(len(records), dtype=bool)
+        if start is not None:
+            mask &= sequences >= start
+        if stop is not None:
+            mask &= sequences < stop
+        positions = np.flatnonzero(mask)
+        positions = positions[np.argsort(records["address"][positions], kind="stable")]
+
+        buffer = b""
+        buffer_start = 0
+        with open(self.path, "rb") as file:
+            for pos in positions:
+                record = records[pos]
+                if predicate is not None and not predicate(record):
+                    continue
+                address = int(record["address"])
+                try:
+                    offset = address - buffer_start
+                    if offset < 0 or offset + 16 > len(buffer):
+                        file.seek(address, os.SEEK_SET)
+                        buffer = file.read(max(buffer_size, int(record["length"])))
+                        buffer_start = address
+                        offset = 0
+                    view = memoryview(buffer)
+                    header = GraphicArchive.unpack_header(
+                        view[offset : offset + 16], address, self.path
+                    )
+                    if offset + header[5] > len(buffer):
+                        file.seek(address, os.SEEK_SET)
+                        buffer = file.read(max(buffer_size, header[5]))
+                        buffer_start = address
+                        offset = 0
+                        view = memoryview(buffer)
+                        if header[5] > len(buffer):
+                            raise ValueError(
+                                f"Invalid block length {header[5]} at {address} in {self.path}"
+                            )
+                    graphic = self.graphic(int(record["sequence"]))
+                    payload = view[offset + 16 : offset + header[5]]
+                    if header[1]:
+                        pixels = Graphic.decode_block(payload, graphic.width * graphic.height)
+                    else:
+                        pixels = bytes(payload)
+                except ValueError as e:
+                    print(f"读取图像失败（sequence：{record['sequence']}）：{e}")
+                    continue
+                yield graphic, pixels
+
+    def larger_than(self, pixels: int) -> np.ndarray:
+        """面积（width*height）大于 pixels 的所有 sequence"""
+        area = self.records["width"].astype(np.int64) * self.records["height"]
+        return self.records["sequence"][area > pixels]
+
+
+class Action:
+    def __init__(
+        self,
+        direction,
+        action_type: ActionType,
+        duration,
+        graphics: list[Graphic] = None,
+        sequences: np.ndarray = None,
+        graphic_factory=None,
+    ):
+        """graphics 为 None 时按 sequences 延迟创建，首次访问 graphics 才调用 graphic_factory"""
+        self.direction = direction
+        self.type = action_type
+        self.duration = duration
+        self._graphics = graphics
+        if sequences is None:
+            sequences = np.array([graphic.sequence for graphic in graphics], dtype=np.uint32)
+        self.sequences = sequences
+        self._graphic_factory = graphic_factory
+
+    @property
+    def graphics(self) -> List[Graphic]:
+        if self._graphics is None:
+            self._graphics = [self._graphic_factory(int(seq)) for seq in self.sequences]
+        return self._graphics
+
+    def frame(self, index: int) -> Graphic:
+        """只创建单帧的 Graphic，不展开整个动作"""
+        if self._graphics is not None:
+            return self._graphics[index]
+        return self._graphic_factory(int(self.sequences[index]))
+
+
+class AnimeIndex:
+    """AnimeInfo*.bin 的全部记录，按 id 排序以便二分查找
+
+    记录以内存映射方式打开；给出 cache_path 时排序结果（下标和有序 id）写入缓存文件，
+    之后文件大小和修改时间未变时直接映射缓存文件，不再读取和排序
+    """
+
+    dtype = np.dtype(
+        [
+            ("id", "<u4"),
+            ("address", "<u4"),
+            ("action_count", "<u2"),
+            ("unknown", "<u2"),
+        ]
+    )
+    # 缓存文件头：标识、AnimeInfo 大小、修改时间、记录数，随后为 order 和 ids 两个 uint32 数组
+    _cache_header = struct.Struct("<8sQqQ")
+    _cache_magic = b"CGANIDX1"
+
+    # load 返回的索引：(info_path, cache_path) -> (文件大小, 修改时间, AnimeIndex)，LRU，最多 max_files 个
+    max_files = 16
+    _files = OrderedDict()
+    _lock = threading.Lock()
+
+    def __init__(self, info_path: str, cache_path: str = None):
+        if not os.path.exists(info_path):
+            raise ValueError(f"Invalid path: {info_path}")
+        self.info_path = info_path
+        stat = os.stat(info_path)
+        count = stat.st_size // self.dtype.itemsize
+        with STATS.stage("info"):
+            if count:
+                self.records = np.memmap(info_path, dtype=self.dtype, mode="r", shape=(count,))
+            else:
+                self.records = np.zeros(0, dtype=self.dtype)
+
+        if cache_path is not None and count and self.__read_cache(cache_path, stat, count):
+            return
+        STATS.count("bytes_read", self.records.nbytes)
+        # 稳定排序保证重复 id 时取最小的 sequence，与顺序扫描一致
+        self._order = np.argsort(self.records["id"], kind="stable").astype(np.uint32)
+        self._sorted_ids = self.records["id"][self._order]
+        if cache_path is not None and count:
+            self.__write_cache(cache_path, stat)
+
+    @staticmethod
+    def load(info_path: str, cache_path: str = None) -> "AnimeIndex":
+        """按路径共享的索引，文件大小或修改时间变化后重新读取"""
+        if not os.path.exists(info_path):
+            raise ValueError(f"Invalid path: {info_path}")
+        stat = os.stat(info_path)
+        key = (info_path, cache_path)
+        with AnimeIndex._lock:
+            cached = AnimeIndex._files.get(key)
+            if cached is not None and cached[:2] == (stat.st_size, stat.st_mtime_ns):
+                AnimeIndex._files.move_to_end(key)
+                return cached[2]
+        index = AnimeIndex(info_path, cache_path)
+        with AnimeIndex._lock:
+            AnimeIndex._files[key] = (stat.st_size, stat.st_mtime_ns, index)
+            AnimeIndex._files.move_to_end(key)
+            while len(AnimeIndex._files) > AnimeIndex.max_files:
+                AnimeIndex._files.popitem(last=False)
+        return index
+
+    def __len__(self) -> int:
+        return len(self.records)
+
+    def __read_cache(self, cache_path: str, stat, count: int) -> bool:
+        try:
+            with open(cache_path, "rb") as file:
+                header = file.read(self._cache_header.size)
+            if len(header) < self._cache_header.size:
+                return False
+            magic, size, mtime, cached_count = self._cache_header.unpack(header)
+            if (magic, size, mtime, cached_count) != (self._cache_magic, stat.st_size, stat.st_mtime_ns, count):
+                return False
+            arrays = np.memmap(
+                cache_path, dtype="<u4", mode="r", offset=self._cache_header.size, shape=(2, count)
+            )
+        except (OSError, ValueError):
+            return False
+        self._order = arrays[0]
+        self._sorted_ids = arrays[1]
+        return True
+
+    def __write_cache(self, cache_path: str, stat) -> None:
+        temp_path = cache_path + ".tmp"
+        try:
+            with open(temp_path, "wb") as file:
+                file.write(
+                    self._cache_header.pack(
+                        self._cache_magic, stat.st_size, stat.st_mtime_ns, len(self.records)
+                    )
+                )
+                file.write(self._order.astype("<u4").tobytes())
+                file.write(self._sorted_ids.astype("<u4").tobytes())
+            os.replace(temp_path, cache_path)
+        except OSError as e:
+            print(f"写入索引缓存失败：{cache_path}：{e}")
+
+    def find(self, id: int) -> int:
+        """返回 id 对应的 sequence，不存在时返回 None"""
+        i = np.searchsorted(self._sorted_ids, id)
+        if i < len(self._sorted_ids) and self._sorted_ids[i] == id:
+            return int(self._order[i])
+        return None
+
+    def find_many(self, ids) -> np.ndarray:
+        """批量查找，返回与 ids 等长的 sequence 数组，不存在的为 -1"""
+        ids = np.asarray(ids, dtype=np.int64)
+        positions = np.searchsorted(self._sorted_ids, ids)
+        clipped = np.minimum(positions, max(len(self._sorted_ids) - 1, 0))
+        sequences = np.full(len(ids), -1, dtype=np.int64)
+        if len(self._sorted_ids):
+            found = self._sorted_ids[clipped] == ids
+            sequences[found] = self._order[clipped[found]]
+        return sequences
+
+
+class SkylinePacker:
+    """天际线（skyline）矩形装箱，每次放入时选择顶边最低、其次最靠左的位置"""
+
+    def __init__(self, width: int, height: int):
+        self.width = width
+        self.height = height
+        self.used_width = 0
+        self.used_height = 0
+        # 天际线线段：(x, y, width)，按 x 递增且首尾相接
+        self._skyline = [(0, 0, width)]
+
+    def __fit(self, index: int, width: int, height: int) -> int:
+        x = self._skyline[index][0]
+        if x + width > self.width:
+            return -1
+        y = 0
+        remaining = width
+        i = index
+        while remaining > 0:
+            y = max(y, self._skyline[i][1])
+            if y + height > self.height:
+                return -1
+            remaining -= self._skyline[i][2]
+            i += 1
+        return y
+
+    def insert(self, width: int, height: int):
+        """放入一个矩形，返回左上角 (x, y)，放不下时返回 None"""
+        best_index = -1
+        best_x = best_y = 0
+        for index, (x, _, _) in enumerate(self._skyline):
+            y = self.__fit(index, width, height)
+            if y < 0:
+                continue
+            if best_index < 0 or (y + height, x) < (best_y + height, best_x):
+                best_index, best_x, best_y = index, x, y
+        if best_index < 0:
+            return None
+
+        skyline = self._skyline
+        skyline.insert(best_index, (best_x, best_y + height, width))
+        # 截掉被新线段覆盖的部分
+        i = best_index + 1
+        while i < len(skyline):
+            x, y, w = skyline[i]
+            overlap = best_x + width - x
+            if overlap <= 0:
+                break
+            if overlap >= w:
+                del skyline[i]
+                continue
+            skyline[i] = (x + overlap, y, w - overlap)
+            break
+        # 合并相同高度的相邻线段
+        i = 0
+        while i < len(skyline) - 1:
+            if skyline[i][1] == skyline[i + 1][1]:
+                skyline[i] = (skyline[i][0], skyline[i][1], skyline[i][2] + skyline[i + 1][2])
+                del skyline[i + 1]
+            else:
+                i += 1
+
+        self.used_width = max(self.used_width, best_x + width)
+        self.used_height = max(self.used_height, best_y + height)
+        return best_x, best_y
+
+
+def _next_power_of_two(value: int) -> int:
+    return 1 << max(value - 1, 0).bit_length()
+
+
+class SheetEncoder:
+    """输出图像的编码方式：格式、扩展名和保存参数"""
+
+    # save_all 能写出动画的格式
+    animated_formats = ("PNG", "GIF", "WEBP")
+
+    def __init__(
+        self, name: str, format: str, extension: str, params: dict = None, rgba: bool = False, indexed: bool = False
+    ):
+        self.name = name
+        self.format = format
+        self.extension = extension
+        self.params = params or {}
+        # 目标格式不支持带透明表的调色板图像时先转为 RGBA
+        self.rgba = rgba
+        # 目标格式只能无损保存调色板图像（如 GIF），RGBA 图像会被 Pillow 量化而改变颜色
+        self.indexed = indexed
+
+    @staticmethod
+    def get(encoder) -> "SheetEncoder":
+        """按预设名取编码器，传入 SheetEncoder 时原样返回"""
+        if isinstance(encoder, SheetEncoder):
+            return encoder
+        if encoder not in ENCODER_PRESETS:
+            raise ValueError(f"Unknown encoder preset: {encoder}")
+        return ENCODER_PRESETS[encoder]
+
+    @property
+    def animated(self) -> bool:
+        return self.format in self.animated_formats
+
+    def check_color_mode(self, color_mode: str) -> None:
+        """color_mode 为 "RGBA" 而本编码器只能无损保存调色板图像时抛出 ValueError"""
+        if color_mode == "RGBA" and self.indexed:
+            raise ValueError(f"Encoder {self.name} only stores palette images; color_mode must be \"P\"")
+
+    def save(self, image: Image.Image, path: str):
+        """保存图像，返回 (文件字节数, 编码耗时秒数)"""
+        started = time.perf_counter()
+        with STATS.stage("save"):
+            if self.rgba and image.mode != "RGBA":
+                image = image.convert("RGBA")
+            if self.format == "RAW":
+                with open(path, "wb") as file:
+                    file.write(image.tobytes())
+            elif self.format == "GIF" and image.mode == "P":
+                image = SheetEncoder.__gif_frames([image])[0][0]
+                image.save(path, format=self.format, transparency=0, **self.params)
+            else:
+                image.save(path, format=self.format, **self.params)
+        size = os.path.getsize(path)
+        STATS.count("files")
+        STATS.count("bytes_written", size)
+        return size, time.perf_counter() - started
+
+    def save_all(self, frames: List[Image.Image], path: str, durations: List[int]):
+        """把带调色板和 tRNS 的 P 模式帧保存为动画，返回 (文件字节数, 编码耗时秒数)
+
+        帧为完整画布，由 Pillow 与前一帧比较后只写入变化的矩形（完全相同的相邻帧合并）：
+        APNG 用 OP_NONE 保留前一帧、OP_SOURCE 覆盖变化区域；GIF 只有一个透明索引，
+        帧中有不透明像素在下一帧变为透明时，该帧改用“恢复为背景”的处置方式，否则保留；
+        WebP 由 libwebp 自行选择子矩形和处置、混合方式
+        """
+        started = time.perf_counter()
+        with STATS.stage("save"):
+            # 先合并相同的相邻帧，使逐帧的处置方式与实际写入的帧一一对应
+            if not self.animated:
+                raise ValueError(f"Encoder {self.name} does not support animation")
+            merged = [(frames[0], np.asarray(frames[0]), durations[0])]
+            for frame, duration in zip(frames[1:], durations[1:]):
+                pixels = np.asarray(frame)
+                if np.array_equal(pixels, merged[-1][1]):
+                    merged[-1] = (merged[-1][0], merged[-1][1], merged[-1][2] + duration)
+                else:
+                    merged.append((frame, pixels, duration))
+            frames = [frame for frame, _, _ in merged]
+            durations = [duration for _, _, duration in merged]
+            options = dict(self.params, save_all=True, duration=durations, loop=0)
+            if self.format == "GIF":
+                frames, disposal = SheetEncoder.__gif_frames(frames)
+                options.update(disposal=disposal, transparency=0)
+            elif self.format == "PNG":
+                options.update(disposal=0, blend=0)  # APNG_DISPOSE_OP_NONE, APNG_BLEND_OP_SOURCE
+            elif self.format == "WEBP":
+                frames = [frame.convert("RGBA") for frame in frames]
+            frames[0].save(path, format=self.format, append_images=frames[1:], **options)
+        size = os.path.getsize(path)
+        STATS.count("files")
+        STATS.count("bytes_written", size)
+        return size, time.perf_counter() - started
+
+    @staticmethod
+    def __gif_frames(frames: List[Image.Image]):
+        """把 tRNS 中所有透明索引归到索引 0，并按相邻帧的不透明区域选择处置方式"""
+        masks = []
+        converted = []
+        for frame in frames:
+            alpha = np.frombuffer(frame.info["transparency"], dtype=np.uint8)
+            indices = np.asarray(frame)
+            opaque = alpha[indices] > 0
+            image = Image.frombytes("P", frame.size, np.where(opaque, indices, 0).astype(np.uint8).tobytes())
+            image.putpalette(frame.getpalette())
+            converted.append(image)
+            masks.append(opaque)
+        # 2：恢复为背景（透明）；1：保留，下一帧只需覆盖变化的像素
+        disposal = [
+            2 if (mask & ~masks[(i + 1) % len(masks)]).any() else 1
+            for i, mask in enumerate(masks)
+        ]
+        return converted, disposal
+
+
+# PIL 不能指定 PNG 行过滤方式，"fast" 用最低压缩级别加 Z_RLE 策略（compress_type=3）
+ENCODER_PRESETS: Dict[str, SheetEncoder] = {
+    "fast": SheetEncoder("fast", "PNG", ".png", {"compress_level": 1, "compress_type": 3}),
+    "balanced": SheetEncoder("balanced", "PNG", ".png"),
+    "smallest": SheetEncoder("smallest", "PNG", ".png", {"optimize": True, "compress_level": 9}),
+    "webp": SheetEncoder("webp", "WEBP", ".webp", {"lossless": True, "method": 6}, rgba=True),
+    "tga": SheetEncoder("tga", "TGA", ".tga", {"compression": None}, rgba=True),
+    "raw": SheetEncoder("raw", "RAW", ".rgba", rgba=True),
+    "gif": SheetEncoder("gif", "GIF", ".gif", indexed=True),
+}
+
+
+class ExportManifest:
+    """增量导出清单：记录每个动画导出时各输入的摘要，输入未变化时跳过导出"""
+
+    def __init__(self, output_dir: str, load: bool = True):
+        self.output_dir = output_dir
+        self.path = os.path.join(output_dir, "manifest.json")
+        self.entries: Dict[str, dict] = {}
+        if load and os.path.exists(self.path):
+            try:
+                with open(self.path, "r", encoding="utf-8") as file:
+                    self.entries = json.load(file)
+            except (OSError, ValueError) as e:
+                print(f"读取导出清单失败，将全部重新导出：{self.path}：{e}")
+
+    def is_current(self, key: str, fingerprint: Dict[str, str]) -> bool:
+        entry = self.entries.get(key)
+        if entry is None:
+            return False
+        if any(entry.get(name) != value for name, value in fingerprint.items()):
+            return False
+        return all(
+            os.path.exists(os.path.join(self.output_dir, sheet))
+            for sheet in entry.get("sheets", [])
+        )
+
+    def sheets(self, key: str) -> List[str]:
+        return [
+            os.path.join(self.output_dir, sheet)
+            for sheet in self.entries.get(key, {}).get("sheets", [])
+        ]
+
+    def update(self, key: str, fingerprint: Dict[str, str], paths: List[str]) -> None:
+        entry = dict(fingerprint)
+        entry["sheets"] = [
+            os.path.relpath(path, self.output_dir).replace(os.sep, "/") for path in paths
+        ]
+        self.entries[key] = entry
+
+    def save(self) -> None:
+        os.makedirs(self.output_dir, exist_ok=True)
+        temp_path = self.path + ".tmp"
+        with open(temp_path, "w", encoding="utf-8") as file:
+            json.dump(self.entries, file, ensure_ascii=False, sort_keys=True)
+        os.replace(temp_path, self.path)
+
+
+class Anime:
+
+    _frame_dtype = np.dtype([("sequence", "<u4"), ("unknown", "V6")])
+
+    def __init__(
+        self, file_path: str, graphic_file_path: str, sequence: int, lazy: bool = False
+    ):
+        """lazy 为 True 时只读取 AnimeInfo 记录，动作在首次访问 actions 时解析，帧在使用时才创建 Graphic"""
+        if not os.path.exists(file_path):
+            raise ValueError(f"Invalid path: {file_path}")
+        if sequence < 0:
+            raise ValueError("Sequence must be non-negative")
+
+        self._path = file_path
+        self._dir_path = os.path.dirname(file_path)
+        self._info_path = file_path.replace("Anime", "AnimeInfo")
+        self._graphic_file_path = graphic_file_path
+        self._sequence = sequence
+        self._id: int = None
+        self._address: int = None
+        self._action_count: int = None
+        self._actions: List[Action] = None
+
+        self.__load_info()
+        if not lazy:
+            self.__load_actions()
+            # 非延迟模式下立即创建全部帧的 Graphic，与之前的行为一致
+            for action in self._actions:
+                action.graphics
+
+    @staticmethod
+    def find_by_id(
+        file_path: str, graphic_file_path: str, id: int, lazy: bool = False
+    ) -> "Anime":
+        info_path = file_path.replace("Anime", "AnimeInfo")
+        if not os.path.exists(info_path):
+            raise ValueError(f"Invalid path: {info_path}")
+        if id < 0:
+            raise ValueError("Anime ID must be non-negative")
+        sequence = AnimeIndex.load(info_path).find(id)
+        if sequence is not None:
+            return Anime(file_path, graphic_file_path, sequence, lazy)
+
+    @property
+    def id(self) -> int:
+        return self._id
+
+    @property
+    def actions(self) -> List[Action]:
+        if self._actions is None:
+            self.__load_actions()
+        return self._actions
+
+    @property
+    def action_types(self) -> set:
+        return {action.type for action in self.actions}
+
+    def __load_info(self) -> int:
+        try:
+            with STATS.stage("info"), open(self._info_path, "rb") as file:
+                file.seek(self._sequence * 12, os.SEEK_SET)
+                data = file.read(12)
+                if len(data) < 12:
+                    raise ValueError(f"Invalid data size in {self._info_path}")
+                record = struct.unpack("<IIHH", data)
+                self._id = record[0]
+                self._address = record[1]
+                self._action_count = record[2]
+                return record[2]
+        except FileNotFoundError:
+            raise FileNotFoundError(f"AnimeInfo file not found: {self._info_path}")
+        except struct.error as e:
+            raise ValueError(f"Failed to unpack info data: {e}")
+
+    def __load_actions(self) -> None:
+        actions: List[Action] = []
+        graphic_factory = partial(Anime.__create_graphic, self._graphic_file_path)
+        try:
+            with STATS.stage("info"), open(self._path, "rb") as file:
+                file.seek(self._address, os.SEEK_SET)
+                for _ in range(self._action_count):
+                    data = file.read(12)
+                    if len(data) < 12:
+                        raise ValueError(f"Invalid action data size in {self._path}")
+                    record = struct.unpack("<HHII", data)
+                    graphic_count = record[3]
+                    frame_data = file.read(graphic_count * 10)
+                    if len(frame_data) < graphic_count * 10:
+                        raise ValueError(f"Invalid frame data size in {self._path}")
+                    frames = np.frombuffer(frame_data, dtype=self._frame_dtype)
+                    action = Action(
+                        direction=record[0],
+                        action_type=ActionType(record[1]),
+                        duration=record[2],
+                        sequences=frames["sequence"].copy(),
+                        graphic_factory=graphic_factory,
+                    )
+                    actions.append(action)
+        except FileNotFoundError:
+            raise FileNotFoundError(f"Anime file not found: {self._path}")
+        except struct.error as e:
+            raise ValueError(f"Failed to unpack action data: {e}")
+        self._actions = actions
+
+    @staticmethod
+    def __create_graphic(file_path: str, sequence: int) -> Graphic:
+        # 不缓存 Graphic 对象，GraphicInfo 变化后随 GraphicIndex.load 一起更新
+        return GraphicIndex.load(file_path.replace("Graphic", "GraphicInfo")).graphic(sequence)
+
+    @staticmethod
+    def preload(animes: List["Anime"]) -> int:
+        """把多个动画用到的帧的索引图像按地址顺序合并读取并放入 frame_cache，之后逐个生成大图时直接命中缓存
+
+        帧的总大小超过帧缓存容量的一半时不预读（由各动画自行读取），返回预读的帧数
+        """
+        if len(animes) < 2:
+            return 0
+        graphics = list(
+            {
+                (graphic.path, graphic.sequence): graphic
+                for anime in animes
+                for action in anime.actions
+                for graphic in action.graphics
+            }.values()
+        )
+        total = sum(graphic.width * graphic.height for graphic in graphics)
+        if total > Graphic.frame_cache.max_bytes // 2:
+            return 0
+        Graphic._read_many(graphics)
+        return len(graphics)
+
+    def __read_frames(self) -> Dict[int, Image.Image]:
+        """读取全部动作用到的帧的索引图像，返回 sequence -> 图像（读取失败的为 None）"""
+        graphics = list(
+            {
+                graphic.sequence: graphic
+                for action in self.actions
+                for graphic in action.graphics
+            }.values()
+        )
+        images = Graphic._read_many(graphics)
+        return {graphic.sequence: image for graphic, image in zip(graphics, images)}
+
+    def __targets(self, output_dir: str, palette: Palette, palettes: Dict[str, Palette]) -> List[tuple]:
+        """输出位置和调色板：(目录, 调色板) 列表，多调色板时每个调色板一个子目录"""
+        if not palettes:
+            return [(os.path.join(output_dir, str(self.id)), palette)]
+        return [
+            (os.path.join(output_dir, name, str(self.id)), palettes[name])
+            for name in palettes
+        ]
+
+    def fingerprint(
+        self,
+        palette: Palette = None,
+        mode: str = "grid",
+        color_mode: str = "P",
+        encoder="balanced",
+        palettes: Dict[str, Palette] = None,
+    ) -> Dict[str, str]:
+        """导出输入的摘要：动画记录、每帧的原始块和图像信息、调色板、导出器版本"""
+        with STATS.stage("fingerprint"):
+            return self.__fingerprint(palette, mode, color_mode, encoder, palettes)
+
+    def __fingerprint(self, palette, mode, color_mode, encoder, palettes) -> Dict[str, str]:
+        with open(self._info_path, "rb") as file:
+            file.seek(self._sequence * 12, os.SEEK_SET)
+            anime_hash = hashlib.sha256(file.read(12))
+        record_length = sum(12 + 10 * len(action.sequences) for action in self.actions)
+        with open(self._path, "rb") as file:
+            file.seek(self._address, os.SEEK_SET)
+            anime_hash.update(file.read(record_length))
+
+        frames_hash = hashlib.sha256()
+        seen = set()
+        for action in self.actions:
+            for graphic in action.graphics:
+                if graphic.sequence in seen:
+                    continue
+                seen.add(graphic.sequence)
+                frames_hash.update(
+                    struct.pack(
+                        "<lllLL",
+                        graphic.sequence,
+                        graphic.offset_x,
+                        graphic.offset_y,
+                        graphic.width,
+                        graphic.height,
+                    )
+                )
+                # 无法读取的帧导出时会被跳过，这里用其地址、长度加固定标记代替块内容，不影响其余帧
+                try:
+                    frames_hash.update(graphic.raw_block())
+                except (OSError, ValueError):
+                    frames_hash.update(
+                        struct.pack("<LL", graphic.address, graphic.block_length) + b"unreadable"
+                    )
+
+        if palettes:
+            palette_hash = hashlib.sha256()
+            for name in sorted(palettes):
+                palette_hash.update(name.encode("utf-8") + b"\0" + bytes(palettes[name]))
+        else:
+            if palette is None:
+                palette = Graphic._defalult_palette
+            palette_hash = hashlib.sha256(bytes(palette))
+        return {
+            "version": EXPORTER_VERSION,
+            "anime": anime_hash.hexdigest(),
+            "frames": frames_hash.hexdigest(),
+            "palette": palette_hash.hexdigest(),
+            "mode": mode,
+            "color_mode": color_mode,
+            "encoder": SheetEncoder.get(encoder).name,
+        }
+
+    def frame_bounds(self) -> tuple:
+        """所有帧相对锚点的并集包围盒 (min_x, min_y, max_x, max_y)，总是包含锚点"""
+        min_x = 0
+        min_y = 0
+        max_x = 0
+        max_y = 0
+        for action in self.actions:
+            for graphic in action.graphics:
+                try:
+                    # 计算图像的实际边界（考虑偏移）
+                    left = graphic.offset_x
+                    right = graphic.offset_x + graphic.width
+                    top = graphic.offset_y
+                    bottom = graphic.offset_y + graphic.height
+
+                    # 更新最小和最大坐标
+                    min_x = min(min_x, left)
+                    min_y = min(min_y, top)
+                    max_x = max(max_x, right)
+                    max_y = max(max_y, bottom)
+                except Exception as e:
+                    print(
+                        f"计算边界框失败（动作：{action.type.name}, 方向：{action.direction}）：{e}"
+                    )
+                    continue
+        return min_x, min_y, max_x, max_y
+
+    def create_spritesheet(
+        self,
+        output_dir: str = "output",
+        manifest: ExportManifest = None,
+        mode: str = "grid",
+        palette: Palette = None,
+        color_mode: str = "P",
+        encoder="balanced",
+        palettes: Dict[str, Palette] = None,
+    ) -> List[str]:
+        """为每种actiontype创建一张大图，包含8行（按direction排列），每种actiontype单独计算最大帧数，返回保存的文件路径
+
+        mode 为 "atlas" 时改为调用 create_atlas 输出紧凑图集，为 "animated" 时改为调用 create_animations 输出动画
+        （只支持 color_mode 为 "P" 和 SheetEncoder.animated 的编码器）；
+        大图总在索引空间合成，color_mode 为 "P" 时输出带 tRNS 的 8 位调色板 PNG，为 "RGBA" 时按调色板转换为 32 位图像；
+        palettes 为 {名称: 调色板} 时忽略 palette，帧只解码、合成一次，每个调色板各输出一份到 output_dir/<名称>/ 下；
+        encoder 为 ENCODER_PRESETS 中的预设名或 SheetEncoder，SheetEncoder.indexed 的编码器（gif）只支持 color_mode 为 "P"；
+        任一文件保存失败时，其余文件照常保存，最后抛出 ValueError，调用者不应把该动画记为已导出；
+        传入 manifest 时，若输入摘要与清单记录一致则跳过导出，否则导出成功后更新清单（由调用者保存）
+        """
+        if manifest is not None:
+            fingerprint = self.fingerprint(palette, mode, color_mode, encoder, palettes)
+            if manifest.is_current(str(self.id), fingerprint):
+                print(f"动画 {self.id} 未变化，跳过")
+                return manifest.sheets(str(self.id))
+            saved_paths = self.create_spritesheet(
+                output_dir,
+                mode=mode,
+                palette=palette,
+                color_mode=color_mode,
+                encoder=encoder,
+                palettes=palettes,
+            )
+            manifest.update(str(self.id), fingerprint, saved_paths)
+            return saved_paths
+        if color_mode not in ("P", "RGBA"):
+            raise ValueError(f"Unknown color mode: {color_mode}")
+        encoder = SheetEncoder.get(encoder)
+        encoder.check_color_mode(color_mode)
+        if mode == "atlas":
+            return self.create_atlas(
+                output_dir, palette=palette, color_mode=color_mode, encoder=encoder, palettes=palettes
+            )
+        if mode == "animated":
+            if color_mode != "P":
+                raise ValueError("Animated export is palette based; color_mode must be \"P\"")
+            return self.create_animations(
+                output_dir, palette=palette, encoder=encoder, palettes=palettes
+            )
+        if mode != "grid":
+            raise ValueError(f"Unknown spritesheet mode: {mode}")
+
+        targets = self.__targets(output_dir, palette, palettes)
+        for target_dir, _ in targets:
+            os.makedirs(target_dir, exist_ok=True)
+        saved_paths: List[str] = []
+        failed = 0
+
+        # 第一步：计算所有图像的边界框，确定统一帧画布大小
+        min_x, min_y, max_x, max_y = self.frame_bounds()
+
+        # 同时记录每种actiontype的帧数
+        actiontype_frames: Dict[Enum, int] = {}
+        # 记录每种actiontype的动画时间
+        actiontype_durations: Dict[Enum, int] = {}
+
+        for action in self.actions:
+            actiontype = action.type
+            if actiontype not in actiontype_frames:
+                actiontype_frames[actiontype] = len(action.graphics)
+            
+            if actiontype not in actiontype_durations:
+                actiontype_durations[actiontype] = action.duration
+
+        # 计算每个帧的画布大小（全局统一）
+        frame_width = max_x - min_x
+        frame_height = max_y - min_y
+
+        # 第二步：按actiontype分组action
+        actiontype_groups: Dict[Enum, Dict[int, List[Graphic]]] = {}
+        for action in self.actions:
+            actiontype = action.type
+            direction = action.direction
+            if actiontype not in actiontype_groups:
+                actiontype_groups[actiontype] = {
+                    i: [] for i in range(8)
+                }  # 初始化8个方向
+            actiontype_groups[actiontype][direction] = action.graphics
+
+        # 第三步：为每种actiontype生成大图；先预读本动画用到的全部帧，同一 sequence 只读一次
+        images = self.__read_frames()
+        for actiontype, directions in actiontype_groups.items():
+            # 获取该actiontype的最大帧数
+            frames_count = actiontype_frames.get(actiontype, 0)
+            duration = actiontype_durations.get(actiontype, 0)
+            fps = int(1000 * frames_count / duration) if duration > 0 else 0
+            if frames_count == 0:
+                print(f"动作类型 {actiontype.name} 无有效帧，跳过")
+                continue
+
+            # 计算大图尺寸：8行，每行高度为frame_height，宽度为frame_width * max_frames
+            sprite_width = frame_width * frames_count
+            sprite_height = frame_height * 8
+
+            # 创建大图（透明背景，索引 0）
+            sprite_sheet = Image.new(
+                "P", (sprite_width, sprite_height), 0
+            )
+
+            # 遍历每个方向（0到7）
+            for direction in range(8):
+                graphics = directions.get(direction, [])
+                if not graphics:
+                    print(f"动作类型 {actiontype.name} 方向 {direction} 无图像，跳过")
+                    continue
+
+                # 遍历该方向的每个graphic（帧）
+                for frame_idx, graphic in enumerate(graphics):
+                    try:
+                        image = images[graphic.sequence]
+
+                        # 计算帧在 sprite sheet 上的位置
+                        # 行：direction * frame_height
+                        # 列：frame_idx * frame_width
+                        paste_x = frame_idx * frame_width + (graphic.offset_x - min_x)
+                        paste_y = direction * frame_height + (graphic.offset_y - min_y)
+
+                        # 粘贴图像
+                        with STATS.stage("paste"):
+                            sprite_sheet.paste(image, (paste_x, paste_y))
+                        STATS.count("frames")
+                    except Exception as e:
+                        print(
+                            f"粘贴图像失败（动作类型：{actiontype.name}, 方向：{direction}, 帧：{frame_idx}）：{e}"
+                        )
+                        continue
+
+            # 保存 sprite sheet，每个调色板一份
+            filename = (
+                f"{str(self.id)}_{actiontype.name}_{frame_width}_{frame_height}_{frames_count}_{fps}{encoder.extension}"
+            )
+            for target_dir, target_palette in targets:
+                output_path = os.path.join(target_dir, filename)
+                try:
+                    image = Graphic.colorize(sprite_sheet, target_palette, color_mode)
+                    size, elapsed = encoder.save(image, output_path)
+                    saved_paths.append(output_path)
+                    print(f"保存 sprite sheet：{output_path}（{size} 字节，编码 {elapsed * 1000:.1f} ms）")
+                except Exception as e:
+                    failed += 1
+                    print(f"保存 sprite sheet 失败（动作类型：{actiontype.name}）：{e}")
+
+        if failed:
+            raise ValueError(f"{failed} sprite sheet(s) of anime {self.id} failed to save")
+        return saved_paths
+
+    def create_animations(
+        self,
+        output_dir: str = "output",
+        palette: Palette = None,
+        encoder="balanced",
+        palettes: Dict[str, Palette] = None,
+    ) -> List[str]:
+        """为每个动作的每个方向输出一个动画，返回保存的文件路径
+
+        帧画布为 frame_bounds 的并集包围盒（与 sprite sheet 的单元格一致），每帧时长为动作的 duration 平均分配；
+        格式由编码预设决定：PNG 预设输出 APNG，webp 输出动画 WebP，gif 输出 GIF，见 SheetEncoder.save_all；
+        palettes 见 create_spritesheet
+        """
+        encoder = SheetEncoder.get(encoder)
+        if not encoder.animated:
+            raise ValueError(f"Encoder {encoder.name} does not support animation")
+        targets = self.__targets(output_dir, palette, palettes)
+        for target_dir, _ in targets:
+            os.makedirs(target_dir, exist_ok=True)
+        min_x, min_y, max_x, max_y = self.frame_bounds()
+        canvas_size = (max_x - min_x, max_y - min_y)
+        images = self.__read_frames()
+        saved_paths: List[str] = []
+        failed = 0
+        for action in self.actions:
+            if not action.graphics:
+                continue
+            frames = []
+            for frame_idx, graphic in enumerate(action.graphics):
+                frame = Image.new("P", canvas_size, 0)
+                try:
+                    with STATS.stage("paste"):
+                        frame.paste(
+                            images[graphic.sequence],
+                            (graphic.offset_x - min_x, graphic.offset_y - min_y),
+                        )
+                    STATS.count("frames")
+                except Exception as e:
+                    print(
+                        f"粘贴图像失败（动作：{action.type.name}, 方向：{action.direction}, 帧：{frame_idx}）：{e}"
+                    )
+                frames.append(frame)
+            # 按累计时间取整，各帧时长之和等于动作时长
+            ends = [round(action.duration * (i + 1) / len(frames)) for i in range(len(frames))]
+            durations = [max(end - start, 1) for start, end in zip([0] + ends[:-1], ends)]
+
+            filename = (
+                f"{self.id}_{action.type.name}_{action.direction}_{len(frames)}_{action.duration}{encoder.extension}"
+            )
+            for target_dir, target_palette in targets:
+                output_path = os.path.join(target_dir, filename)
+                try:
+                    for frame in frames:
+                        Graphic.apply_palette(frame, target_palette)
+                    size, elapsed = encoder.save_all(frames, output_path, durations)
+                    saved_paths.append(output_path)
+                    print(f"保存动画：{output_path}（{size} 字节，编码 {elapsed * 1000:.1f} ms）")
+                except Exception as e:
+                    failed += 1
+                    print(f"保存动画失败（动作：{action.type.name}, 方向：{action.direction}）：{e}")
+        if failed:
+            raise ValueError(f"{failed} animation(s) of anime {self.id} failed to save")
+        return saved_paths
+
+    def create_atlas(
+        self,
+        output_dir: str = "output",
+        max_page_size: int = 2048,
+        padding: int = 1,
+        palette: Palette = None,
+        color_mode: str = "P",
+        encoder="balanced",
+        palettes: Dict[str, Palette] = None,
+    ) -> List[str]:
+        """把所有帧裁掉透明边后装箱到边长为 2 的幂的图集页中，并输出 JSON 描述，返回保存的文件路径
+
+        JSON 中每帧记录所在页和矩形，offset_x/offset_y 为裁剪后图像相对锚点的偏移，
+        游戏按 (offset_x, offset_y) 放置矩形即可还原原位置；
+        palettes 见 create_spritesheet，多个调色板共用一套布局，裁剪框取各调色板下不透明区域的并集
+        """
+        encoder = SheetEncoder.get(encoder)
+        targets = self.__targets(output_dir, palette, palettes)
+        for target_dir, _ in targets:
+            os.makedirs(target_dir, exist_ok=True)
+
+        # 第一步：读取并裁剪每帧；同一 sequence 只读一次，裁剪后像素相同的帧共用一个矩形
+        images = self.__read_frames()
+        actions_meta = []
+        frames = []  # 去重后的 (裁剪图像, 矩形)
+        placements = []  # (帧描述, 矩形)
+        by_sequence = {}  # sequence -> (裁剪框, 矩形)
+        by_hash = {}  # (像素摘要, 尺寸) -> 矩形
+        for action in self.actions:
+            frames_meta = []
+            for frame_idx, graphic in enumerate(action.graphics):
+                meta = {
+                    "frame": frame_idx,
+                    "sequence": graphic.sequence,
+                    "page": -1,
+                    "x": 0,
+                    "y": 0,
+                    "w": 0,
+                    "h": 0,
+                    "offset_x": graphic.offset_x,
+                    "offset_y": graphic.offset_y,
+                }
+                frames_meta.append(meta)
+                shared = by_sequence.get(graphic.sequence)
+                if shared is None:
+                    try:
+                        image = images[graphic.sequence]
+                        bbox = None
+                        if image is not None:
+                            bbox = Anime.__union_bbox(
+                                Graphic.opaque_bbox(image, target_palette)
+                                for _, target_palette in targets
+                            )
+                    except Exception as e:
+                        print(
+                            f"读取图像失败（动作：{action.type.name}, 方向：{action.direction}, 帧：{frame_idx}）：{e}"
+                        )
+                        continue
+                    rect = None
+                    if bbox is not None:
+                        cropped = image.crop(bbox)
+                        key = (
+                            hashlib.blake2b(cropped.tobytes(), digest_size=16).digest(),
+                            cropped.size,
+                        )
+                        rect = by_hash.get(key)
+                        if rect is None:
+                            rect = {"page": -1, "x": 0, "y": 0, "w": cropped.width, "h": cropped.height}
+                            by_hash[key] = rect
+                            frames.append((cropped, rect))
+                    shared = (bbox, rect)
+                    by_sequence[graphic.sequence] = shared
+                bbox, rect = shared
+                if rect is None:
+                    continue
+                meta["offset_x"] += bbox[0]
+                meta["offset_y"] += bbox[1]
+                placements.append((meta, rect))
+            actions_meta.append(
+                {
+                    "type": action.type.name,
+                    "direction": action.direction,
+                    "duration": action.duration,
+                    "frames": frames_meta,
+                }
+            )
+        # 去重效果记入统计（--stats），不逐个动画打印
+        STATS.count("atlas_frames", len(placements))
+        STATS.count("atlas_unique_frames", len(frames))
+
+        # 第二步：从高到低依次装箱，放不下时开新页；页边长按总面积估计，尽量接近正方形
+        total_area = sum((rect["w"] + padding) * (rect["h"] + padding) for _, rect in frames)
+        page_size = min(max_page_size, _next_power_of_two(int((total_area * 1.2) ** 0.5) + 1))
+        for image, rect in frames:
+            page_size = max(page_size, _next_power_of_two(max(rect["w"], rect["h"]) + padding))
+        packers: List[SkylinePacker] = []
+        frames.sort(key=lambda item: (item[1]["h"], item[1]["w"]), reverse=True)
+        for image, rect in frames:
+            for page, packer in enumerate(packers):
+                position = packer.insert(rect["w"] + padding, rect["h"] + padding)
+                if position is not None:
+                    break
+            else:
+                packer = SkylinePacker(page_size, page_size)
+                packers.append(packer)
+                page = len(packers) - 1
+                position = packer.insert(rect["w"] + padding, rect["h"] + padding)
+            rect["page"] = page
+            rect["x"], rect["y"] = position
+        # 重复帧指向共用的矩形
+        for meta, rect in placements:
+            meta.update(rect)
+
+        # 第三步：每页缩到能容纳已用区域的最小 2 的幂尺寸后保存
+        saved_paths: List[str] = []
+        failed = 0
+        pages_meta = []
+        pages = []
+        for page, packer in enumerate(packers):
+            width = _next_power_of_two(packer.used_width)
+            height = _next_power_of_two(packer.used_height)
+            pages.append(Image.new("P", (width, height), 0))
+            pages_meta.append(
+                {
+                    "file": f"{self.id}_atlas_{page}{encoder.extension}",
+                    "width": width,
+                    "height": height,
+                }
+            )
+        with STATS.stage("paste"):
+            for image, rect in frames:
+                pages[rect["page"]].paste(image, (rect["x"], rect["y"]))
+        STATS.count("frames", len(placements))
+        for target_dir, target_palette in targets:
+            for page_meta, page_image in zip(pages_meta, pages):
+                output_path = os.path.join(target_dir, page_meta["file"])
+                try:
+                    image = Graphic.colorize(page_image, target_palette, color_mode)
+                    size, elapsed = encoder.save(image, output_path)
+                    saved_paths.append(output_path)
+                    print(f"保存图集：{output_path}（{size} 字节，编码 {elapsed * 1000:.1f} ms）")
+                except Exception as e:
+                    failed += 1
+                    print(f"保存图集失败（{page_meta['file']}）：{e}")
+
+            output_path = os.path.join(target_dir, f"{self.id}_atlas.json")
+            with open(output_path, "w", encoding="utf-8") as file:
+                json.dump(
+                    {"id": self.id, "pages": pages_meta, "actions": actions_meta},
+                    file,
+                    ensure_ascii=False,
+                )
+            saved_paths.append(output_path)
+        if failed:
+            raise ValueError(f"{failed} atlas page(s) of anime {self.id} failed to save")
+        return saved_paths
+
+    @staticmethod
+    def __union_bbox(boxes):
+        """多个包围盒的并集，忽略 None，全部为 None 时返回 None"""
+        union = None
+        for box in boxes:
+            if box is None:
+                continue
+            if union is None:
+                union = box
+            else:
+                union = (
+                    min(union[0], box[0]),
+                    min(union[1], box[1]),
+                    max(union[2], box[2]),
+                    max(union[3], box[3]),
+                )
+        return union
+
+
+def _palette_name(path: str) -> str:
+    """多调色板导出时的子目录名：调色板文件名去掉扩展名"""
+    return os.path.splitext(os.path.basename(path))[0]
+
+
+def _check_palette_names(palette_paths: List[str]) -> None:
+    """多个调色板的子目录名相同（不区分大小写）时输出会互相覆盖，抛出 ValueError"""
+    names = {}
+    for path in palette_paths or []:
+        name = _palette_name(path).casefold()
+        if name in names:
+            raise ValueError(
+                f"Palettes {names[name]} and {path} would both be written to subdirectory {_palette_name(path)}"
+            )
+        names[name] = path
+
+
+def _sheet_options(options: dict) -> dict:
+    """把任务参数中的 palette_path 换成调色板，得到 create_spritesheet 的关键字参数
+
+    palette_paths 为多个调色板文件时换成 palettes（{文件名: 调色板}）；
+    prefetch 为 (depth, max_bytes)，用于设置本进程的 FramePrefetcher；frame_cache 为本进程帧缓存的字节数
+    """
+    options = dict(options or {})
+    palette_path = options.pop("palette_path", None)
+    if palette_path:
+        options["palette"] = Graphic.read_palette_file(palette_path)
+    palette_paths = options.pop("palette_paths", None)
+    if palette_paths:
+        _check_palette_names(palette_paths)
+        options["palettes"] = {
+            _palette_name(path): Graphic.read_palette_file(path) for path in palette_paths
+        }
+    prefetch = options.pop("prefetch", None)
+    if prefetch is not None:
+        FramePrefetcher.configure(*prefetch)
+    frame_cache = options.pop("frame_cache", None)
+    if frame_cache is not None:
+        Graphic.frame_cache.resize(frame_cache)
+    return options
+
+
+def _export_animes_task(
+    anime_path: str,
+    graphic_path: str,
+    sequences: List[int],
+    output_dir: str,
+    incremental: bool = False,
+    previous: dict = None,
+    options: dict = None,
+):
+    """进程池任务：导出一组动画，返回 (导出数, 文件数, 字节数, 跳过数, 清单记录列表)
+
+    options 为 create_spritesheet 的关键字参数，调色板以 palette_path 传入；
+    previous 为这些动画的旧清单记录（id -> 记录）；需要导出的动画的帧先由 Anime.preload 按地址顺序一次读入
+    """
+    options = _sheet_options(options)
+    previous = previous or {}
+    # 每个进程只持有本组动画的旧记录，新记录交回主进程合并保存
+    manifest = ExportManifest(output_dir, load=False)
+    fingerprints = {}
+    animes: List[Anime] = []
+    skipped = 0
+    for sequence in sequences:
+        try:
+            anime = Anime(anime_path, graphic_path, sequence)
+            if incremental:
+                key = str(anime.id)
+                if key in previous:
+                    manifest.entries[key] = previous[key]
+                with STATS.scope(f"anime {anime.id}"):
+                    fingerprint = anime.fingerprint(
+                        options.get("palette"),
+                        options.get("mode", "grid"),
+                        options.get("color_mode", "P"),
+                        options.get("encoder", "balanced"),
+                        options.get("palettes"),
+                    )
+                if manifest.is_current(key, fingerprint):
+                    skipped += 1
+                    continue
+                fingerprints[key] = fingerprint
+            animes.append(anime)
+        except Exception as e:
+            print(f"导出动画失败（sequence：{sequence}）：{e}")
+
+    Anime.preload(animes)
+    count = 0
+    files = 0
+    written = 0
+    entries = []
+    for anime in animes:
+        try:
+            with STATS.scope(f"anime {anime.id}"):
+                paths = anime.create_spritesheet(output_dir, **options)
+        except Exception as e:
+            print(f"导出动画失败（id：{anime.id}）：{e}")
+            continue
+        count += 1
+        files += len(paths)
+        written += sum(os.path.getsize(path) for path in paths)
+        if incremental:
+            key = str(anime.id)
+            manifest.update(key, fingerprints[key], paths)
+            entries.append((key, manifest.entries[key]))
+    return count, files, written, skipped, entries or None
+
+
+def _export_graphics_task(
+    graphic_path: str, sequences: List[int], output_dir: str, options: dict = None
+):
+    """进程池任务：导出一批图像，返回 (导出数, 文件数, 字节数, 跳过数, None)"""
+    options = _sheet_options(options)
+    color_mode = options.get("color_mode", "P")
+    encoder = SheetEncoder.get(options.get("encoder", "balanced"))
+    # 每个调色板一个输出目录；索引图像只解码一次，再按各调色板输出
+    palettes = options.get("palettes")
+    if palettes:
+        targets = [(os.path.join(output_dir, name), palette) for name, palette in palettes.items()]
+        for target_dir, _ in targets:
+            os.makedirs(target_dir, exist_ok=True)
+    else:
+        targets = [(output_dir, options.get("palette"))]
+    index = GraphicIndex.load(graphic_path.replace("Graphic", "GraphicInfo"))
+    count = 0
+    files = 0
+    written = 0
+    graphics = []
+    for sequence in sequences:
+        try:
+            graphics.append(index.graphic(sequence))
+        except Exception as e:
+            print(f"导出图像失败（sequence：{sequence}）：{e}")
+    # 后台预读下一批原始块，当前图像的解码、编码与读取重叠
+    for graphic, block in FramePrefetcher(graphics):
+        sequence = graphic.sequence
+        try:
+            image = graphic._read_indexed(block)
+            if image is None:
+                continue
+            # 缓存中的图像是共享的，复制后再设置调色板
+            if color_mode == "P":
+                image = image.copy()
+            for target_dir, palette in targets:
+                output_path = os.path.join(target_dir, f"{sequence}{encoder.extension}")
+                size, _ = encoder.save(Graphic.colorize(image, palette, color_mode), output_path)
+                files += 1
+                written += size
+            STATS.count("frames")
+            count += 1
+        except Exception as e:
+            print(f"导出图像失败（sequence：{sequence}）：{e}")
+    return count, files, written, 0, None
+
+
+def _stats_task(func, *args):
+    """在子进程中打开统计运行任务，把任务结果和本任务的统计一起返回"""
+    STATS.reset()
+    STATS.enable()
+    result = func(*args)
+    return result, STATS.snapshot()
+
+
+# 在途任务估计内存的默认上限（每个进程）
+PENDING_BYTES_PER_WORKER = 256 * 1024 * 1024
+
+
+def _run_pool(
+    tasks: list,
+    workers: int,
+    max_pending: int,
+    label: str,
+    on_result=None,
+    costs: List[int] = None,
+    max_pending_bytes: int = None,
+):
+    """按顺序提交任务到进程池，结束时打印吞吐量
+
+    同时在途（已提交未完成）的任务数不超过 max_pending，默认为进程数的两倍；
+    给出 costs（每个任务的估计内存字节数）时，在途任务的估计字节数之和还不超过 max_pending_bytes，
+    默认为每个进程 PENDING_BYTES_PER_WORKER，单个任务超出上限时等其他任务完成后单独运行；
+    任务返回 (导出数, 文件数, 字节数, 跳过数, 附加结果)，附加结果不为 None 时交给 on_result；
+    STATS 打开时子进程的统计合并回本进程
+    """
+    workers = workers or os.cpu_count() or 1
+    max_pending = max_pending or workers * 2
+    if costs is None:
+        costs = [0] * len(tasks)
+    max_pending_bytes = max_pending_bytes or workers * PENDING_BYTES_PER_WORKER
+    started = time.perf_counter()
+    totals = [0, 0, 0, 0]
+    stats = STATS.enabled
+
+    def collect(futures):
+        nonlocal totals
+        for future in futures:
+            result = future.result()
+            if stats:
+                result, snapshot = result
+                STATS.merge(snapshot)
+            *counts, extra = result
+            totals = [a + b for a, b in zip(totals, counts)]
+            if extra is not None and on_result is not None:
+                on_result(extra)
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        # 在途任务 -> 估计字节数
+        pending = {}
+        pending_bytes = 0
+        for task, cost in zip(tasks, costs):
+            while pending and (
+                len(pending) >= max_pending or pending_bytes + cost > max_pending_bytes
+            ):
+                done, _ = wait(list(pending), return_when=FIRST_COMPLETED)
+                for future in done:
+                    pending_bytes -= pending.pop(future)
+                collect(done)
+            if stats:
+                future = executor.submit(_stats_task, *task)
+            else:
+                future = executor.submit(*task)
+            pending[future] = cost
+            pending_bytes += cost
+        collect(wait(list(pending)).done)
+    elapsed = time.perf_counter() - started
+    count, files, written, skipped = totals
+    skipped_note = f"（跳过 {skipped} 个未变化的）" if skipped else ""
+    print(
+        f"导出完成：{count} 个{label}{skipped_note}，{files} 个文件，"
+        f"{written / 1048576:.1f} MB，耗时 {elapsed:.1f}s，"
+        f"{count / elapsed if elapsed else 0:.1f} 个/s，"
+        f"{written / 1048576 / elapsed if elapsed else 0:.1f} MB/s（{workers} 进程）"
+    )
+    return count, files, written
+
+
+def export_animes(
+    anime_path: str,
+    graphic_path: str,
+    output_dir: str = "output",
+    ids: List[int] = None,
+    workers: int = None,
+    max_pending: int = None,
+    incremental: bool = True,
+    mode: str = "grid",
+    palette_path: str = None,
+    color_mode: str = "P",
+    encoder: str = "balanced",
+    prefetch_depth: int = None,
+    prefetch_bytes: int = None,
+    batch_size: int = 8,
+    palette_paths: List[str] = None,
+    catalog_path: str = None,
+    max_pending_bytes: int = None,
+    frame_cache_bytes: int = None,
+):
+    """用进程池导出 AnimeInfo 中的全部（或指定 id 的）动画
+
+    按 sequence 顺序每 batch_size 个相邻动画分为一个任务（相邻动画的帧在 Graphic 文件中通常也相邻，
+    同一任务内按地址顺序一次读取），任务按要解码的像素数之和从大到小调度；
+    同时在途的任务数不超过 max_pending，估计内存（帧和大图的像素字节数）之和不超过 max_pending_bytes，见 _run_pool；
+    incremental 为 True 时使用输出目录下的 manifest.json 跳过输入未变化的动画；
+    mode、color_mode、encoder 见 Anime.create_spritesheet，palette_path 为调色板文件，默认使用内置调色板；
+    palette_paths 为多个调色板文件时，帧只解码一次，每个调色板各输出一份到 output_dir/<调色板文件名>/ 下，
+    文件名重复时抛出 ValueError；
+    prefetch_depth、prefetch_bytes 为帧预读的在途块数和字节数上限，None 时使用 FramePrefetcher 的默认值；
+    catalog_path 为目录数据库（见 catalog.py）时先增量更新，再用其中每个动画要解码的准确像素数；
+    frame_cache_bytes 为所有进程帧缓存的总字节数，按进程数平分，默认见 FrameCache.budget
+    """
+    _check_palette_names(palette_paths)
+    SheetEncoder.get(encoder).check_color_mode(color_mode)
+    if mode == "animated":
+        if not SheetEncoder.get(encoder).animated:
+            raise ValueError(f"Encoder {encoder} does not support animation")
+        if color_mode != "P":
+            raise ValueError("Animated export is palette based; color_mode must be \"P\"")
+    index = AnimeIndex.load(anime_path.replace("Anime", "AnimeInfo"))
+    pixels = None
+    if catalog_path is not None:
+        import catalog
+
+        with catalog.Catalog(catalog_path) as anime_catalog:
+            anime_catalog.update_animes(anime_path, graphic_path)
+            pixels = anime_catalog.anime_costs(anime_path)
+    if pixels is None:
+        addresses = index.records["address"].astype(np.int64)
+        # 以相邻记录的地址差估算每个动画的动作/帧数据量，去掉动作头后每 10 字节一帧，
+        # 再乘以全部图像的平均面积估算要解码的像素数
+        order = np.argsort(addresses, kind="stable")
+        ends = np.append(addresses[order][1:], os.path.getsize(anime_path))
+        sizes = np.empty(len(addresses), dtype=np.int64)
+        sizes[order] = ends - addresses[order]
+        frames = np.maximum(sizes - 12 * index.records["action_count"].astype(np.int64), 0) // 10
+        graphics = GraphicIndex.load(graphic_path.replace("Graphic", "GraphicInfo")).records
+        area = graphics["width"].astype(np.int64) * graphics["height"]
+        pixels = (frames * (area.mean() if len(area) else 0.0)).astype(np.int64)
+
+    if ids is not None:
+        sequences = index.find_many(ids)
+        for id in np.asarray(ids)[sequences < 0]:
+            print(f"未找到动画 id：{id}")
+        sequences = np.unique(sequences[sequences >= 0])
+    else:
+        sequences = np.arange(len(index))
+    batches = [sequences[i : i + batch_size] for i in range(0, len(sequences), batch_size)]
+    batches.sort(key=lambda batch: -int(pixels[batch].sum()))
+    # 帧图像和合成后的大图各按一份估计，RGBA 每像素 4 字节
+    pixel_bytes = 4 if color_mode == "RGBA" else 1
+    costs = [2 * pixel_bytes * int(pixels[batch].sum()) for batch in batches]
+
+    manifest = ExportManifest(output_dir) if incremental else None
+    anime_ids = index.records["id"]
+    options = {
+        "mode": mode,
+        "palette_path": palette_path,
+        "color_mode": color_mode,
+        "encoder": encoder,
+        "prefetch": (prefetch_depth, prefetch_bytes),
+        "palette_paths": palette_paths,
+        "frame_cache": FrameCache.budget(workers or os.cpu_count() or 1, frame_cache_bytes),
+    }
+    tasks = []
+    for batch in batches:
+        previous = None
+        if incremental:
+            keys = [str(anime_ids[sequence]) for sequence in batch]
+            previous = {key: manifest.entries[key] for key in keys if key in manifest.entries}
+        tasks.append(
+            (
+                _export_animes_task,
+                anime_path,
+                graphic_path,
+                batch.tolist(),
+                output_dir,
+                incremental,
+                previous,
+                options,
+            )
+        )
+
+    unsaved = 0
+
+    def on_result(entries):
+        nonlocal unsaved
+        for key, entry in entries:
+            manifest.entries[key] = entry
+        # 定期落盘，中断后已完成的部分不必重做
+        unsaved += len(entries)
+        if unsaved >= 256:
+            manifest.save()
+            unsaved = 0
+
+    try:
+        return _run_pool(tasks, workers, max_pending, "动画", on_result, costs, max_pending_bytes)
+    finally:
+        if manifest is not None:
+            manifest.save()
+
+
+def export_graphics(
+    graphic_path: str,
+    output_dir: str = "output",
+    batch_size: int = 256,
+    workers: int = None,
+    max_pending: int = None,
+    palette_path: str = None,
+    color_mode: str = "P",
+    encoder: str = "balanced",
+    prefetch_depth: int = None,
+    prefetch_bytes: int = None,
+    palette_paths: List[str] = None,
+    max_pending_bytes: int = None,
+    frame_cache_bytes: int = None,
+):
+    """用进程池导出 GraphicInfo 中的全部图像
+
+    按地址顺序每 batch_size 个图像分为一批，批内的块可以合并读取；批按总面积从大到小调度；
+    批内图像同时在内存中，在途批的像素字节数之和不超过 max_pending_bytes；palette_paths 等见 export_animes；
+    每个图像只读一次，frame_cache_bytes 为 None 时关闭帧缓存，否则为所有进程帧缓存的总字节数
+    """
+    _check_palette_names(palette_paths)
+    SheetEncoder.get(encoder).check_color_mode(color_mode)
+    index = GraphicIndex.load(graphic_path.replace("Graphic", "GraphicInfo"))
+    order = np.argsort(index.records["address"], kind="stable")
+    sequences = index.records["sequence"][order]
+    area = index.records["width"][order].astype(np.int64) * index.records["height"][order]
+    os.makedirs(output_dir, exist_ok=True)
+
+    starts = range(0, len(sequences), batch_size)
+    starts = sorted(starts, key=lambda i: -int(area[i : i + batch_size].sum()))
+    pixel_bytes = 4 if color_mode == "RGBA" else 1
+    costs = [pixel_bytes * int(area[i : i + batch_size].sum()) for i in starts]
+    frame_cache = 0
+    if frame_cache_bytes is not None:
+        frame_cache = FrameCache.budget(workers or os.cpu_count() or 1, frame_cache_bytes)
+    tasks = [
+        (
+            _export_graphics_task,
+            graphic_path,
+            sequences[i : i + batch_size].tolist(),
+            output_dir,
+            {
+                "palette_path": palette_path,
+                "color_mode": color_mode,
+                "encoder": encoder,
+                "prefetch": (prefetch_depth, prefetch_bytes),
+                "palette_paths": palette_paths,
+                "frame_cache": frame_cache,
+            },
+        )
+        for i in starts
+    ]
+    return _run_pool(tasks, workers, max_pending, "图像", costs=costs, max_pending_bytes=max_pending_bytes)
@@ -0,0 +1,595 @@
+import os
+import json
+import hashlib
+import math
+import struct
+import numpy as np
+from PIL import Image
+from typing import List, Tuple
+
+from cgexport import STATS, FrameCache, Graphic, GraphicIndex, Palette, SheetEncoder, _run_pool
+
+# 菱形地块在屏幕上的尺寸（像素）
+TILE_WIDTH = 64
+TILE_HEIGHT = 48
+# 瓦片金字塔中每张瓦片的边长（像素）
+PYRAMID_TILE_SIZE = 256
+
+
+class GameMap:
+    """地图文件（map/*.dat）
+
+    20 字节文件头："MAP" + 9 字节保留 + 东西方向格数（uint32）+ 南北方向格数（uint32），
+    随后依次为地面、物件、标志三层，每层 south*east 个 uint16，按 [south][east] 排列；
+    地面和物件层的值是 GraphicInfo 中的 map_number，0 表示空
+    """
+
+    def __init__(self, path: str):
+        if not os.path.exists(path):
+            raise ValueError(f"Invalid path: {path}")
+        self.path = path
+        with open(path, "rb") as file:
+            data = file.read()
+        if len(data) < 20 or data[:3] != b"MAP":
+            raise ValueError(f"Invalid map file: {path}")
+        self.width, self.height = struct.unpack_from("<II", data, 12)
+        cells = self.width * self.height
+        layer_count = min((len(data) - 20) // (cells * 2), 3) if cells else 0
+        if layer_count < 2:
+            raise ValueError(f"Invalid map data size in {path}: {len(data)}")
+        layers = np.frombuffer(data, dtype="<u2", count=layer_count * cells, offset=20)
+        layers = layers.reshape(layer_count, self.height, self.width)
+        self.ground = layers[0]
+        self.objects = layers[1]
+        self.flags = layers[2] if layer_count > 2 else None
+
+    @property
+    def id(self) -> int:
+        name = os.path.splitext(os.path.basename(self.path))[0]
+        return int(name) if name.isdigit() else None
+
+
+class MapRenderer:
+    """把地图的地面层和物件层合成为一张图
+
+    地块 (east, south) 的锚点位于屏幕 ((east + south) * 32, (south - east) * 24)，
+    图像按 GraphicInfo 的 offset_x/offset_y 相对锚点放置；先画地面再画物件，
+    同层内由后往前（锚点屏幕 y 从小到大）绘制。合成在数组上批量完成，
+    每批内按图像分组一次性写入所有放置位置
+    """
+
+    # 每批最多写入的像素数，限制合成时的临时内存
+    batch_pixels = 1 << 22
+    # 已提取的图像不透明像素的缓存上限（字节），LRU 淘汰
+    sprite_cache_bytes = 64 * 1024 * 1024
+
+    def __init__(self, graphic_paths: List[str], palette: Palette = None):
+        if isinstance(graphic_paths, str):
+            graphic_paths = [graphic_paths]
+        self.graphic_paths = graphic_paths
+        self.palette = palette
+        self.indexes = [
+            GraphicIndex.load(path.replace("Graphic", "GraphicInfo")) for path in graphic_paths
+        ]
+        self._alpha = Graphic.palette_lut(palette)[:, 3]
+        # key -> (行坐标, 列坐标, 调色板索引)
+        self._sprites = FrameCache(self.sprite_cache_bytes)
+
+        # map_number -> (档案编号 << 32 | sequence)，多个 Graphic 文件时前面的优先
+        size = max(len(index.map_table()) for index in self.indexes)
+        self.map_table = np.full(size, -1, dtype=np.int64)
+        for archive in reversed(range(len(self.indexes))):
+            table = self.indexes[archive].map_table()
+            found = np.flatnonzero(table >= 0)
+            self.map_table[found] = (archive << 32) | table[found]
+
+    def lookup(self, map_numbers: np.ndarray) -> np.ndarray:
+        """把 map_number 数组转换为图像 key 数组，找不到的为 -1"""
+        map_numbers = np.asarray(map_numbers, dtype=np.int64)
+        keys = np.full(map_numbers.shape, -1, dtype=np.int64)
+        valid = (map_numbers > 0) & (map_numbers < len(self.map_table))
+        keys[valid] = self.map_table[map_numbers[valid]]
+        return keys
+
+    def metrics(self, keys: np.ndarray) -> np.ndarray:
+        """每个 key 的 (offset_x, offset_y, width, height, area_south)，形状为 (n, 5)"""
+        result = np.zeros((len(keys), 5), dtype=np.int64)
+        archives = keys >> 32
+        sequences = keys & 0xFFFFFFFF
+        for archive, index in enumerate(self.indexes):
+            selected = np.flatnonzero(archives == archive)
+            if len(selected) == 0:
+                continue
+            records = index.records
+            positions = index.positions(sequences[selected])
+            for column, field in enumerate(
+                ("offset_x", "offset_y", "width", "height", "area_south")
+            ):
+                result[selected, column] = records[field][positions]
+        return result
+
+    def placements(self, game_map: GameMap, layer: str):
+        """某一层所有非空格子的 (key, 左上角 x, 左上角 y, 宽, 高)，已按绘制顺序排列"""
+        cells = game_map.ground if layer == "ground" else game_map.objects
+        souths, easts = np.nonzero(cells)
+        keys = self.lookup(cells[souths, easts])
+        found = keys >= 0
+        souths, easts, keys = souths[found], easts[found], keys[found]
+        metrics = self.metrics(keys)
+
+        anchor_x = (easts + souths) * (TILE_WIDTH // 2)
+        anchor_y = (souths - easts) * (TILE_HEIGHT // 2)
+        # 多格物件以最靠前的格子排序
+        depth = souths + np.maximum(metrics[:, 4], 1) - 1 - easts
+        order = np.lexsort((easts + souths, depth))
+        return (
+            keys[order],
+            (anchor_x + metrics[:, 0])[order],
+            (anchor_y + metrics[:, 1])[order],
+            metrics[order, 2],
+            metrics[order, 3],
+        )
+
+    def sprite(self, key: int):
+        """图像的不透明像素：(行坐标, 列坐标, 调色板索引)，坐标通常为 uint16，每个像素 5 字节"""
+        sprite = self._sprites.get(key)
+        if sprite is None:
+            index = self.indexes[key >> 32]
+            image = index.graphic(key & 0xFFFFFFFF)._read_indexed()
+            if image is None:
+                pixels = np.zeros((0, 0), dtype=np.uint8)
+            else:
+                pixels = np.asarray(image)
+            rows, columns = np.nonzero(self._alpha[pixels])
+            dtype = np.uint16 if max(pixels.shape) <= 0xFFFF else np.uint32
+            sprite = (rows.astype(dtype), columns.astype(dtype), pixels[rows, columns])
+            self._sprites.put(key, sprite, sum(array.nbytes for array in sprite))
+        return sprite
+
+    def composite(self, canvas: np.ndarray, keys, xs, ys) -> None:
+        """按给定顺序把图像写入索引画布，后写的覆盖先写的；超出画布的像素被裁掉"""
+        height, width = canvas.shape
+        flat = canvas.reshape(-1)
+        if len(keys) == 0:
+            return
+        unique_keys, inverse = np.unique(keys, return_inverse=True)
+        counts = np.array([len(self.sprite(int(key))[0]) for key in unique_keys])
+        # 按绘制顺序切批，批与批之间顺序执行，保证覆盖关系正确
+        total = np.cumsum(counts[inverse])
+        cuts = np.searchsorted(
+            total, np.arange(self.batch_pixels, total[-1], self.batch_pixels), side="right"
+        )
+        bounds = np.unique(np.concatenate(([0], cuts, [len(keys)])))
+        with STATS.stage("composite"):
+            for start, end in zip(bounds[:-1], bounds[1:]):
+                self.__composite_batch(
+                    flat, width, height, keys[start:end], xs[start:end], ys[start:end], start
+                )
+        STATS.count("frames", len(keys))
+
+    def __composite_batch(self, flat, width, height, keys, xs, ys, rank_base) -> None:
+        unique_keys, inverse = np.unique(keys, return_inverse=True)
+        grouped = np.argsort(inverse, kind="stable")
+        groups = np.split(grouped, np.cumsum(np.bincount(inverse))[:-1])
+        dests = []
+        values = []
+        ranks = []
+        for key, members in zip(unique_keys, groups):
+            rows, columns, colors = self.sprite(int(key))
+            if len(rows) == 0:
+                continue
+            ys_ = ys[members, None] + rows[None, :]
+            xs_ = xs[members, None] + columns[None, :]
+            inside = (ys_ >= 0) & (ys_ < height) & (xs_ >= 0) & (xs_ < width)
+            dests.append((ys_ * width + xs_)[inside])
+            values.append(np.broadcast_to(colors, ys_.shape)[inside])
+            ranks.append(np.broadcast_to(members[:, None] + rank_base, ys_.shape)[inside])
+        if not dests:
+            return
+        dest = np.concatenate(dests)
+        value = np.concatenate(values)
+        rank = np.concatenate(ranks)
+        order = np.argsort(rank, kind="stable")
+        dest = dest[order]
+        value = value[order]
+        # 同一像素只保留绘制顺序最后的一次写入
+        _, last = np.unique(dest[::-1], return_index=True)
+        last = len(dest) - 1 - last
+        flat[dest[last]] = value[last]
+
+    def bounds(self, layers) -> Tuple[int, int, int, int]:
+        """所有放置图像的屏幕包围盒 (left, top, right, bottom)"""
+        left = top = right = bottom = 0
+        first = True
+        for _, xs, ys, widths, heights in layers:
+            if len(xs) == 0:
+                continue
+            box = (xs.min(), ys.min(), (xs + widths).max(), (ys + heights).max())
+            if first:
+                left, top, right, bottom = box
+                first = False
+            else:
+                left, top = min(left, box[0]), min(top, box[1])
+                right, bottom = max(right, box[2]), max(bottom, box[3])
+        return int(left), int(top), int(right), int(bottom)
+
+    def render(self, game_map: GameMap, color_mode: str = "P") -> Image.Image:
+        """合成整张地图；color_mode 为 "P" 时返回带调色板和透明表的索引图像，为 "RGBA" 时返回 32 位图像"""
+        layers = [self.placements(game_map, "ground"), self.placements(game_map, "objects")]
+        left, top, right, bottom = self.bounds(layers)
+        canvas = np.zeros((bottom - top, right - left), dtype=np.uint8)
+        for keys, xs, ys, _, _ in layers:
+            self.composite(canvas, keys, xs - left, ys - top)
+        return self.to_image(canvas, color_mode)
+
+    def to_image(self, canvas: np.ndarray, color_mode: str = "P") -> Image.Image:
+        if color_mode == "RGBA":
+            return Image.fromarray(Graphic.palette_lut(self.palette)[canvas])
+        image = Image.frombytes("P", (canvas.shape[1], canvas.shape[0]), canvas.tobytes())
+        return Graphic.apply_palette(image, self.palette)
+
+
+class MapPlan:
+    """整张地图的放置数据，以及按 chunk_size 见方划分的块到放置的空间索引
+
+    索引为每层一份 CSR 结构：offsets[chunk]..offsets[chunk + 1] 是落在该块内的放置下标，
+    下标保持原有绘制顺序，因此单独渲染一块与整图渲染后裁剪的结果一致
+    """
+
+    def __init__(self, renderer: MapRenderer, game_map: GameMap, chunk_size: int = 1024):
+        self.renderer = renderer
+        self.chunk_size = chunk_size
+        self.layers = [renderer.placements(game_map, "ground"), renderer.placements(game_map, "objects")]
+        self.left, self.top, right, bottom = renderer.bounds(self.layers)
+        self.width = right - self.left
+        self.height = bottom - self.top
+        self.columns = max(math.ceil(self.width / chunk_size), 1)
+        self.rows = max(math.ceil(self.height / chunk_size), 1)
+        self._index = [self.__build_index(layer) for layer in self.layers]
+
+    def __build_index(self, layer):
+        _, xs, ys, widths, heights = layer
+        size = self.chunk_size
+        x0 = (xs - self.left) // size
+        y0 = (ys - self.top) // size
+        x1 = np.minimum((xs - self.left + widths - 1) // size, self.columns - 1)
+        y1 = np.minimum((ys - self.top + heights - 1) // size, self.rows - 1)
+        span_x = np.maximum(x1 - x0 + 1, 0)
+        spans = span_x * np.maximum(y1 - y0 + 1, 0)
+
+        # 把每个放置展开到它覆盖的每个块
+        members = np.repeat(np.arange(len(xs)), spans)
+        step = np.arange(len(members)) - np.repeat(np.cumsum(spans) - spans, spans)
+        span_x = np.repeat(span_x, spans)
+        chunks = (np.repeat(y0, spans) + step // np.maximum(span_x, 1)) * self.columns + (
+            np.repeat(x0, spans) + step % np.maximum(span_x, 1)
+        )
+        order = np.lexsort((members, chunks))
+        counts = np.bincount(chunks, minlength=self.rows * self.columns)
+        offsets = np.concatenate(([0], np.cumsum(counts)))
+        return members[order], offsets
+
+    def members(self, layer: int, column: int, row: int) -> np.ndarray:
+        members, offsets = self._index[layer]
+        chunk = row * self.columns + column
+        return members[offsets[chunk] : offsets[chunk + 1]]
+
+    def is_empty(self, column: int, row: int) -> bool:
+        return all(len(self.members(layer, column, row)) == 0 for layer in range(len(self.layers)))
+
+    def render_chunk(self, column: int, row: int) -> np.ndarray:
+        """渲染一块的索引画布，只解码与该块相交的图像"""
+        size = self.chunk_size
+        left = self.left + column * size
+        top = self.top + row * size
+        canvas = np.zeros((size, size), dtype=np.uint8)
+        for layer, (keys, xs, ys, _, _) in enumerate(self.layers):
+            members = self.members(layer, column, row)
+            self.renderer.composite(canvas, keys[members], xs[members] - left, ys[members] - top)
+        return canvas
+
+    @property
+    def max_zoom(self) -> int:
+        """最大缩放级别：该级别下一张瓦片对应 PYRAMID_TILE_SIZE 见方的原始像素"""
+        longest = max(self.width, self.height, 1)
+        return max(math.ceil(math.log2(longest / PYRAMID_TILE_SIZE)), 0)
+
+
+def _load_plan(map_path: str, graphic_paths: tuple, palette: Palette, chunk_size: int) -> MapPlan:
+    renderer = MapRenderer(list(graphic_paths), palette)
+    return MapPlan(renderer, GameMap(map_path), chunk_size)
+
+
+# 进程池任务复用的放置数据：[参数, MapPlan]，只保留最近一张地图的一份
+_task_plan = [None, None]
+
+
+def _plan_for_task(map_path: str, graphic_paths: tuple, palette: Palette, chunk_size: int) -> MapPlan:
+    """同一进程连续处理同一地图的块时复用放置数据和图像缓存，换地图时先释放旧的"""
+    key = (map_path, graphic_paths, palette, chunk_size)
+    if _task_plan[0] != key:
+        _task_plan[:] = [None, None]
+        _task_plan[:] = [key, _load_plan(map_path, graphic_paths, palette, chunk_size)]
+    return _task_plan[1]
+
+
+def _render_chunks_task(
+    map_path: str,
+    graphic_paths: tuple,
+    palette: Palette,
+    chunk_size: int,
+    chunks: List[Tuple[int, int]],
+    tiles_dir: str,
+    color_mode: str,
+    encoder: str,
+):
+    """进程池任务：渲染若干块并切成最大缩放级别的瓦片，返回 (块数, 文件数, 字节数, 0, 写出的瓦片坐标)"""
+    plan = _plan_for_task(map_path, graphic_paths, palette, chunk_size)
+    encoder = SheetEncoder.get(encoder)
+    zoom = plan.max_zoom
+    per_chunk = chunk_size // PYRAMID_TILE_SIZE
+    files = 0
+    written = 0
+    tiles = []
+    for column, row in chunks:
+        canvas = plan.render_chunk(column, row)
+        for ty in range(per_chunk):
+            for tx in range(per_chunk):
+                tile = canvas[
+                    ty * PYRAMID_TILE_SIZE : (ty + 1) * PYRAMID_TILE_SIZE,
+                    tx * PYRAMID_TILE_SIZE : (tx + 1) * PYRAMID_TILE_SIZE,
+                ]
+                if not plan.renderer._alpha[tile].any():
+                    continue
+                x = column * per_chunk + tx
+                y = row * per_chunk + ty
+                output_dir = os.path.join(tiles_dir, str(zoom), str(x))
+                os.makedirs(output_dir, exist_ok=True)
+                image = plan.renderer.to_image(np.ascontiguousarray(tile), color_mode)
+                size, _ = encoder.save(image, os.path.join(output_dir, f"{y}{encoder.extension}"))
+                files += 1
+                written += size
+                tiles.append((x, y))
+    return len(chunks), files, written, 0, tiles
+
+
+def _downsample_task(tiles_dir: str, zoom: int, parents: List[Tuple[int, int]], encoder: str):
+    """进程池任务：由 zoom + 1 级的 4 张子瓦片合成 zoom 级瓦片，返回 (瓦片数, 文件数, 字节数, 0, 写出的瓦片坐标)"""
+    encoder = SheetEncoder.get(encoder)
+    size = PYRAMID_TILE_SIZE
+    written = 0
+    tiles = []
+    for x, y in parents:
+        merged = Image.new("RGBA", (size * 2, size * 2), (0, 0, 0, 0))
+        found = False
+        for dy in range(2):
+            for dx in range(2):
+                child = os.path.join(
+                    tiles_dir, str(zoom + 1), str(x * 2 + dx), f"{y * 2 + dy}{encoder.extension}"
+                )
+                if os.path.exists(child):
+                    with Image.open(child) as image:
+                        merged.paste(image.convert("RGBA"), (dx * size, dy * size))
+                    found = True
+        if not found:
+            continue
+        output_dir = os.path.join(tiles_dir, str(zoom), str(x))
+        os.makedirs(output_dir, exist_ok=True)
+        image = merged.resize((size, size), Image.Resampling.BOX)
+        file_size, _ = encoder.save(image, os.path.join(output_dir, f"{y}{encoder.extension}"))
+        written += file_size
+        tiles.append((x, y))
+    return len(tiles), len(tiles), written, 0, tiles
+
+
+def export_map_tiles(
+    map_path: str,
+    graphic_paths: List[str],
+    output_dir: str = "output",
+    palette: Palette = None,
+    color_mode: str = "P",
+    encoder="balanced",
+    chunk_size: int = 1024,
+    workers: int = None,
+    batch_size: int = 4,
+) -> str:
+    """把地图渲染为 z/x/y 瓦片金字塔，保存在 output_dir/map/<地图文件名>/，返回该目录
+
+    地图按 chunk_size 见方分块渲染，每块只解码与之相交的图像，块之间用进程池并行，
+    峰值内存与地图大小无关；最大缩放级别的瓦片按 color_mode 输出，其余级别由子瓦片缩小得到，为 RGBA
+    """
+    if chunk_size % PYRAMID_TILE_SIZE:
+        raise ValueError(f"chunk_size must be a multiple of {PYRAMID_TILE_SIZE}")
+    if SheetEncoder.get(encoder).format == "RAW":
+        raise ValueError("Tile pyramid needs an encoder whose output can be read back")
+    SheetEncoder.get(encoder).check_color_mode(color_mode)
+    if isinstance(graphic_paths, str):
+        graphic_paths = [graphic_paths]
+    graphic_paths = tuple(graphic_paths)
+    palette = Palette.of(palette) if palette is not None else None
+    name = os.path.splitext(os.path.basename(map_path))[0]
+    tiles_dir = os.path.join(output_dir, "map", name)
+
+    # 主进程只用放置数据确定非空块和金字塔尺寸，取完即释放
+    plan = _load_plan(map_path, graphic_paths, palette, chunk_size)
+    chunks = [
+        (column, row)
+        for row in range(plan.rows)
+        for column in range(plan.columns)
+        if not plan.is_empty(column, row)
+    ]
+    max_zoom = plan.max_zoom
+    layout = {
+        "tile_size": PYRAMID_TILE_SIZE,
+        "max_zoom": max_zoom,
+        "width": plan.width,
+        "height": plan.height,
+        "left": plan.left,
+        "top": plan.top,
+        "extension": SheetEncoder.get(encoder).extension,
+    }
+    del plan
+    tiles = []
+    tasks = [
+        (
+            _render_chunks_task,
+            map_path,
+            graphic_paths,
+            palette,
+            chunk_size,
+            chunks[i : i + batch_size],
+            tiles_dir,
+            color_mode,
+            encoder,
+        )
+        for i in range(0, len(chunks), batch_size)
+    ]
+    _run_pool(tasks, workers, None, "地图块", tiles.extend)
+
+    parents_batch = batch_size * 16
+    for zoom in reversed(range(max_zoom)):
+        parents = sorted({(x // 2, y // 2) for x, y in tiles})
+        tiles = []
+        tasks = [
+            (_downsample_task, tiles_dir, zoom, parents[i : i + parents_batch], encoder)
+            for i in range(0, len(parents), parents_batch)
+        ]
+        _run_pool(tasks, workers, None, f"{zoom} 级瓦片", tiles.extend)
+
+    with open(os.path.join(tiles_dir, "tiles.json"), "w", encoding="utf-8") as file:
+        json.dump(layout, file)
+    return tiles_dir
+
+
+class TileColors:
+    """每个 map_number 对应图像的代表色：不透明像素在调色板下的平均色，全透明时 alpha 为 0
+
+    代表色按 Graphic 文件和调色板计算一次，给出 cache_dir 时缓存到文件，
+    以 GraphicInfo/Graphic 的大小和修改时间判断是否过期
+    """
+
+    def __init__(self, graphic_paths: List[str], palette: Palette = None, cache_dir: str = None):
+        if isinstance(graphic_paths, str):
+            graphic_paths = [graphic_paths]
+        if palette is None:
+            palette = Graphic._defalult_palette
+        self.palette_hash = hashlib.sha256(bytes(Palette.of(palette))).hexdigest()
+        indexes = [
+            GraphicIndex.load(path.replace("Graphic", "GraphicInfo")) for path in graphic_paths
+        ]
+        size = max(len(index.map_table()) for index in indexes)
+        self.colors = np.zeros((size, 4), dtype=np.uint8)
+        # 多个 Graphic 文件时前面的优先，与 MapRenderer 一致
+        for index in reversed(indexes):
+            colors = self.__load(index, palette, cache_dir)
+            found = np.flatnonzero(colors[:, 3])
+            self.colors[found] = colors[found]
+
+    def __load(self, index: GraphicIndex, palette: Palette, cache_dir: str) -> np.ndarray:
+        if cache_dir is None:
+            return TileColors.compute(index, palette)
+        info_stat = os.stat(index.info_path)
+        graphic_stat = os.stat(index.path)
+        stamp = np.array(
+            [info_stat.st_size, info_stat.st_mtime_ns, graphic_stat.st_size, graphic_stat.st_mtime_ns],
+            dtype=np.int64,
+        )
+        name = os.path.basename(index.info_path)
+        cache_path = os.path.join(cache_dir, f"{name}.{self.palette_hash[:16]}.colors.npz")
+        try:
+            with np.load(cache_path) as cache:
+                if np.array_equal(cache["stamp"], stamp):
+                    return cache["colors"]
+        except (OSError, ValueError, KeyError):
+            pass
+        colors = TileColors.compute(index, palette)
+        os.makedirs(cache_dir, exist_ok=True)
+        temp_path = cache_path + ".tmp"
+        with open(temp_path, "wb") as file:
+            np.savez(file, stamp=stamp, colors=colors)
+        os.replace(temp_path, cache_path)
+        return colors
+
+    @staticmethod
+    def compute(index: GraphicIndex, palette: Palette = None) -> np.ndarray:
+        """顺序读取所有带 map_number 的图像，返回以 map_number 为下标的 RGBA 代表色表"""
+        lut = Graphic.palette_lut(palette)
+        opaque = lut[:, 3] > 0
+        rgb = lut[:, :3].astype(np.float64)
+        table = index.map_table()
+        colors = np.zeros((len(table), 4), dtype=np.uint8)
+        frames = index.iter_frames(predicate=lambda record: record["map_number"] > 0)
+        for graphic, pixels in frames:
+            map_number = int(index.records["map_number"][index.position(graphic.sequence)])
+            if table[map_number] != graphic.sequence:
+                continue
+            counts = np.bincount(np.frombuffer(pixels, dtype=np.uint8), minlength=256)
+            counts[~opaque] = 0
+            total = counts.sum()
+            if total:
+                colors[map_number, :3] = np.rint(counts @ rgb / total)
+                colors[map_number, 3] = 255
+        return colors
+
+    def minimap(self, game_map: GameMap, objects: bool = True, scale: int = 1) -> Image.Image:
+        """每格一个像素（按 scale 放大）的小地图，行为南北方向、列为东西方向，物件色覆盖地面色"""
+        image = self.__lookup(game_map.ground)
+        if objects:
+            object_colors = self.__lookup(game_map.objects)
+            covered = object_colors[:, :, 3] > 0
+            image[covered] = object_colors[covered]
+        result = Image.fromarray(image)
+        if scale > 1:
+            result = result.resize((result.width * scale, result.height * scale), Image.Resampling.NEAREST)
+        return result
+
+    def __lookup(self, cells: np.ndarray) -> np.ndarray:
+        cells = cells.astype(np.int64)
+        cells[cells >= len(self.colors)] = 0
+        return self.colors[cells]
+
+
+def export_minimap(
+    map_path: str,
+    graphic_paths: List[str],
+    output_dir: str = "output",
+    palette: Palette = None,
+    encoder="balanced",
+    scale: int = 1,
+    cache_dir: str = None,
+    colors: TileColors = None,
+) -> str:
+    """生成小地图并保存为 output_dir/minimap/<地图文件名>，返回保存的文件路径；批量生成时传入同一个 colors"""
+    encoder = SheetEncoder.get(encoder)
+    if colors is None:
+        colors = TileColors(graphic_paths, palette, cache_dir)
+    image = colors.minimap(GameMap(map_path), scale=scale)
+    output_dir = os.path.join(output_dir, "minimap")
+    os.makedirs(output_dir, exist_ok=True)
+    name = os.path.splitext(os.path.basename(map_path))[0]
+    output_path = os.path.join(output_dir, f"{name}{encoder.extension}")
+    size, elapsed = encoder.save(image, output_path)
+    print(f"保存小地图：{output_path}（{image.width}x{image.height}，{size} 字节，编码 {elapsed * 1000:.1f} ms）")
+    return output_path
+
+
+def export_map(
+    map_path: str,
+    graphic_paths: List[str],
+    output_dir: str = "output",
+    palette: Palette = None,
+    color_mode: str = "P",
+    encoder="balanced",
+) -> str:
+    """渲染一张地图并保存为 output_dir/map/<地图文件名>，返回保存的文件路径"""
+    encoder = SheetEncoder.get(encoder)
+    encoder.check_color_mode(color_mode)
+    game_map = GameMap(map_path)
+    image = MapRenderer(graphic_paths, palette).render(game_map, color_mode)
+    output_dir = os.path.join(output_dir, "map")
+    os.makedirs(output_dir, exist_ok=True)
+    name = os.path.splitext(os.path.basename(map_path))[0]
+    output_path = os.path.join(output_dir, f"{name}{encoder.extension}")
+    size, elapsed = encoder.save(image, output_path)
+    print(f"保存地图：{output_path}（{image.width}x{image.height}，{size} 字节，编码 {elapsed * 1000:.1f} ms）")
+    return output_path
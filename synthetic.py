@@ -0,0 +1,191 @@
+import os
+import struct
+import numpy as np
+from typing import Dict, List, Tuple
+
+from cgexport import ActionType
+
+# 像素生成方式：
+#   sprite：左右透明边 + 成段的同色像素，接近角色帧
+#   runs：整行长段同色，多为 0x8n/0x9n/0xAn 填充
+#   noise：随机像素，多为 0x0n/0x1n/0x2n 原样
+#   tile：菱形地块，外侧透明
+PROFILES = ("sprite", "runs", "noise", "tile")
+
+
+def encode_rle(pixels) -> bytes:
+    """按 Graphic 的压缩格式编码索引像素，三类操作码（原样、填充、透明）都会按长度选用 1~3 字节计数"""
+    pixels = bytes(pixels)
+    length = len(pixels)
+    out = bytearray()
+    i = 0
+    while i < length:
+        value = pixels[i]
+        j = i + 1
+        while j < length and pixels[j] == value and j - i < 0xFFFFF:
+            j += 1
+        run = j - i
+        if value == 0 or run >= 3:
+            if value == 0:
+                if run < 0x10:
+                    out.append(0xC0 | run)
+                elif run < 0x1000:
+                    out += bytes((0xD0 | run >> 8, run & 0xFF))
+                else:
+                    out += bytes((0xE0 | run >> 16, run >> 8 & 0xFF, run & 0xFF))
+            else:
+                if run < 0x10:
+                    out += bytes((0x80 | run, value))
+                elif run < 0x1000:
+                    out += bytes((0x90 | run >> 8, value, run & 0xFF))
+                else:
+                    out += bytes((0xA0 | run >> 16, value, run >> 8 & 0xFF, run & 0xFF))
+            i = j
+            continue
+
+        # 原样段延续到下一个透明像素或长度不小于 3 的同色段之前
+        j = i
+        while j < length and j - i < 0xFFFFF:
+            if pixels[j] == 0:
+                break
+            if j + 2 < length and pixels[j] == pixels[j + 1] == pixels[j + 2]:
+                break
+            j += 1
+        count = j - i
+        if count < 0x10:
+            out.append(count)
+        elif count < 0x1000:
+            out += bytes((0x10 | count >> 8, count & 0xFF))
+        else:
+            out += bytes((0x20 | count >> 16, count >> 8 & 0xFF, count & 0xFF))
+        out += pixels[i:j]
+        i = j
+    return bytes(out)
+
+
+def make_pixels(rng: np.random.Generator, width: int, height: int, profile: str = "sprite") -> bytes:
+    """生成一帧索引像素（按文件中的自下而上行序，与解码结果一致）"""
+    if profile == "noise":
+        return rng.integers(1, 256, width * height, dtype=np.uint8).tobytes()
+    if profile == "tile":
+        ys, xs = np.mgrid[0:height, 0:width]
+        inside = np.abs(xs - width / 2) / (width / 2) + np.abs(ys - height / 2) / (height / 2) <= 1
+        pixels = np.where(inside, rng.integers(1, 256, (height, width)), 0)
+        return pixels.astype(np.uint8).tobytes()
+
+    mean_run = 48 if profile == "runs" else 6
+    pixels = np.zeros((height, width), dtype=np.uint8)
+    for row in range(height):
+        if profile == "runs":
+            left, right = 0, width
+        else:
+            left = int(rng.integers(0, max(width // 3, 1)))
+            right = int(rng.integers(max(width * 2 // 3, left + 1), width + 1))
+        x = left
+        while x < right:
+            run = int(rng.geometric(1 / mean_run))
+            pixels[row, x : min(x + run, right)] = rng.integers(0, 256)
+            x += run
+    return pixels.tobytes()
+
+
+def write_archive(
+    output_dir: str,
+    graphics: int = 200,
+    width: Tuple[int, int] = (16, 128),
+    height: Tuple[int, int] = (16, 128),
+    profile: str = "sprite",
+    animes: int = 20,
+    action_types: int = 3,
+    frames: Tuple[int, int] = (4, 10),
+    map_size: Tuple[int, int] = None,
+    seed: int = 0,
+    suffix: str = "_1",
+) -> Dict[str, str]:
+    """写出一套合成的 GraphicInfo/Graphic/AnimeInfo/Anime 文件（可选再写一张地图），返回各文件路径
+
+    graphics 为图像数，width/height 为尺寸范围，profile 见 PROFILES；
+    每个动画有 action_types 种动作、每种 8 个方向，每个方向的帧数在 frames 范围内；
+    每三个图像中有一个带 map_number（1000 + sequence），map_size 给出时用它们铺一张 (east, south) 大小的地图
+    """
+    if profile not in PROFILES:
+        raise ValueError(f"Unknown profile: {profile}")
+    rng = np.random.default_rng(seed)
+    os.makedirs(output_dir, exist_ok=True)
+    paths = {
+        "graphic": os.path.join(output_dir, f"Graphic{suffix}.bin"),
+        "graphic_info": os.path.join(output_dir, f"GraphicInfo{suffix}.bin"),
+        "anime": os.path.join(output_dir, f"Anime{suffix}.bin"),
+        "anime_info": os.path.join(output_dir, f"AnimeInfo{suffix}.bin"),
+    }
+
+    map_numbers: List[int] = []
+    with open(paths["graphic"], "wb") as graphic_file, open(paths["graphic_info"], "wb") as info_file:
+        for sequence in range(graphics):
+            map_number = 1000 + sequence if sequence % 3 == 0 else 0
+            if map_number:
+                map_numbers.append(map_number)
+                w, h = 64, 47
+                pixels = make_pixels(rng, w, h, "tile")
+            else:
+                w = int(rng.integers(width[0], width[1] + 1))
+                h = int(rng.integers(height[0], height[1] + 1))
+                pixels = make_pixels(rng, w, h, profile)
+            payload = encode_rle(pixels)
+            address = graphic_file.tell()
+            graphic_file.write(struct.pack("<2sbblll", b"RD", 1, 0, w, h, len(payload) + 16))
+            graphic_file.write(payload)
+            info_file.write(
+                struct.pack(
+                    "<lLLllLLbbb5bL",
+                    sequence,
+                    address,
+                    len(payload) + 16,
+                    -(w // 2),
+                    -h + 12 if not map_number else -(h // 2),
+                    w,
+                    h,
+                    1,
+                    1,
+                    0,
+                    0,
+                    0,
+                    0,
+                    0,
+                    0,
+                    map_number,
+                )
+            )
+
+    with open(paths["anime"], "wb") as anime_file, open(paths["anime_info"], "wb") as info_file:
+        for sequence in range(animes):
+            address = anime_file.tell()
+            count = 0
+            for action_type in range(action_types):
+                action_type = list(ActionType)[action_type % len(ActionType)].value
+                frame_count = int(rng.integers(frames[0], frames[1] + 1))
+                # 同一动作的 8 个方向复用部分帧，模拟对称姿势
+                shared = rng.integers(0, graphics, frame_count)
+                for direction in range(8):
+                    sequences = np.where(
+                        rng.random(frame_count) < 0.3, shared, rng.integers(0, graphics, frame_count)
+                    )
+                    anime_file.write(
+                        struct.pack("<HHII", direction, action_type, 100 * frame_count, frame_count)
+                    )
+                    for graphic_sequence in sequences:
+                        anime_file.write(struct.pack("<I6s", int(graphic_sequence), bytes(6)))
+                    count += 1
+            info_file.write(struct.pack("<IIHH", 100000 + sequence, address, count, 0))
+
+    if map_size is not None and map_numbers:
+        east, south = map_size
+        ground = rng.choice(map_numbers, east * south).astype("<u2")
+        objects = np.where(rng.random(east * south) < 0.05, rng.choice(map_numbers, east * south), 0)
+        paths["map"] = os.path.join(output_dir, "0.dat")
+        with open(paths["map"], "wb") as file:
+            file.write(b"MAP" + bytes(9) + struct.pack("<II", east, south))
+            file.write(ground.tobytes())
+            file.write(objects.astype("<u2").tobytes())
+            file.write(bytes(2 * east * south))
+    return paths
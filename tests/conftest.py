@@ -0,0 +1,17 @@
+import pytest
+
+import synthetic
+
+
+@pytest.fixture(scope="session")
+def archive(tmp_path_factory):
+    """小型合成档案：GraphicInfo/Graphic/AnimeInfo/Anime 和一张地图"""
+    return synthetic.write_archive(
+        str(tmp_path_factory.mktemp("archive")),
+        graphics=60,
+        width=(8, 48),
+        height=(8, 48),
+        animes=6,
+        frames=(1, 5),
+        map_size=(12, 10),
+    )
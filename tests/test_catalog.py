@@ -0,0 +1,110 @@
+import os
+
+import numpy as np
+import pytest
+
+import synthetic
+from catalog import build_catalog
+from cgexport import Anime, GraphicIndex
+
+
+@pytest.fixture
+def paths(tmp_path):
+    return synthetic.write_archive(str(tmp_path / "data"), graphics=40, animes=5, frames=(1, 5), seed=1)
+
+
+def build(tmp_path, paths, **kwargs):
+    return build_catalog(
+        str(tmp_path / "catalog.db"),
+        anime_paths=[(paths["anime"], paths["graphic"])],
+        **kwargs,
+    )
+
+
+def touch(path):
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+
+
+def test_catalog_matches_archive(tmp_path, paths):
+    animes = {sequence: Anime(paths["anime"], paths["graphic"], sequence) for sequence in range(5)}
+    with build(tmp_path, paths) as catalog:
+        summary = catalog.summary()
+        assert summary["sources"] == 2
+        assert summary["graphics"] == 40
+        assert summary["animes"] == 5
+        assert summary["actions"] == sum(len(anime.actions) for anime in animes.values())
+        assert summary["frames"] == sum(len(action.sequences) for anime in animes.values() for action in anime.actions)
+
+        index = GraphicIndex(paths["graphic_info"])
+        areas = index.records["width"].astype(np.int64) * index.records["height"]
+        assert catalog.largest_graphics(1)[0]["area"] == areas.max()
+
+        costs = catalog.anime_costs(paths["anime"])
+        for sequence, anime in animes.items():
+            used = {int(seq) for action in anime.actions for seq in action.sequences}
+            assert costs[sequence] == sum(int(areas[seq]) for seq in used)
+            for seq in used:
+                ids = [row["id"] for row in catalog.animes_using(seq, paths["graphic"])]
+                assert anime.id in ids
+
+        longest = max(len(action.sequences) for anime in animes.values() for action in anime.actions)
+        assert len(catalog.actions_with_frames(longest)) >= 1
+        assert catalog.actions_with_frames(longest + 1) == []
+
+
+def distinct_areas(paths, count):
+    records = GraphicIndex(paths["graphic_info"]).records
+    areas = []
+    for sequence in range(count):
+        anime = Anime(paths["anime"], paths["graphic"], sequence)
+        used = {int(seq) for action in anime.actions for seq in action.sequences}
+        areas.append(sum(int(records["width"][seq]) * int(records["height"][seq]) for seq in used))
+    return areas
+
+
+def test_catalog_rebuilds_only_changed_sources(tmp_path, paths):
+    build(tmp_path, paths).close()
+    with build(tmp_path, paths) as catalog:
+        assert not catalog.update_graphics(paths["graphic"])
+        assert not catalog.update_animes(paths["anime"], paths["graphic"])
+        assert catalog.update_animes(paths["anime"], paths["graphic"], force=True)
+
+        touch(paths["anime_info"])
+        assert not catalog.update_graphics(paths["graphic"])
+        assert catalog.update_animes(paths["anime"], paths["graphic"])
+        assert catalog.summary()["animes"] == 5
+
+
+def test_catalog_rebuild_replaces_records(tmp_path, paths):
+    with build(tmp_path, paths) as catalog:
+        assert catalog.anime_costs(paths["anime"]).tolist() == distinct_areas(paths, 5)
+    synthetic.write_archive(os.path.dirname(paths["anime"]), graphics=40, animes=3, seed=2)
+    touch(paths["anime_info"])
+    touch(paths["graphic_info"])
+    with build(tmp_path, paths) as catalog:
+        assert catalog.summary()["animes"] == 3
+        assert catalog.anime_costs(paths["anime"]).tolist() == distinct_areas(paths, 3)
+
+
+def test_prune_removes_deleted_sources(tmp_path, paths):
+    build(tmp_path, paths).close()
+    os.remove(paths["graphic"])
+    with build_catalog(str(tmp_path / "catalog.db")) as catalog:
+        summary = catalog.summary()
+        assert summary["sources"] == 0
+        assert summary["graphics"] == summary["animes"] == summary["frames"] == summary["graphic_animes"] == 0
+
+
+def test_prune_keeps_existing_sources(tmp_path, paths):
+    other = synthetic.write_archive(str(tmp_path / "other"), graphics=10, animes=2, seed=4)
+    with build_catalog(
+        str(tmp_path / "catalog.db"),
+        anime_paths=[(paths["anime"], paths["graphic"]), (other["anime"], other["graphic"])],
+    ) as catalog:
+        assert catalog.summary()["sources"] == 4
+    os.remove(other["anime"])
+    with build_catalog(str(tmp_path / "catalog.db")) as catalog:
+        assert catalog.summary()["sources"] == 3
+        assert catalog.summary()["animes"] == 5
+        assert catalog.anime_costs(other["anime"]) is None
@@ -0,0 +1,106 @@
+import numpy as np
+import pytest
+
+import synthetic
+from cgexport import Anime, Graphic, GraphicArchive, GraphicIndex, _export_animes_task
+
+
+# 分别强制走 run table 和逐段切片复制两条路径
+@pytest.fixture(params=["default", "run_table", "slices"])
+def batch_path(request, monkeypatch):
+    if request.param == "run_table":
+        monkeypatch.setattr(Graphic, "run_table_min_ops", 0)
+        monkeypatch.setattr(Graphic, "run_table_max_ratio", float("inf"))
+    elif request.param == "slices":
+        monkeypatch.setattr(Graphic, "run_table_min_ops", float("inf"))
+    return request.param
+
+
+@pytest.mark.parametrize("profile", synthetic.PROFILES)
+def test_batch_decoder_matches_reference(tmp_path, profile, batch_path):
+    paths = synthetic.write_archive(str(tmp_path), graphics=40, animes=1, profile=profile, seed=3)
+    index = GraphicIndex(paths["graphic_info"])
+    archive = GraphicArchive.open(paths["graphic"])
+    for record in index.records:
+        _, payload = archive.block(int(record["address"]))
+        size = int(record["width"]) * int(record["height"])
+        batch = Graphic.decode_block(payload, size, "batch")
+        assert batch == Graphic.decode_block(payload, size, "reference")
+        assert len(batch) == size
+
+
+@pytest.mark.parametrize("profile", synthetic.PROFILES)
+def test_rle_round_trip(profile):
+    rng = np.random.default_rng(7)
+    pixels = synthetic.make_pixels(rng, 61, 37, profile)
+    assert Graphic.decode_block(synthetic.encode_rle(pixels), len(pixels)) == pixels
+
+
+def test_batch_decoder_matches_reference_on_random_bytes(batch_path):
+    rng = np.random.default_rng(11)
+    for _ in range(300):
+        payload = rng.integers(0, 256, int(rng.integers(1, 400)), dtype=np.uint8).tobytes()
+        results = []
+        for engine in ("batch", "reference"):
+            try:
+                results.append(Graphic.decode_block(payload, 64, engine))
+            except ValueError:
+                results.append(ValueError)
+        assert results[0] == results[1]
+
+
+@pytest.mark.parametrize("payload", [b"\x05\x01\x02", b"\x81", b"\x1f", b"\xa1\x05", b"\xd1"])
+@pytest.mark.parametrize("engine", ["batch", "reference"])
+def test_corrupt_block_raises_value_error(payload, engine, batch_path):
+    with pytest.raises(ValueError):
+        Graphic.decode_block(payload, 16, engine)
+
+
+def test_iter_frames_skips_corrupt_block(tmp_path):
+    paths = synthetic.write_archive(str(tmp_path), graphics=20, animes=1)
+    record = GraphicIndex(paths["graphic_info"]).records[5]
+    start = int(record["address"]) + 16
+    end = int(record["address"]) + int(record["length"])
+    with open(paths["graphic"], "r+b") as file:
+        file.seek(start)
+        file.write(b"\x1f" * (end - start))
+
+    sequences = [graphic.sequence for graphic, _ in GraphicIndex(paths["graphic_info"]).iter_frames()]
+    assert len(sequences) == 19
+    assert 5 not in sequences
+
+
+def test_incremental_export_skips_unreadable_frame(tmp_path):
+    paths = synthetic.write_archive(str(tmp_path / "data"), graphics=20, animes=1, frames=(3, 5))
+    anime = Anime(paths["anime"], paths["graphic"], 0)
+    sequences = {int(seq) for action in anime.actions for seq in action.sequences}
+    record = GraphicIndex(paths["graphic_info"]).records[min(sequences)]
+    with open(paths["graphic"], "r+b") as file:
+        file.seek(int(record["address"]))
+        file.write(b"XX")
+
+    output_dir = str(tmp_path / "output")
+    expected = _export_animes_task(paths["anime"], paths["graphic"], [0], str(tmp_path / "full"))
+    count, files, _, skipped, entries = _export_animes_task(
+        paths["anime"], paths["graphic"], [0], output_dir, incremental=True
+    )
+    assert (count, files, skipped) == (1, expected[1], 0)
+    assert entries
+
+    previous = dict(entries)
+    count, _, _, skipped, _ = _export_animes_task(
+        paths["anime"], paths["graphic"], [0], output_dir, True, previous
+    )
+    assert (count, skipped) == (0, 1)
+
+
+def test_read_returns_private_copies(archive):
+    graphic = GraphicIndex.load(archive["graphic_info"]).graphic(4)
+    image = graphic.read_indexed()
+    before = image.getpixel((0, 0))
+    image.putpixel((0, 0), (before + 1) % 256)
+    assert graphic.read_indexed().getpixel((0, 0)) == before
+
+    rgba = graphic.read()
+    rgba.paste((1, 2, 3, 255), (0, 0, rgba.width, rgba.height))
+    assert graphic.read().tobytes() != rgba.tobytes()
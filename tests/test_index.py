@@ -0,0 +1,70 @@
+import os
+
+import numpy as np
+
+import synthetic
+from cgexport import AnimeIndex, GraphicIndex
+
+
+def linear_find(info_path, id):
+    records = np.fromfile(info_path, dtype=AnimeIndex.dtype)
+    for sequence, record in enumerate(records):
+        if record["id"] == id:
+            return sequence
+    return None
+
+
+def test_find_matches_linear_scan(archive):
+    index = AnimeIndex(archive["anime_info"])
+    ids = [100000, 100003, 100005, 99, 200000]
+    assert [index.find(id) for id in ids] == [linear_find(archive["anime_info"], id) for id in ids]
+    assert index.find_many(ids).tolist() == [0, 3, 5, -1, -1]
+
+
+def test_cache_file_round_trip(archive, tmp_path):
+    cache_path = str(tmp_path / "anime.idx")
+    built = AnimeIndex(archive["anime_info"], cache_path)
+    assert os.path.exists(cache_path)
+    cached = AnimeIndex(archive["anime_info"], cache_path)
+    assert isinstance(cached._order, np.memmap)
+    assert np.array_equal(cached._order, built._order)
+    assert np.array_equal(cached._sorted_ids, built._sorted_ids)
+
+
+def test_load_reloads_changed_file(tmp_path):
+    paths = synthetic.write_archive(str(tmp_path / "a"), graphics=10, animes=3)
+    first = AnimeIndex.load(paths["anime_info"])
+    assert AnimeIndex.load(paths["anime_info"]) is first
+
+    synthetic.write_archive(str(tmp_path / "a"), graphics=10, animes=5)
+    stat = os.stat(paths["anime_info"])
+    os.utime(paths["anime_info"], ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+    reloaded = AnimeIndex.load(paths["anime_info"])
+    assert reloaded is not first
+    assert len(reloaded) == 5
+
+
+def test_graphic_index_load_reloads_changed_file(tmp_path):
+    paths = synthetic.write_archive(str(tmp_path / "a"), graphics=10, animes=1)
+    first = GraphicIndex.load(paths["graphic_info"])
+    assert GraphicIndex.load(paths["graphic_info"]) is first
+
+    synthetic.write_archive(str(tmp_path / "a"), graphics=12, animes=1, seed=5)
+    stat = os.stat(paths["graphic_info"])
+    os.utime(paths["graphic_info"], ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+    reloaded = GraphicIndex.load(paths["graphic_info"])
+    assert reloaded is not first
+    assert len(reloaded) == 12
+    assert reloaded.graphic(11).width == int(reloaded.records["width"][11])
+
+
+def test_find_by_map_number_agrees_with_map_table(archive):
+    index = GraphicIndex(archive["graphic_info"])
+    table = index.map_table()
+    assert (index.records["map_number"] == 0).any() and (table >= 0).sum() > 1
+    assert index.find_by_map_number(0) is None
+    assert index.find_by_map_number(-1) is None
+    assert index.find_by_map_number(len(table)) is None
+    for number, sequence in enumerate(table.tolist()):
+        if number:
+            assert index.find_by_map_number(number) == (sequence if sequence >= 0 else None)
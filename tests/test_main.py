@@ -0,0 +1,9 @@
+import cgexport
+import main
+
+
+def test_main_reexports_library_classes():
+    for name in ("ActionType", "Action", "Anime", "Graphic", "GraphicIndex", "AnimeIndex", "Palette"):
+        assert getattr(main, name) is getattr(cgexport, name)
+    assert main.STATS is cgexport.STATS
+    assert main.export_animes is cgexport.export_animes
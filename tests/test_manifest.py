@@ -0,0 +1,81 @@
+import os
+
+from cgexport import ExportManifest, SheetEncoder, _export_animes_task, export_animes
+
+
+def test_second_export_skips_unchanged_animes(archive, tmp_path, capsys):
+    output_dir = str(tmp_path)
+    count, files, _ = export_animes(archive["anime"], archive["graphic"], output_dir, workers=1)
+    assert count == 6 and files > 0
+    assert sorted(ExportManifest(output_dir).entries) == [str(100000 + i) for i in range(6)]
+    capsys.readouterr()
+
+    count, files, written = export_animes(archive["anime"], archive["graphic"], output_dir, workers=1)
+    assert (count, files, written) == (0, 0, 0)
+    assert "跳过 6 个未变化的" in capsys.readouterr().out
+
+
+def test_changed_options_and_missing_sheets_are_exported_again(archive, tmp_path):
+    output_dir = str(tmp_path)
+    export_animes(archive["anime"], archive["graphic"], output_dir, workers=1)
+    count, _, _ = export_animes(archive["anime"], archive["graphic"], output_dir, workers=1, color_mode="RGBA")
+    assert count == 6
+
+    manifest = ExportManifest(output_dir)
+    os.remove(manifest.sheets("100002")[0])
+    count, _, _ = export_animes(archive["anime"], archive["graphic"], output_dir, workers=1, color_mode="RGBA")
+    assert count == 1
+
+
+def test_failed_save_is_not_recorded(archive, tmp_path, monkeypatch):
+    output_dir = str(tmp_path)
+
+    def fail(self, image, path):
+        raise OSError("disk full")
+
+    with monkeypatch.context() as patch:
+        patch.setattr(SheetEncoder, "save", fail)
+        count, files, _, skipped, entries = _export_animes_task(
+            archive["anime"], archive["graphic"], [0, 1, 2], output_dir, incremental=True
+        )
+    assert (count, files, skipped, entries) == (0, 0, 0, None)
+
+    count, _, _, skipped, entries = _export_animes_task(
+        archive["anime"], archive["graphic"], [0, 1, 2], output_dir, incremental=True
+    )
+    assert (count, skipped) == (3, 0)
+    assert [key for key, _ in entries] == ["100000", "100001", "100002"]
+
+
+def test_animated_export_with_static_encoder_is_not_recorded(archive, tmp_path):
+    output_dir = str(tmp_path)
+    count, files, _, _, entries = _export_animes_task(
+        archive["anime"], archive["graphic"], [0], output_dir, True, {}, {"mode": "animated", "encoder": "tga"}
+    )
+    assert (count, files, entries) == (0, 0, None)
+
+    count, _, _, _, entries = _export_animes_task(
+        archive["anime"], archive["graphic"], [0], output_dir, True, {}, {"mode": "animated", "encoder": "balanced"}
+    )
+    assert count == 1 and entries
+    with open(os.path.join(output_dir, entries[0][1]["sheets"][0]), "rb") as file:
+        assert file.read(8) == b"\x89PNG\r\n\x1a\n"
+
+
+def test_manifest_round_trip(tmp_path):
+    manifest = ExportManifest(str(tmp_path))
+    sheet = tmp_path / "1" / "a.png"
+    sheet.parent.mkdir()
+    sheet.write_bytes(b"")
+    manifest.update("1", {"frames": "abc"}, [str(sheet)])
+    manifest.save()
+
+    loaded = ExportManifest(str(tmp_path))
+    assert loaded.entries == {"1": {"frames": "abc", "sheets": ["1/a.png"]}}
+    assert loaded.is_current("1", {"frames": "abc"})
+    assert not loaded.is_current("1", {"frames": "abd"})
+    sheet.unlink()
+    assert not loaded.is_current("1", {"frames": "abc"})
+
+    (tmp_path / "manifest.json").write_text("{", encoding="utf-8")
+    assert ExportManifest(str(tmp_path)).entries == {}
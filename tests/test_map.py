@@ -0,0 +1,215 @@
+import json
+import os
+import struct
+
+import numpy as np
+import pytest
+from PIL import Image
+
+import synthetic
+
+from cgexport import GraphicIndex
+from cgmap import (
+    PYRAMID_TILE_SIZE,
+    TILE_HEIGHT,
+    TILE_WIDTH,
+    GameMap,
+    MapPlan,
+    MapRenderer,
+    TileColors,
+    export_map,
+    export_map_tiles,
+)
+
+
+def write_map(path, ground, objects):
+    south, east = ground.shape
+    with open(path, "wb") as file:
+        file.write(b"MAP" + bytes(9) + struct.pack("<II", east, south))
+        file.write(ground.astype("<u2").tobytes())
+        file.write(objects.astype("<u2").tobytes())
+        file.write(bytes(2 * east * south))
+    return path
+
+
+def reference_render(graphic_info_path, game_map):
+    """逐格用 Pillow 按绘制顺序叠加，作为 MapRenderer 的对照"""
+    index = GraphicIndex(graphic_info_path)
+    table = index.map_table()
+    placed = []
+    for layer, cells in enumerate((game_map.ground, game_map.objects)):
+        for south in range(game_map.height):
+            for east in range(game_map.width):
+                number = int(cells[south, east])
+                if number == 0 or number >= len(table) or table[number] < 0:
+                    continue
+                graphic = index.graphic(int(table[number]))
+                area_south = int(index.records["area_south"][index.position(graphic.sequence)])
+                depth = south + max(area_south, 1) - 1 - east
+                x = (east + south) * (TILE_WIDTH // 2) + graphic.offset_x
+                y = (south - east) * (TILE_HEIGHT // 2) + graphic.offset_y
+                placed.append(((layer, depth, east + south), x, y, graphic))
+    placed.sort(key=lambda item: item[0])
+    left = min(x for _, x, _, _ in placed)
+    top = min(y for _, _, y, _ in placed)
+    right = max(x + graphic.width for _, x, _, graphic in placed)
+    bottom = max(y + graphic.height for _, _, y, graphic in placed)
+    canvas = Image.new("RGBA", (right - left, bottom - top), (0, 0, 0, 0))
+    for _, x, y, graphic in placed:
+        canvas.alpha_composite(graphic.read(), (x - left, y - top))
+    return np.asarray(canvas)
+
+
+def test_game_map_layers(archive):
+    game_map = GameMap(archive["map"])
+    assert (game_map.width, game_map.height) == (12, 10)
+    assert game_map.ground.shape == game_map.objects.shape == game_map.flags.shape == (10, 12)
+    assert game_map.id == 0
+
+
+def test_render_matches_reference(archive):
+    game_map = GameMap(archive["map"])
+    image = MapRenderer(archive["graphic"]).render(game_map, "RGBA")
+    assert np.array_equal(np.asarray(image), reference_render(archive["graphic_info"], game_map))
+
+
+def write_graphics(directory, graphics):
+    """写出只含纯色矩形的 GraphicInfo/Graphic：每项为 (宽, 高, offset_x, offset_y, 颜色索引, map_number, area_south)"""
+    graphic_path = str(directory / "Graphic_1.bin")
+    with open(graphic_path, "wb") as graphic_file, open(str(directory / "GraphicInfo_1.bin"), "wb") as info_file:
+        for sequence, (w, h, offset_x, offset_y, color, map_number, area_south) in enumerate(graphics):
+            payload = synthetic.encode_rle(bytes([color]) * (w * h))
+            address = graphic_file.tell()
+            graphic_file.write(struct.pack("<2sbblll", b"RD", 1, 0, w, h, len(payload) + 16))
+            graphic_file.write(payload)
+            info_file.write(
+                struct.pack(
+                    "<lLLllLLbbb5bL", sequence, address, len(payload) + 16, offset_x, offset_y,
+                    w, h, 1, area_south, 0, 0, 0, 0, 0, 0, map_number,
+                )
+            )
+    return graphic_path
+
+
+def test_draw_order(tmp_path):
+    # 1：地面；2、3：一格高物件；4：南北方向占 3 格的物件
+    graphic_path = write_graphics(
+        tmp_path,
+        [
+            (64, 48, -32, -24, 10, 1, 1),
+            (40, 120, -20, -108, 20, 2, 1),
+            (40, 120, -20, -108, 30, 3, 1),
+            (40, 120, -20, -108, 40, 4, 3),
+        ],
+    )
+    renderer = MapRenderer(graphic_path)
+
+    def render(objects, ground=None):
+        objects = np.array(objects, dtype=np.uint16)
+        ground = np.zeros_like(objects) if ground is None else np.array(ground, dtype=np.uint16)
+        game_map = GameMap(write_map(str(tmp_path / "1.dat"), ground, objects))
+        return np.asarray(renderer.render(game_map, "P"))
+
+    def overlap_color(image):
+        # (0, 0) 处物件占画布 x 0~40、y 0~120，(0, 1) 处物件右移 32、下移 24，两者在 x 32~40 重叠
+        return int(image[100, 35])
+
+    # 同层内锚点屏幕 y 更大的格子（south - east 更大）后画，与编号大小无关
+    assert overlap_color(render([[2], [3]])) == 30
+    assert overlap_color(render([[3], [2]])) == 20
+    # 多格物件按最靠前的格子排序：(0, 0) 处占 3 格的物件在 (0, 1) 处的物件之前
+    assert overlap_color(render([[4], [2]])) == 40
+    # 地面总在物件之下，即使地面格子更靠前：(0, 1) 处的地面与物件在画布 x 20~40、y 108~120 重叠
+    image = render([[2], [0]], ground=[[0], [1]])
+    assert 10 in image
+    assert int(image[110, 30]) == 20
+
+
+def test_export_map_writes_rendered_image(archive, tmp_path):
+    path = export_map(archive["map"], [archive["graphic"]], str(tmp_path))
+    with Image.open(path) as image:
+        assert image.mode == "P"
+        rendered = reference_render(archive["graphic_info"], GameMap(archive["map"]))
+        assert np.array_equal(np.asarray(image.convert("RGBA"))[..., 3] > 0, rendered[..., 3] > 0)
+
+
+def test_max_zoom_tiles_are_crops_of_full_map(archive, tmp_path):
+    with Image.open(export_map(archive["map"], [archive["graphic"]], str(tmp_path / "full"))) as image:
+        full = np.asarray(image)
+    tiles_dir = export_map_tiles(archive["map"], [archive["graphic"]], str(tmp_path / "tiles"), chunk_size=256, workers=1)
+    with open(os.path.join(tiles_dir, "tiles.json"), encoding="utf-8") as file:
+        layout = json.load(file)
+    assert (layout["width"], layout["height"]) == (full.shape[1], full.shape[0])
+
+    size = PYRAMID_TILE_SIZE
+    zoom = layout["max_zoom"]
+    assert zoom >= 1
+    padded = np.zeros((-(-full.shape[0] // size) * size, -(-full.shape[1] // size) * size), dtype=np.uint8)
+    padded[: full.shape[0], : full.shape[1]] = full
+    for y in range(padded.shape[0] // size):
+        for x in range(padded.shape[1] // size):
+            crop = padded[y * size : (y + 1) * size, x * size : (x + 1) * size]
+            path = os.path.join(tiles_dir, str(zoom), str(x), f"{y}.png")
+            if not crop.any():
+                assert not os.path.exists(path)
+                continue
+            with Image.open(path) as tile:
+                assert np.array_equal(np.asarray(tile), crop)
+    for level in range(zoom):
+        assert os.listdir(os.path.join(tiles_dir, str(level)))
+
+
+def test_chunks_match_full_render_with_small_sprite_cache(archive, monkeypatch):
+    game_map = GameMap(archive["map"])
+    full = np.asarray(MapRenderer(archive["graphic"]).render(game_map))
+    monkeypatch.setattr(MapRenderer, "sprite_cache_bytes", 4096)
+    monkeypatch.setattr(MapRenderer, "batch_pixels", 1000)
+    for chunk_size in (256, 512):
+        plan = MapPlan(MapRenderer(archive["graphic"]), game_map, chunk_size)
+        canvas = np.zeros((plan.rows * chunk_size, plan.columns * chunk_size), dtype=np.uint8)
+        for row in range(plan.rows):
+            for column in range(plan.columns):
+                chunk = plan.render_chunk(column, row)
+                assert plan.is_empty(column, row) == (not chunk.any())
+                canvas[row * chunk_size : (row + 1) * chunk_size, column * chunk_size : (column + 1) * chunk_size] = chunk
+        assert np.array_equal(canvas[: full.shape[0], : full.shape[1]], full)
+        assert not canvas[full.shape[0] :].any() and not canvas[:, full.shape[1] :].any()
+
+
+def test_minimap_colors_are_mean_of_opaque_pixels(archive):
+    index = GraphicIndex(archive["graphic_info"])
+    colors = TileColors(archive["graphic"])
+    for number, sequence in enumerate(index.map_table().tolist()):
+        if sequence < 0:
+            continue
+        pixels = np.asarray(index.graphic(sequence).read()).reshape(-1, 4)
+        opaque = pixels[pixels[:, 3] > 0, :3]
+        assert colors.colors[number, 3] == 255
+        assert colors.colors[number, :3].tolist() == np.rint(opaque.mean(axis=0)).astype(int).tolist()
+
+    game_map = GameMap(archive["map"])
+    minimap = np.asarray(colors.minimap(game_map))
+    assert minimap.shape == (game_map.height, game_map.width, 4)
+    cells = np.where(game_map.objects > 0, game_map.objects, game_map.ground)
+    assert np.array_equal(minimap, colors.colors[cells])
+    assert np.array_equal(np.asarray(colors.minimap(game_map, objects=False)), colors.colors[game_map.ground])
+    assert colors.minimap(game_map, scale=3).size == (game_map.width * 3, game_map.height * 3)
+
+
+def test_minimap_color_cache(tmp_path, monkeypatch):
+    paths = synthetic.write_archive(str(tmp_path / "data"), graphics=30, animes=1, map_size=(4, 4))
+    cache_dir = str(tmp_path / "cache")
+    expected = TileColors(paths["graphic"], cache_dir=cache_dir).colors
+    assert len(os.listdir(cache_dir)) == 1
+
+    compute = TileColors.compute
+    with monkeypatch.context() as patch:
+        patch.setattr(TileColors, "compute", staticmethod(lambda *args: pytest.fail("cache not used")))
+        assert np.array_equal(TileColors(paths["graphic"], cache_dir=cache_dir).colors, expected)
+
+    calls = []
+    monkeypatch.setattr(TileColors, "compute", staticmethod(lambda *args: calls.append(1) or compute(*args)))
+    stat = os.stat(paths["graphic"])
+    os.utime(paths["graphic"], ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+    assert np.array_equal(TileColors(paths["graphic"], cache_dir=cache_dir).colors, expected)
+    assert calls == [1]
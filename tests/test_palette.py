@@ -0,0 +1,150 @@
+import glob
+import os
+from collections import OrderedDict
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from cgexport import Graphic, Palette, export_animes, export_graphics
+
+
+def write_palette(path, seed):
+    """写出一个 708 字节（236 色 BGR）的调色板文件"""
+    rng = np.random.default_rng(seed)
+    with open(path, "wb") as file:
+        file.write(rng.integers(0, 256, 708, dtype=np.uint8).tobytes())
+    return path
+
+
+def read_tree(root):
+    """相对路径 -> 图像模式、尺寸、像素与调色板，跳过 manifest.json 等 JSON 文件"""
+    images = {}
+    for path in glob.glob(os.path.join(root, "**", "*.*"), recursive=True):
+        if path.endswith(".json"):
+            continue
+        with Image.open(path) as image:
+            images[os.path.relpath(path, root)] = (
+                image.mode,
+                image.size,
+                image.tobytes(),
+                bytes(image.getpalette() or []),
+            )
+    return images
+
+
+@pytest.fixture
+def palette_paths(tmp_path):
+    return [write_palette(str(tmp_path / f"{name}.cgp"), seed) for seed, name in enumerate(("day", "night"))]
+
+
+@pytest.mark.parametrize("color_mode", ["P", "RGBA"])
+def test_multi_palette_animes_match_single_exports(archive, palette_paths, tmp_path, color_mode):
+    output = str(tmp_path / "multi")
+    export_animes(
+        archive["anime"], archive["graphic"], output, workers=1, color_mode=color_mode, palette_paths=palette_paths
+    )
+    for path in palette_paths:
+        name = os.path.splitext(os.path.basename(path))[0]
+        single = str(tmp_path / f"single_{name}")
+        export_animes(
+            archive["anime"], archive["graphic"], single, workers=1, color_mode=color_mode, palette_path=path
+        )
+        expected = read_tree(single)
+        assert expected
+        assert read_tree(os.path.join(output, name)) == expected
+
+
+def test_multi_palette_graphics_match_single_exports(archive, palette_paths, tmp_path):
+    output = str(tmp_path / "multi")
+    export_graphics(archive["graphic"], output, workers=1, palette_paths=palette_paths)
+    for path in palette_paths:
+        name = os.path.splitext(os.path.basename(path))[0]
+        single = str(tmp_path / f"single_{name}")
+        export_graphics(archive["graphic"], single, workers=1, palette_path=path)
+        expected = read_tree(single)
+        assert expected
+        assert read_tree(os.path.join(output, name)) == expected
+
+
+def test_duplicate_palette_names_are_rejected(archive, palette_paths, tmp_path):
+    os.makedirs(tmp_path / "other")
+    duplicate = write_palette(str(tmp_path / "other" / "DAY.cgp"), 2)
+    with pytest.raises(ValueError):
+        export_animes(
+            archive["anime"],
+            archive["graphic"],
+            str(tmp_path / "out"),
+            workers=1,
+            palette_paths=palette_paths + [duplicate],
+        )
+    with pytest.raises(ValueError):
+        export_graphics(archive["graphic"], str(tmp_path / "out"), workers=1, palette_paths=[duplicate] + palette_paths)
+    assert not os.path.exists(tmp_path / "out" / "day")
+
+
+def test_palette_file_cache_follows_mtime(tmp_path):
+    path = write_palette(str(tmp_path / "day.cgp"), 0)
+    palette = Graphic.read_palette_file(path)
+    with open(path, "rb") as file:
+        data = file.read()
+    # 文件中为 BGR，跳过固定的前 16 色
+    assert palette.rgb[48:51] == data[2::-1]
+    assert Graphic.read_palette_file(path) is palette
+
+    # 大小不变、只改内容和修改时间也要重新解析
+    stat = os.stat(path)
+    write_palette(path, 1)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+    reloaded = Graphic.read_palette_file(path)
+    assert reloaded != palette
+    with open(path, "rb") as file:
+        assert reloaded.rgb[48:51] == file.read(3)[::-1]
+    assert Graphic.read_palette_file(path) is reloaded
+
+    # 内容相同的文件得到相等的调色板
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 2_000_000_000))
+    assert Graphic.read_palette_file(path) == reloaded
+
+
+def test_palette_file_cache_is_bounded(tmp_path, monkeypatch):
+    monkeypatch.setattr(Palette, "max_files", 2)
+    monkeypatch.setattr(Palette, "_files", OrderedDict())
+    paths = [write_palette(str(tmp_path / f"{seed}.cgp"), seed) for seed in range(3)]
+    first = Graphic.read_palette_file(paths[0])
+    Graphic.read_palette_file(paths[1])
+    Graphic.read_palette_file(paths[0])
+    Graphic.read_palette_file(paths[2])
+    assert list(Palette._files) == [paths[0], paths[2]]
+    assert Graphic.read_palette_file(paths[0]) is first
+
+
+def test_invalid_palette_file_is_rejected(tmp_path):
+    path = str(tmp_path / "short.cgp")
+    with open(path, "wb") as file:
+        file.write(bytes(700))
+    with pytest.raises(ValueError):
+        Graphic.read_palette_file(path)
+    with pytest.raises(ValueError):
+        Palette(bytes(767))
+
+
+def test_palette_lookup_table():
+    colors = np.random.default_rng(0).integers(0, 256, 768, dtype=np.uint8)
+    colors[:3] = 0
+    colors[3:6] = (0, 0, 1)
+    palette = Palette(colors.tolist())
+    assert palette.lut.shape == (256, 4) and not palette.lut.flags.writeable
+    assert bytes(palette.lut[:, :3]) == palette.rgb == colors.tobytes()
+    # 只有纯黑透明
+    assert palette.alpha[:2] == b"\x00\xff"
+    assert palette == Palette(colors.tobytes()) and hash(palette) == hash(Palette(bytes(palette)))
+
+
+def test_converted_palettes_are_reused():
+    colors = list(range(256)) * 3
+    palette = Palette.of(colors)
+    assert Palette.of(colors) is palette
+    assert Palette.of(palette) is palette
+    assert Palette.of(list(colors)) == palette
+    assert Palette.of(None) is Graphic._defalult_palette
@@ -0,0 +1,119 @@
+import pytest
+
+import synthetic
+from cgexport import FramePrefetcher, GraphicArchive, GraphicIndex
+
+
+@pytest.fixture
+def graphics(archive):
+    index = GraphicIndex(archive["graphic_info"])
+    return [index.graphic(sequence) for sequence in range(len(index))]
+
+
+@pytest.mark.parametrize("depth, max_bytes, workers", [(0, None, None), (32, None, 2), (2, 1, 1), (4, 4096, 3)])
+def test_prefetched_blocks_match_archive(graphics, depth, max_bytes, workers):
+    archive = GraphicArchive.open(graphics[0].path)
+    order = graphics[::-1][::3] + graphics[1::3]
+    fetched = list(FramePrefetcher(order, depth=depth, max_bytes=max_bytes, workers=workers))
+    assert sorted(graphic.sequence for graphic, _ in fetched) == sorted(graphic.sequence for graphic in order)
+    addresses = [graphic.address for graphic, _ in fetched]
+    assert addresses == sorted(addresses)
+    for graphic, block in fetched:
+        assert bytes(block) == bytes(archive.raw_block(graphic.address))
+
+
+def test_unsorted_prefetch_keeps_given_order(graphics):
+    order = graphics[::-1]
+    fetched = list(FramePrefetcher(order, depth=3, sort=False))
+    assert [graphic.sequence for graphic, _ in fetched] == [graphic.sequence for graphic in order]
+
+
+def test_corrupt_header_yields_none(tmp_path):
+    paths = synthetic.write_archive(str(tmp_path), graphics=6, animes=1)
+    index = GraphicIndex(paths["graphic_info"])
+    with open(paths["graphic"], "r+b") as file:
+        file.seek(int(index.records["address"][2]))
+        file.write(b"XX")
+    fetched = dict(
+        (graphic.sequence, block)
+        for graphic, block in FramePrefetcher([index.graphic(sequence) for sequence in range(6)], depth=2)
+    )
+    assert fetched[2] is None
+    assert all(fetched[sequence] is not None for sequence in (0, 1, 3, 4, 5))
+
+
+def check_spans(spans, graphics):
+    """每个图像恰好落在一个区间内，区间内按地址排列且不越界"""
+    members = [graphic for _, _, _, group in spans for graphic in group]
+    assert sorted((graphic.path, graphic.sequence) for graphic in members) == sorted(
+        (graphic.path, graphic.sequence) for graphic in graphics
+    )
+    for path, start, length, group in spans:
+        assert all(graphic.path == path for graphic in group)
+        assert [graphic.address for graphic in group] == sorted(graphic.address for graphic in group)
+        assert group[0].address == start
+        assert all(graphic.address + graphic.block_length <= start + length for graphic in group)
+
+
+def test_plan_merges_adjacent_blocks(graphics):
+    spans = FramePrefetcher.plan(graphics[::-1])
+    check_spans(spans, graphics)
+    assert len(spans) == 1
+    last = graphics[-1]
+    assert spans[0][1:3] == (graphics[0].address, last.address + last.block_length - graphics[0].address)
+
+
+def test_plan_splits_at_max_span(graphics, monkeypatch):
+    max_span = 4 * max(graphic.block_length for graphic in graphics)
+    monkeypatch.setattr(FramePrefetcher, "max_span", max_span)
+    spans = FramePrefetcher.plan(graphics)
+    check_spans(spans, graphics)
+    assert len(spans) > 1
+    assert all(length <= max_span for _, _, length, _ in spans)
+    # 贪心合并：相邻两个区间合起来一定超过上限
+    for (_, start, _, _), (_, next_start, next_length, _) in zip(spans, spans[1:]):
+        assert next_start + next_length - start > max_span
+
+
+def test_plan_splits_at_gaps(graphics, monkeypatch):
+    selected = graphics[::2]
+    gaps = [graphics[i + 1].block_length for i in range(0, len(graphics) - 2, 2)]
+    monkeypatch.setattr(FramePrefetcher, "merge_gap", min(gaps) - 1)
+    spans = FramePrefetcher.plan(selected)
+    check_spans(spans, selected)
+    assert len(spans) == len(selected)
+
+    monkeypatch.setattr(FramePrefetcher, "merge_gap", max(gaps))
+    spans = FramePrefetcher.plan(selected)
+    check_spans(spans, selected)
+    assert len(spans) == 1
+
+
+def test_plan_splits_at_paths(archive, graphics, tmp_path):
+    paths = synthetic.write_archive(str(tmp_path), graphics=12, animes=1, suffix="_2")
+    index = GraphicIndex(paths["graphic_info"])
+    others = [index.graphic(sequence) for sequence in range(len(index))]
+    mixed = [graphic for pair in zip(graphics, others) for graphic in pair]
+    spans = FramePrefetcher.plan(mixed)
+    check_spans(spans, mixed)
+    assert sorted(path for path, _, _, _ in spans) == sorted((archive["graphic"], paths["graphic"]))
+
+
+def test_plan_without_sort_keeps_each_block(graphics):
+    order = graphics[::-1]
+    spans = FramePrefetcher.plan(order, sort=False)
+    assert [group for _, _, _, group in spans] == [[graphic] for graphic in order]
+    assert [(start, length) for _, start, length, _ in spans] == [
+        (graphic.address, graphic.block_length) for graphic in order
+    ]
+
+
+def test_merged_reads_match_archive(graphics, monkeypatch):
+    monkeypatch.setattr(FramePrefetcher, "max_span", 3 * max(graphic.block_length for graphic in graphics))
+    monkeypatch.setattr(FramePrefetcher, "merge_gap", 1 << 20)
+    archive = GraphicArchive.open(graphics[0].path)
+    selected = graphics[::3] + graphics[1::5]
+    fetched = list(FramePrefetcher(selected, depth=4))
+    assert len(fetched) == len(selected)
+    for graphic, block in fetched:
+        assert bytes(block) == bytes(archive.raw_block(graphic.address))
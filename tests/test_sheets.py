@@ -0,0 +1,102 @@
+import glob
+import json
+import os
+import random
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from cgexport import Anime, SkylinePacker, export_animes, export_graphics
+
+
+def overlaps(a, b):
+    return a[0] < b[0] + b[2] and b[0] < a[0] + a[2] and a[1] < b[1] + b[3] and b[1] < a[1] + a[3]
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_packer_places_disjoint_rectangles(seed):
+    rng = random.Random(seed)
+    packer = SkylinePacker(256, 256)
+    placed = []
+    for _ in range(200):
+        width, height = rng.randint(1, 60), rng.randint(1, 60)
+        position = packer.insert(width, height)
+        if position is None:
+            continue
+        x, y = position
+        assert 0 <= x and x + width <= 256 and 0 <= y and y + height <= 256
+        rect = (x, y, width, height)
+        assert not any(overlaps(rect, other) for other in placed)
+        placed.append(rect)
+    assert len(placed) > 10
+
+
+def test_atlas_rectangles_do_not_overlap(archive, tmp_path):
+    for sequence in range(6):
+        anime = Anime(archive["anime"], archive["graphic"], sequence)
+        paths = anime.create_spritesheet(str(tmp_path), mode="atlas")
+        with open([path for path in paths if path.endswith(".json")][0], encoding="utf-8") as file:
+            atlas = json.load(file)
+
+        # 重复帧共用同一个矩形
+        rects = {}
+        for action in atlas["actions"]:
+            for frame in action["frames"]:
+                rects.setdefault(frame["page"], set()).add(
+                    (frame["x"], frame["y"], frame["w"], frame["h"])
+                )
+        for page, page_rects in rects.items():
+            info = atlas["pages"][page]
+            page_rects = sorted(page_rects)
+            for i, rect in enumerate(page_rects):
+                assert rect[0] + rect[2] <= info["width"] and rect[1] + rect[3] <= info["height"]
+                assert not any(overlaps(rect, other) for other in page_rects[i + 1 :])
+
+
+@pytest.mark.parametrize("mode", ["grid", "atlas"])
+def test_indexed_output_matches_rgba_output(archive, tmp_path, mode):
+    for sequence in range(6):
+        anime = Anime(archive["anime"], archive["graphic"], sequence)
+        indexed = anime.create_spritesheet(str(tmp_path / "p"), mode=mode, color_mode="P")
+        rgba = anime.create_spritesheet(str(tmp_path / "rgba"), mode=mode, color_mode="RGBA")
+        assert [os.path.basename(path) for path in indexed] == [os.path.basename(path) for path in rgba]
+        for p_path, rgba_path in zip(indexed, rgba):
+            if not p_path.endswith(".png"):
+                continue
+            with Image.open(p_path) as p_image, Image.open(rgba_path) as rgba_image:
+                assert p_image.mode == "P" and rgba_image.mode == "RGBA"
+                assert np.array_equal(np.asarray(p_image.convert("RGBA")), np.asarray(rgba_image))
+
+
+def test_grid_sheet_per_action_type(archive, tmp_path):
+    anime = Anime(archive["anime"], archive["graphic"], 0)
+    paths = anime.create_spritesheet(str(tmp_path))
+    action_types = {action.type for action in anime.actions}
+    assert len(paths) == len(action_types)
+    assert sorted(paths) == sorted(glob.glob(os.path.join(str(tmp_path), "**", "*.png"), recursive=True))
+
+
+def test_gif_output_keeps_palette_colours(archive, tmp_path):
+    anime = Anime(archive["anime"], archive["graphic"], 1)
+    png = anime.create_spritesheet(str(tmp_path / "png"))
+    gif = anime.create_spritesheet(str(tmp_path / "gif"), encoder="gif")
+    for png_path, gif_path in zip(png, gif):
+        with Image.open(png_path) as png_image, Image.open(gif_path) as gif_image:
+            expected = np.asarray(png_image.convert("RGBA"))
+            actual = np.asarray(gif_image.convert("RGBA"))
+        opaque = expected[..., 3] > 0
+        assert np.array_equal(actual[..., 3] > 0, opaque)
+        assert np.array_equal(actual[opaque], expected[opaque])
+
+
+def test_gif_rejects_rgba(archive, tmp_path):
+    anime = Anime(archive["anime"], archive["graphic"], 1)
+    for mode in ("grid", "atlas"):
+        with pytest.raises(ValueError):
+            anime.create_spritesheet(str(tmp_path), mode=mode, color_mode="RGBA", encoder="gif")
+    with pytest.raises(ValueError):
+        export_animes(archive["anime"], archive["graphic"], str(tmp_path), color_mode="RGBA", encoder="gif")
+    with pytest.raises(ValueError):
+        export_graphics(archive["graphic"], str(tmp_path), color_mode="RGBA", encoder="gif")
+    assert not os.listdir(str(tmp_path))
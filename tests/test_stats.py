@@ -0,0 +1,91 @@
+import json
+import pstats
+import time
+
+from cgexport import STATS, ExportStats, export_animes
+
+
+def recorded():
+    stats = ExportStats()
+    stats.enable()
+    with stats.stage("outer"):
+        with stats.stage("inner"):
+            time.sleep(0.01)
+        with stats.scope("anime 1"):
+            stats.count("frames", 3)
+            with stats.stage("inner"):
+                pass
+    stats.count("frames")
+    return stats
+
+
+def test_disabled_stats_record_nothing():
+    stats = ExportStats()
+    with stats.stage("decode"):
+        stats.count("frames")
+    with stats.scope("anime 1"):
+        stats.count("frames")
+    assert stats.snapshot() == {"run": {"stages": {}, "edges": [], "counters": {}}, "scopes": {}}
+
+
+def test_nested_stages_and_scopes():
+    snapshot = recorded().snapshot()
+    run = snapshot["run"]
+    assert run["counters"] == {"frames": 4}
+    assert run["stages"]["inner"]["calls"] == 2
+    assert run["stages"]["outer"]["calls"] == 1
+    outer = run["stages"]["outer"]
+    inner = run["stages"]["inner"]
+    assert outer["wall"] >= inner["wall"] >= 0.01
+    assert abs(outer["self"] - (outer["wall"] - inner["wall"])) < 1e-6
+    assert {(parent, name) for parent, name, *_ in run["edges"]} == {(None, "outer"), ("outer", "inner")}
+
+    scope = snapshot["scopes"]["anime 1"]
+    assert scope["counters"] == {"frames": 3}
+    assert scope["stages"]["inner"]["calls"] == 1
+    assert json.loads(json.dumps(snapshot)) == snapshot
+
+
+def test_merge_adds_snapshots():
+    snapshot = recorded().snapshot()
+    merged = ExportStats()
+    merged.merge(snapshot)
+    assert merged.snapshot() == snapshot
+    merged.merge(snapshot)
+    doubled = merged.snapshot()
+    assert doubled["run"]["counters"] == {"frames": 8}
+    assert doubled["run"]["stages"]["inner"]["calls"] == 4
+    assert doubled["scopes"]["anime 1"]["counters"] == {"frames": 6}
+
+
+def test_dump_json_and_pstats(tmp_path):
+    stats = recorded()
+    json_path = str(tmp_path / "stats.json")
+    stats.dump(json_path)
+    with open(json_path, encoding="utf-8") as file:
+        assert json.load(file) == json.loads(json.dumps(stats.snapshot()))
+
+    prof_path = str(tmp_path / "stats.prof")
+    stats.dump(prof_path)
+    loaded = pstats.Stats(prof_path).stats
+    calls, _, own, cumulative, callers = loaded[("stage", 0, "inner")]
+    assert calls == 2
+    assert ("stage", 0, "outer") in callers
+    run = stats.snapshot()["run"]["stages"]
+    assert abs(cumulative - run["inner"]["wall"]) < 1e-9
+    assert abs(loaded[("stage", 0, "outer")][2] - run["outer"]["self"]) < 1e-9
+
+
+def test_worker_stats_are_merged(archive, tmp_path):
+    STATS.reset()
+    STATS.enable()
+    try:
+        count, files, _ = export_animes(archive["anime"], archive["graphic"], str(tmp_path), workers=2)
+        snapshot = STATS.snapshot()
+    finally:
+        STATS.enable(False)
+        STATS.reset()
+    assert count == 6
+    assert snapshot["run"]["counters"]["files"] == files
+    assert snapshot["run"]["stages"]["save"]["calls"] == files
+    assert len(snapshot["scopes"]) == 6